@@ -0,0 +1,6 @@
+import sys
+
+from bastion.cli import main
+
+
+sys.exit(main())
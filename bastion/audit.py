@@ -0,0 +1,101 @@
+import hashlib
+import os
+import time
+from collections import namedtuple
+
+from bastion.strength import STRENGTH_LABELS, score_passwords
+from bastion.tracing import traced
+
+
+# Auditoría de todas las contraseñas de la bóveda. Las puntuaciones se
+# calculan por lotes en un pool de procesos y se guardan en una caché por
+# huella de la contraseña, así que una auditoría repetida solo puntúa las
+# contraseñas nuevas o cambiadas (y cada contraseña repetida, una vez).
+AUDIT_BATCH_SIZE = 2000
+# Con menos contraseñas por puntuar, arrancar los procesos cuesta más de lo
+# que ahorran y se puntúan en el propio hilo.
+PARALLEL_MIN_PASSWORDS = 20000
+WEAK_SCORE = 1
+# Una contraseña sin cambios desde que se creó la entrada se señala a partir
+# de esta antigüedad.
+STALE_AFTER_DAYS = 365
+
+AuditRow = namedtuple("AuditRow", ["entry_id", "group", "title", "user_name", "score", "strength", "unchanged_days"])
+AuditReport = namedtuple("AuditReport", ["rows", "total", "scored"])
+
+
+class AuditCache:
+    # Puntuación por huella de la contraseña (BLAKE2 con una clave aleatoria
+    # de la sesión): la caché no contiene contraseñas ni hashes comparables
+    # fuera de este proceso.
+
+    def __init__(self):
+        self._key = os.urandom(32)
+        self.scores = {}
+
+    def __len__(self):
+        return len(self.scores)
+
+    def digest(self, password):
+        return hashlib.blake2b(password.encode('utf-8'), key=self._key, digest_size=16).digest()
+
+
+def audit_snapshot(groups):
+    # En el hilo que posee la bóveda (con todos los grupos cargados): las
+    # entradas de cada grupo, por referencia. Editar una entrada la sustituye
+    # por otra, así que la auditoría puede leerlas después desde otro hilo.
+    return [(path, list(node.entries.items())) for path, node in groups.node_paths()]
+
+
+def _score_batches(batches, workers, progress):
+    # Genera (huellas, puntuaciones) de cada lote, en paralelo si compensa.
+    total = len(batches)
+    if total * AUDIT_BATCH_SIZE >= PARALLEL_MIN_PASSWORDS and workers > 1:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(score_passwords, passwords): digests for digests, passwords in batches}
+            for done, future in enumerate(as_completed(futures), 1):
+                yield futures[future], future.result()
+                if progress is not None:
+                    progress(done / total)
+        return
+
+    for done, (digests, passwords) in enumerate(batches, 1):
+        yield digests, score_passwords(passwords)
+        if progress is not None:
+            progress(done / total)
+
+
+@traced
+def run_audit(snapshot, cache, workers=None, progress=None):
+    # Seguro en un hilo de trabajo: no toca la bóveda, solo `snapshot` y la caché.
+    workers = workers or os.cpu_count() or 1
+    entries = [(path, entry_id, entry) for path, group_entries in snapshot for entry_id, entry in group_entries]
+    digests = [cache.digest(entry.get("Password", "")) for _, _, entry in entries]
+
+    pending = {}
+    for (_, _, entry), digest in zip(entries, digests):
+        if digest not in cache.scores:
+            pending.setdefault(digest, entry.get("Password", ""))
+    pending_items = list(pending.items())
+    batches = []
+    for start in range(0, len(pending_items), AUDIT_BATCH_SIZE):
+        batch = pending_items[start:start + AUDIT_BATCH_SIZE]
+        batches.append(([digest for digest, _ in batch], [password for _, password in batch]))
+
+    for batch_digests, scores in _score_batches(batches, workers, progress):
+        cache.scores.update(zip(batch_digests, scores))
+
+    now = time.time()
+    rows = []
+    for (group, entry_id, entry), digest in zip(entries, digests):
+        score = cache.scores[digest]
+        created = entry.get("Creation Time")
+        unchanged_days = None
+        if isinstance(created, int) and created == entry.get("Last Modification Time"):
+            unchanged_days = int((now - created) // 86400)
+        if score <= WEAK_SCORE or (unchanged_days is not None and unchanged_days >= STALE_AFTER_DAYS):
+            rows.append(AuditRow(entry_id, group, entry.get("Title", ""), entry.get("User Name", ""), score,
+                                 STRENGTH_LABELS[score], unchanged_days))
+    return AuditReport(rows, len(entries), len(pending))
@@ -0,0 +1,289 @@
+import argparse
+import getpass
+import os
+import sys
+import time
+
+from bastion import tracing
+from bastion.entry import Entry
+from bastion.errors import VaultError
+from bastion.exporters import EXPORT_FORMATS, decrypt_export, export_source, export_to_file, write_export
+from bastion.groups import ENTRY_ID_FIELD
+from bastion.importers import DEFAULT_DUPLICATE_POLICY, DUPLICATE_POLICIES, IMPORT_FORMATS, EntryImporter, read_import_batches
+from bastion.passwords import (
+    DEFAULT_TITLE_PATTERN, DEFAULT_USER_PATTERN, PasswordGenerator, generate_password, provision_entries,
+)
+from bastion.search_index import TrigramIndex
+from bastion.vault import Vault
+
+
+# Línea de comandos sobre el núcleo de la bóveda (python -m bastion ...).
+# No importa tkinter ni PIL: funciona sin pantalla.
+
+PASSWORD_ENV_VAR = "BASTION_PASSWORD"
+
+LIST_FIELDS = ("Title", "User Name", "URL")
+
+
+class CommandError(Exception):
+    pass
+
+
+def read_master_password(prompt="Contraseña maestra: "):
+    password = os.environ.get(PASSWORD_ENV_VAR)
+    if password:
+        return password
+    return getpass.getpass(prompt)
+
+
+def read_new_password(prompt):
+    password = getpass.getpass(prompt)
+    if not password:
+        raise CommandError("La contraseña no puede estar vacía.")
+    if getpass.getpass("Repita la contraseña: ") != password:
+        raise CommandError("Las contraseñas no coinciden.")
+    return password
+
+
+def open_vault(args):
+    return Vault.open(args.vault, read_master_password())
+
+
+def find_group(vault, path):
+    if not path:
+        return None
+    group = vault.groups.find(path)
+    if group is None:
+        raise CommandError(f"El grupo '{path}' no existe.")
+    return group
+
+
+def find_entries(vault, query, group=None):
+    # Un UUID identifica la entrada; si no, se busca por título exacto.
+    found_group, entry = vault.groups.find_entry(query)
+    if entry is None:
+        vault.load_all()
+        found_group, entry = vault.groups.find_entry(query)
+    if entry is not None and (group is None or group is found_group or group.is_ancestor_of(found_group)):
+        return [(found_group, entry)]
+    return [(node, entry) for node, entry in vault.iter_entries(group) if entry.get("Title") == query]
+
+
+def format_row(group, entry):
+    return "\t".join([group.path] + [str(entry.get(field, "")) for field in LIST_FIELDS] + [entry[ENTRY_ID_FIELD]])
+
+
+def cmd_get(args, out):
+    vault = open_vault(args)
+    matches = find_entries(vault, args.entry, find_group(vault, args.group))
+    if not matches:
+        raise CommandError(f"No se encontró la entrada '{args.entry}'.")
+    if len(matches) > 1:
+        rows = "\n".join(format_row(group, entry) for group, entry in matches)
+        raise CommandError(f"Hay varias entradas con ese título; use el UUID o --group:\n{rows}")
+
+    group, entry = matches[0]
+    if args.field:
+        if args.field not in entry:
+            raise CommandError(f"La entrada no tiene el campo '{args.field}'.")
+        print(entry[args.field], file=out)
+        return
+    print(f"Group: {group.path}", file=out)
+    for name, value in entry.items():
+        if name == "Password" and not args.show_password:
+            value = "********"
+        print(f"{name}: {value}", file=out)
+
+
+def cmd_search(args, out):
+    vault = open_vault(args)
+    group = find_group(vault, args.group)
+    index = TrigramIndex()
+    for node, entry in vault.iter_entries(group):
+        index.add(entry[ENTRY_ID_FIELD], entry, node)
+    results = [(vault.groups.find_entry(entry[ENTRY_ID_FIELD])[0], entry) for entry in index.search(args.text)]
+    results.sort(key=lambda item: (item[0].path, item[1].get("Title", "")))
+    for node, entry in results:
+        print(format_row(node, entry), file=out)
+    if not results:
+        raise CommandError("Sin resultados.")
+
+
+def cmd_add(args, out):
+    vault = open_vault(args)
+    if args.generate:
+        password = generate_password(args.generate)
+    else:
+        password = args.password or read_new_password("Contraseña de la entrada: ")
+
+    current_time = int(time.time())
+    entry = Entry({
+        "Title": args.title,
+        "User Name": args.user,
+        "Password": password,
+        "URL": args.url,
+        "Notes": args.notes,
+        "Creation Time": current_time,
+        "Last Modification Time": current_time,
+    })
+    group = vault.groups.find(args.group) or vault.groups.add_group(args.group)
+    if not group.loaded:
+        vault.load_group(group)
+    vault.groups.add_entry(group, entry)
+    vault.save()
+    print(entry[ENTRY_ID_FIELD], file=out)
+
+
+def cmd_provision(args, out):
+    generator = PasswordGenerator(args.length, not args.no_uppercase, not args.no_lowercase, not args.no_digits,
+                                  not args.no_symbols, args.exclude_ambiguous)
+    new_entries = provision_entries(generator, args.count, args.title, args.user, args.url, args.start)
+    vault = open_vault(args)
+    group = vault.groups.find(args.group) or vault.groups.add_group(args.group)
+    if not group.loaded:
+        vault.load_group(group)
+    for entry in new_entries:
+        vault.groups.add_entry(group, entry)
+    vault.save()
+    print(f"{len(new_entries)} entradas generadas en '{group.path}' ({generator.entropy_bits:.0f} bits de entropía por contraseña).",
+          file=out)
+
+
+def cmd_export(args, out):
+    vault = open_vault(args)
+    source = export_source(vault, find_group(vault, args.group))
+    if args.encrypt:
+        if not args.output:
+            raise CommandError("La exportación encriptada necesita un archivo de salida (-o).")
+        password = read_new_password("Contraseña de la exportación: ")
+        count = export_to_file(source, args.output, args.format, password)
+    else:
+        print("Aviso: la exportación no está encriptada.", file=sys.stderr)
+        if args.output:
+            count = export_to_file(source, args.output, args.format)
+        else:
+            count = write_export(source, out, args.format)
+    print(f"{count} entradas exportadas.", file=sys.stderr)
+
+
+def cmd_decrypt_export(args, out):
+    password = getpass.getpass("Contraseña de la exportación: ")
+    if args.output:
+        with open(args.output, 'wb') as f:
+            decrypt_export(args.file, f, password)
+    else:
+        out.flush()
+        decrypt_export(args.file, out.buffer, password)
+
+
+def cmd_import(args, out):
+    vault = open_vault(args)
+    vault.load_all()
+    importer = EntryImporter(vault.groups, args.duplicates, args.group or "")
+    for batch, _ in read_import_batches(args.file, args.format):
+        for group_path, entry in batch:
+            importer.add(group_path, entry)
+    if importer.added or importer.updated:
+        vault.save()
+    print(importer.summary(), file=out)
+
+
+def cmd_rekey(args, out):
+    vault = open_vault(args)
+    new_password = read_new_password("Nueva contraseña maestra: ")
+    vault.rekey(new_password)
+    print("La contraseña maestra ha sido cambiada.", file=out)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="bastion",
+        description=f"Gestor de contraseñas Bastión sin interfaz gráfica. La contraseña maestra se pide por "
+                    f"teclado o se toma de la variable de entorno {PASSWORD_ENV_VAR}.")
+    parser.add_argument("--trace", metavar="ARCHIVO", help="Guarda una traza de tiempos (formato Chrome) al salir.")
+    parser.add_argument("--profile", metavar="ARCHIVO", help="Guarda estadísticas de cProfile al salir.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    get_parser = commands.add_parser("get", help="Muestra una entrada por UUID o título.")
+    get_parser.add_argument("vault")
+    get_parser.add_argument("entry", help="UUID o título exacto de la entrada.")
+    get_parser.add_argument("--group", help="Busca solo en este grupo y sus subgrupos.")
+    get_parser.add_argument("--field", help="Imprime solo este campo (p. ej. Password).")
+    get_parser.add_argument("--show-password", action="store_true", help="Muestra la contraseña en claro.")
+    get_parser.set_defaults(func=cmd_get)
+
+    search_parser = commands.add_parser("search", help="Busca entradas que contengan un texto.")
+    search_parser.add_argument("vault")
+    search_parser.add_argument("text")
+    search_parser.add_argument("--group", help="Busca solo en este grupo y sus subgrupos.")
+    search_parser.set_defaults(func=cmd_search)
+
+    add_parser = commands.add_parser("add", help="Añade una entrada (crea el grupo si no existe).")
+    add_parser.add_argument("vault")
+    add_parser.add_argument("group", help="Ruta del grupo, p. ej. 'eMail/Personal'.")
+    add_parser.add_argument("--title", required=True)
+    add_parser.add_argument("--user", default="")
+    add_parser.add_argument("--url", default="")
+    add_parser.add_argument("--notes", default="")
+    password_options = add_parser.add_mutually_exclusive_group()
+    password_options.add_argument("--password", help="Si se omite, se pide por teclado.")
+    password_options.add_argument("--generate", type=int, metavar="LONGITUD", help="Genera una contraseña aleatoria.")
+    add_parser.set_defaults(func=cmd_add)
+
+    provision_parser = commands.add_parser("provision", help="Llena un grupo con entradas de contraseñas generadas.")
+    provision_parser.add_argument("vault")
+    provision_parser.add_argument("group", help="Ruta del grupo (se crea si no existe).")
+    provision_parser.add_argument("--count", type=int, required=True)
+    provision_parser.add_argument("--start", type=int, default=1, help="Número de la primera entrada.")
+    provision_parser.add_argument("--title", default=DEFAULT_TITLE_PATTERN, help="Patrón del título; {n} es el número.")
+    provision_parser.add_argument("--user", default=DEFAULT_USER_PATTERN, help="Patrón del usuario; {n} es el número.")
+    provision_parser.add_argument("--url", default="")
+    provision_parser.add_argument("--length", type=int, default=20)
+    provision_parser.add_argument("--no-uppercase", action="store_true")
+    provision_parser.add_argument("--no-lowercase", action="store_true")
+    provision_parser.add_argument("--no-digits", action="store_true")
+    provision_parser.add_argument("--no-symbols", action="store_true")
+    provision_parser.add_argument("--exclude-ambiguous", action="store_true", help="Sin i, l, o, 0, O ni 1.")
+    provision_parser.set_defaults(func=cmd_provision)
+
+    export_parser = commands.add_parser("export", help="Exporta las entradas (JSON, NDJSON, CSV o XML de KeePass).")
+    export_parser.add_argument("vault")
+    export_parser.add_argument("-o", "--output", help="Archivo de salida (por defecto, la salida estándar).")
+    export_parser.add_argument("--group", help="Exporta solo este grupo y sus subgrupos.")
+    export_parser.add_argument("--format", choices=EXPORT_FORMATS, default="json")
+    export_parser.add_argument("--encrypt", action="store_true",
+                               help="Encripta la salida con una contraseña propia (se lee con decrypt-export).")
+    export_parser.set_defaults(func=cmd_export)
+
+    decrypt_parser = commands.add_parser("decrypt-export", help="Desencripta una exportación hecha con --encrypt.")
+    decrypt_parser.add_argument("file")
+    decrypt_parser.add_argument("-o", "--output", help="Archivo de salida (por defecto, la salida estándar).")
+    decrypt_parser.set_defaults(func=cmd_decrypt_export)
+
+    import_parser = commands.add_parser("import", help="Importa entradas de un CSV o de un XML de KeePass 2.x.")
+    import_parser.add_argument("vault")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--format", choices=IMPORT_FORMATS, help="Por defecto, según la extensión (.xml = keepass).")
+    import_parser.add_argument("--group", help="Crea los grupos importados dentro de este grupo.")
+    import_parser.add_argument("--duplicates", choices=DUPLICATE_POLICIES, default=DEFAULT_DUPLICATE_POLICY,
+                               help="Entradas con el mismo UUID, o con el mismo título, usuario y URL: "
+                                    "omitirlas (skip), actualizar las existentes (update) o importarlas igualmente (keep).")
+    import_parser.set_defaults(func=cmd_import)
+
+    rekey_parser = commands.add_parser("rekey", help="Cambia la contraseña maestra.")
+    rekey_parser.add_argument("vault")
+    rekey_parser.set_defaults(func=cmd_rekey)
+    return parser
+
+
+def main(argv=None, out=None):
+    args = build_parser().parse_args(argv)
+    tracing.setup(args.trace, args.profile)
+    try:
+        args.func(args, out or sys.stdout)
+    except (CommandError, VaultError, ValueError) as e:
+        print(f"bastion: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    return 0
@@ -0,0 +1,58 @@
+import zlib
+
+from bastion.errors import VaultError
+
+
+# La compresión se aplica entre la serialización JSON y el cifrado. Cada
+# carga lleva un byte inicial que indica cómo se comprimió, así que conviven
+# bloques escritos con distintos ajustes; el JSON sin comprimir (archivos
+# antiguos) empieza por '{' o '[' y se reconoce tal cual.
+COMPRESSION_ALGORITHMS = ("none", "zlib", "lzma")
+COMPRESSION_LEVELS = range(0, 10)
+DEFAULT_COMPRESSION = {"algorithm": "zlib", "level": 6}
+NO_COMPRESSION = {"algorithm": "none", "level": 0}
+
+_TAG_ZLIB = b"\x01"
+_TAG_LZMA = b"\x02"
+
+
+def normalize_compression(compression):
+    if not compression:
+        return dict(NO_COMPRESSION)
+    algorithm = compression.get("algorithm", "none")
+    if algorithm not in COMPRESSION_ALGORITHMS:
+        raise VaultError(f"Algoritmo de compresión no soportado: {algorithm}")
+    level = int(compression.get("level", DEFAULT_COMPRESSION["level"]))
+    if level not in COMPRESSION_LEVELS:
+        raise VaultError(f"Nivel de compresión no válido: {level}")
+    return {"algorithm": algorithm, "level": level}
+
+
+def compress_payload(data, compression):
+    algorithm = compression["algorithm"] if compression else "none"
+    if algorithm == "zlib":
+        packed = _TAG_ZLIB + zlib.compress(data, compression["level"])
+    elif algorithm == "lzma":
+        import lzma
+        packed = _TAG_LZMA + lzma.compress(data, preset=compression["level"])
+    else:
+        return data
+    # Las cargas pequeñas (p. ej. un registro del diario) pueden crecer.
+    return packed if len(packed) < len(data) else data
+
+
+def decompress_payload(data):
+    tag = data[:1]
+    try:
+        if tag == _TAG_ZLIB:
+            return zlib.decompress(data[1:])
+        if tag == _TAG_LZMA:
+            # lzma solo se carga para los archivos que lo usan.
+            import lzma
+            try:
+                return lzma.decompress(data[1:])
+            except lzma.LZMAError as e:
+                raise VaultError(f"Datos comprimidos corruptos: {e}") from e
+    except zlib.error as e:
+        raise VaultError(f"Datos comprimidos corruptos: {e}") from e
+    return data
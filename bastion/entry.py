@@ -0,0 +1,121 @@
+import sys
+
+
+# Campos conocidos de una entrada y el atributo (slot) donde se guarda cada
+# uno. Los nombres de campo no se repiten por entrada: viven en esta tabla.
+ENTRY_FIELDS = {
+    "Title": "title",
+    "User Name": "user_name",
+    "Password": "password",
+    "URL": "url",
+    "Notes": "notes",
+    "Creation Time": "creation_time",
+    "Last Modification Time": "modification_time",
+    "UUID": "uuid",
+}
+
+_MISSING = object()
+
+
+class Entry:
+    # Registro compacto de una entrada con vista compatible con dict
+    # (get, [], in, items...), de modo que el resto del código no distingue
+    # entre ambos. Los campos desconocidos (p. ej. de importaciones) van a
+    # `extra`, que solo se crea si hace falta.
+    __slots__ = tuple(ENTRY_FIELDS.values()) + ("extra",)
+
+    def __init__(self, fields=None, **named_fields):
+        for slot in ENTRY_FIELDS.values():
+            object.__setattr__(self, slot, _MISSING)
+        self.extra = None
+        if fields:
+            for name, value in fields.items():
+                self[name] = value
+        for name, value in named_fields.items():
+            self[name] = value
+
+    @classmethod
+    def from_dict(cls, fields):
+        return fields if isinstance(fields, cls) else cls(fields)
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"Entry({self.to_dict()!r})"
+
+    def __getitem__(self, name):
+        slot = ENTRY_FIELDS.get(name)
+        if slot is not None:
+            value = getattr(self, slot)
+            if value is not _MISSING:
+                return value
+        elif self.extra is not None and name in self.extra:
+            return self.extra[name]
+        raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        slot = ENTRY_FIELDS.get(name)
+        if slot is not None:
+            setattr(self, slot, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[sys.intern(name)] = value
+
+    def __delitem__(self, name):
+        slot = ENTRY_FIELDS.get(name)
+        if slot is not None and getattr(self, slot) is not _MISSING:
+            setattr(self, slot, _MISSING)
+        elif self.extra is not None and name in self.extra:
+            del self.extra[name]
+        else:
+            raise KeyError(name)
+
+    def __contains__(self, name):
+        slot = ENTRY_FIELDS.get(name)
+        if slot is not None:
+            return getattr(self, slot) is not _MISSING
+        return self.extra is not None and name in self.extra
+
+    def get(self, name, default=None):
+        slot = ENTRY_FIELDS.get(name)
+        if slot is not None:
+            value = getattr(self, slot)
+            return default if value is _MISSING else value
+        if self.extra is not None:
+            return self.extra.get(name, default)
+        return default
+
+    def keys(self):
+        return [name for name, _ in self.items()]
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def items(self):
+        items = [(name, getattr(self, slot)) for name, slot in ENTRY_FIELDS.items()
+                 if getattr(self, slot) is not _MISSING]
+        if self.extra:
+            items.extend(self.extra.items())
+        return items
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (Entry, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+
+def entry_to_json(value):
+    # Para json.dumps(..., default=entry_to_json).
+    if isinstance(value, Entry):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,22 @@
+class VaultError(Exception):
+    pass
+
+
+class DecryptionError(VaultError):
+    pass
+
+
+class WrongPasswordError(DecryptionError):
+    pass
+
+
+class QuickUnlockError(VaultError):
+    pass
+
+
+class SessionExpiredError(QuickUnlockError):
+    pass
+
+
+class ImportFileError(VaultError):
+    pass
@@ -0,0 +1,333 @@
+import base64
+import csv
+import datetime
+import hashlib
+import hmac
+import io
+import json
+import os
+import re
+import struct
+from collections import namedtuple
+
+from bastion.compression import DEFAULT_COMPRESSION, compress_payload
+from bastion.entry import entry_to_json
+from bastion.errors import VaultError, WrongPasswordError
+from bastion.file_format import derive_key, key_check_value, new_cipher, validate_kdf_params
+from bastion.groups import ENTRY_ID_FIELD
+from bastion.importers import KEEPASS_FIELDS, KEEPASS_TIMES
+from bastion.migrations import migrate_entry
+from bastion.tracing import traced
+from bastion.vault import decrypt_payload, iter_group_block, new_master_key
+
+
+# Exportación por streaming: se recorren los grupos uno a uno y cada entrada
+# se escribe en cuanto se lee, sin construir una copia de la bóveda. Los
+# grupos que aún no se han desencriptado se leen del archivo solo para la
+# exportación y se descartan después, así que la memoria no crece con el
+# tamaño de la bóveda.
+#   csv     = campos básicos (compatible con el importador y con KeePass)
+#   ndjson  = una línea JSON por entrada, con todos sus campos
+#   keepass = XML de KeePass 2.x, con los grupos anidados
+#   json    = el formato de siempre de 'python -m bastion export'
+EXPORT_FORMATS = ("csv", "ndjson", "keepass", "json")
+EXPORT_EXTENSIONS = {"csv": ".csv", "ndjson": ".ndjson", "keepass": ".xml", "json": ".json"}
+
+CSV_EXPORT_COLUMNS = ("Group", "Title", "Username", "Password", "URL", "Notes", "Created", "Last Modified", "UUID")
+KEEPASS_ROOT_GROUP = "Database"
+
+# Exportación encriptada: la salida se cifra por trozos, a medida que se
+# escribe, con una clave derivada de una contraseña propia de la exportación.
+#   MAGIC (8) | versión (u8) | longitud de cabecera (u32) | cabecera JSON
+#   | trozos: longitud (u32) + token Fernet
+# Cada trozo lleva dentro su número de orden y si es el último, de modo que
+# un archivo truncado o con trozos reordenados se detecta al leerlo.
+ENCRYPTED_EXPORT_MAGIC = b"BASTEXP\x00"
+ENCRYPTED_EXPORT_VERSION = 1
+ENCRYPTED_EXPORT_EXTENSION = ".bexport"
+EXPORT_CHUNK_SIZE = 1024 * 1024
+
+_PREAMBLE = struct.Struct(">BI")
+_CHUNK_LENGTH = struct.Struct(">I")
+_CHUNK_HEAD = struct.Struct(">QB")
+_MAX_HEADER_LENGTH = 64 * 1024
+
+_KEEPASS_KEYS = {name: key for key, name in KEEPASS_FIELDS.items()}
+_INVALID_XML_CHARACTERS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+# Grupos de un subárbol preparados para exportar (ver export_source).
+ExportSource = namedtuple("ExportSource", ["file_path", "cipher", "groups"])
+
+
+def export_source(vault, group=None):
+    # En el hilo que posee la bóveda. Para cada grupo del subárbol guarda su
+    # ruta y referencias a sus entradas (no copias) o, si no está cargado, la
+    # posición de su bloque. Después se puede exportar desde otro hilo aunque
+    # la bóveda siga cambiando.
+    if vault.cipher is None:
+        raise VaultError("La base de datos está bloqueada.")
+    start = group or vault.groups.root
+    groups = [(node.path, list(node.entries.values()) if node.loaded else None, node.block)
+              for node in start.iter_subtree() if node is not vault.groups.root]
+    return ExportSource(vault.path, vault.cipher, groups)
+
+
+def iter_export_groups(source, progress=None):
+    total = len(source.groups)
+    for index, (path, entries, block) in enumerate(source.groups):
+        if progress is not None:
+            progress(index / max(1, total))
+        if entries is None:
+            entries = _migrated(iter_group_block(source.file_path, block, source.cipher))
+        yield path, entries
+
+
+def _migrated(entries):
+    for entry in entries:
+        migrate_entry(entry)
+        yield entry
+
+
+def format_timestamp(value):
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return "" if value is None else str(value)
+
+
+def _write_csv(groups, out):
+    writer = csv.writer(out)
+    writer.writerow(CSV_EXPORT_COLUMNS)
+    count = 0
+    for path, entries in groups:
+        for entry in entries:
+            writer.writerow([
+                path, entry.get("Title", ""), entry.get("User Name", ""), entry.get("Password", ""),
+                entry.get("URL", ""), entry.get("Notes", ""), format_timestamp(entry.get("Creation Time")),
+                format_timestamp(entry.get("Last Modification Time")), entry.get(ENTRY_ID_FIELD, ""),
+            ])
+            count += 1
+    return count
+
+
+def _write_ndjson(groups, out):
+    count = 0
+    for path, entries in groups:
+        for entry in entries:
+            out.write(json.dumps({"group": path, "entry": entry}, ensure_ascii=False, default=entry_to_json))
+            out.write("\n")
+            count += 1
+    return count
+
+
+def _write_json(groups, out):
+    # {"ruta": [entradas...], ...}; los grupos sin entradas no aparecen.
+    count = 0
+    out.write("{")
+    for path, entries in groups:
+        opened = False
+        for entry in entries:
+            if not opened:
+                out.write(f"{',' if count else ''}\n  {json.dumps(path, ensure_ascii=False)}: [\n    ")
+                opened = True
+            else:
+                out.write(",\n    ")
+            out.write(json.dumps(entry, ensure_ascii=False, default=entry_to_json))
+            count += 1
+        if opened:
+            out.write("\n  ]")
+    out.write("\n}\n")
+    return count
+
+
+def _xml_text(value):
+    # Sin xml.sax.saxutils, que arrastra urllib al importarse.
+    text = _INVALID_XML_CHARACTERS.sub("", str(value))
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _keepass_uuid(text):
+    try:
+        raw = bytes.fromhex(text) if len(text) == 32 else b""
+    except ValueError:
+        raw = b""
+    if not raw:
+        raw = hashlib.sha256(text.encode('utf-8')).digest()[:16]
+    return base64.b64encode(raw).decode('ascii')
+
+
+def _write_keepass_group_start(out, name, path, depth):
+    indent = "\t" * depth
+    out.write(f"{indent}<Group>\n{indent}\t<UUID>{_keepass_uuid('group:' + path)}</UUID>\n"
+              f"{indent}\t<Name>{_xml_text(name)}</Name>\n")
+
+
+def _write_keepass_entry(out, entry, depth):
+    indent = "\t" * depth
+    out.write(f"{indent}<Entry>\n{indent}\t<UUID>{_keepass_uuid(str(entry.get(ENTRY_ID_FIELD, '')))}</UUID>\n")
+    out.write(f"{indent}\t<Times>\n")
+    for tag, name in KEEPASS_TIMES.items():
+        out.write(f"{indent}\t\t<{tag}>{_xml_text(format_timestamp(entry.get(name)))}</{tag}>\n")
+    out.write(f"{indent}\t</Times>\n")
+    for name, value in entry.items():
+        if name in KEEPASS_TIMES.values() or name == ENTRY_ID_FIELD:
+            continue
+        protected = ' ProtectInMemory="True"' if name == "Password" else ""
+        out.write(f"{indent}\t<String>\n{indent}\t\t<Key>{_xml_text(_KEEPASS_KEYS.get(name, name))}</Key>\n"
+                  f"{indent}\t\t<Value{protected}>{_xml_text(value)}</Value>\n{indent}\t</String>\n")
+    out.write(f"{indent}</Entry>\n")
+
+
+def _write_keepass(groups, out):
+    # Los grupos llegan en preorden (cada uno antes que sus subgrupos), así
+    # que basta con cerrar y abrir etiquetas al cambiar de ruta.
+    out.write('<?xml version="1.0" encoding="utf-8" standalone="yes"?>\n<KeePassFile>\n'
+              '\t<Meta>\n\t\t<Generator>Bastión</Generator>\n\t</Meta>\n\t<Root>\n')
+    _write_keepass_group_start(out, KEEPASS_ROOT_GROUP, "", 2)
+    open_names = []
+    count = 0
+    for path, entries in groups:
+        parts = path.split("/")
+        common = 0
+        while common < min(len(open_names), len(parts)) and open_names[common] == parts[common]:
+            common += 1
+        while len(open_names) > common:
+            out.write("\t" * (len(open_names) + 2) + "</Group>\n")
+            open_names.pop()
+        for part in parts[common:]:
+            open_names.append(part)
+            _write_keepass_group_start(out, part, "/".join(open_names), len(open_names) + 2)
+        for entry in entries:
+            _write_keepass_entry(out, entry, len(open_names) + 3)
+            count += 1
+    while open_names:
+        out.write("\t" * (len(open_names) + 2) + "</Group>\n")
+        open_names.pop()
+    out.write("\t\t</Group>\n\t</Root>\n</KeePassFile>\n")
+    return count
+
+
+_WRITERS = {"csv": _write_csv, "ndjson": _write_ndjson, "keepass": _write_keepass, "json": _write_json}
+
+
+@traced
+def write_export(source, out, file_format, progress=None):
+    # Escribe en un flujo de texto; devuelve el número de entradas exportadas.
+    if file_format not in _WRITERS:
+        raise VaultError(f"Formato de exportación no soportado: {file_format}")
+    count = _WRITERS[file_format](iter_export_groups(source, progress), out)
+    if progress is not None:
+        progress(1.0)
+    return count
+
+
+def export_to_file(source, file_path, file_format, password=None, progress=None):
+    # Con contraseña, la salida se encripta por trozos (EncryptedExportWriter).
+    # Si algo falla, no queda un archivo a medias.
+    try:
+        with open(file_path, 'wb') as f:
+            binary_out = EncryptedExportWriter(f, password) if password else f
+            with io.TextIOWrapper(binary_out, encoding='utf-8', newline="") as text_out:
+                return write_export(source, text_out, file_format, progress)
+    except BaseException as e:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+        if isinstance(e, OSError):
+            raise VaultError(f"No se pudo escribir la exportación: {e}") from e
+        raise
+
+
+class EncryptedExportWriter(io.RawIOBase):
+    # Flujo binario de solo escritura que cifra lo recibido en trozos de
+    # EXPORT_CHUNK_SIZE; close() escribe el último trozo (no cierra `f`).
+
+    def __init__(self, f, password, chunk_size=EXPORT_CHUNK_SIZE):
+        key, salt, kdf_params = new_master_key(password)
+        header_bytes = json.dumps({
+            "salt": base64.b64encode(salt).decode('ascii'),
+            "kdf": kdf_params,
+            "key_check": base64.b64encode(key_check_value(key)).decode('ascii'),
+        }, separators=(",", ":")).encode('utf-8')
+        f.write(ENCRYPTED_EXPORT_MAGIC)
+        f.write(_PREAMBLE.pack(ENCRYPTED_EXPORT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+
+        self._f = f
+        self._cipher = new_cipher(key)
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._chunk_index = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self._chunk_size:
+            self._write_chunk(bytes(self._buffer[:self._chunk_size]), last=False)
+            del self._buffer[:self._chunk_size]
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._write_chunk(bytes(self._buffer), last=True)
+            self._buffer = bytearray()
+        super().close()
+
+    def _write_chunk(self, data, last):
+        payload = compress_payload(_CHUNK_HEAD.pack(self._chunk_index, last) + data, DEFAULT_COMPRESSION)
+        token = self._cipher.encrypt(payload)
+        self._f.write(_CHUNK_LENGTH.pack(len(token)))
+        self._f.write(token)
+        self._chunk_index += 1
+
+
+def is_encrypted_export(file_path):
+    with open(file_path, 'rb') as f:
+        return f.read(len(ENCRYPTED_EXPORT_MAGIC)) == ENCRYPTED_EXPORT_MAGIC
+
+
+def iter_decrypted_export(f, password):
+    # Devuelve el contenido original de una exportación encriptada, trozo a trozo.
+    if f.read(len(ENCRYPTED_EXPORT_MAGIC)) != ENCRYPTED_EXPORT_MAGIC:
+        raise VaultError("El archivo no es una exportación encriptada de Bastión.")
+    try:
+        version, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if version > ENCRYPTED_EXPORT_VERSION or header_length > _MAX_HEADER_LENGTH:
+            raise ValueError(f"versión {version}")
+        header = json.loads(f.read(header_length).decode('utf-8'))
+        salt = base64.b64decode(header["salt"])
+        key_check = base64.b64decode(header["key_check"])
+        kdf_params = validate_kdf_params(header["kdf"])
+    except (struct.error, ValueError, KeyError, TypeError) as e:
+        raise VaultError(f"Exportación corrupta (cabecera ilegible): {e}") from e
+
+    key = derive_key(password, salt, kdf_params)
+    if not hmac.compare_digest(key_check, key_check_value(key)):
+        raise WrongPasswordError("Contraseña de la exportación incorrecta.")
+    cipher = new_cipher(key)
+
+    expected_index = 0
+    while True:
+        length_bytes = f.read(_CHUNK_LENGTH.size)
+        if len(length_bytes) < _CHUNK_LENGTH.size:
+            raise VaultError("Exportación incompleta (faltan trozos al final).")
+        (length,) = _CHUNK_LENGTH.unpack(length_bytes)
+        token = f.read(length)
+        if len(token) != length:
+            raise VaultError("Exportación incompleta (trozo truncado).")
+        payload = decrypt_payload(token, cipher)
+        chunk_index, last = _CHUNK_HEAD.unpack_from(payload)
+        if chunk_index != expected_index:
+            raise VaultError("Exportación corrupta (trozos fuera de orden).")
+        yield payload[_CHUNK_HEAD.size:]
+        if last:
+            return
+        expected_index += 1
+
+
+def decrypt_export(file_path, binary_out, password):
+    with open(file_path, 'rb') as f:
+        for data in iter_decrypted_export(f, password):
+            binary_out.write(data)
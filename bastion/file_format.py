@@ -0,0 +1,243 @@
+import base64
+import hashlib
+import hmac
+import json
+import math
+import os
+import struct
+import time
+from collections import namedtuple
+
+from bastion.compression import NO_COMPRESSION, normalize_compression
+from bastion.errors import VaultError, WrongPasswordError
+from bastion.records import DEFAULT_RECORD_FORMAT, RECORD_FORMATS
+from bastion.tracing import traced
+
+
+# Formato v2:
+#   MAGIC (8 bytes) | versión (u8) | longitud de cabecera (u32, big endian)
+#   | cabecera JSON (utf-8) | bloques | índice (TOC) | cola
+# Cada bloque es un token Fernet con las entradas de un grupo. El índice es
+# otro token Fernet con la ruta y la posición del bloque de cada grupo, y la
+# cola (al final del archivo) apunta al índice. Guardar solo añade los
+# bloques modificados y un índice nuevo al final; lo obsoleto se compacta
+# reescribiendo el archivo completo.
+# En v1 el cuerpo era un único token Fernet con todos los datos. Los archivos
+# antiguos empiezan directamente por la salt en base64 (24 bytes).
+MAGIC = b"BASTION\x00"
+FORMAT_VERSION = 2
+_PREAMBLE = struct.Struct(">BI")
+MAX_HEADER_LENGTH = 64 * 1024
+
+_TRAILER = struct.Struct(">QI4s")
+_TRAILER_MAGIC = b"BTOC"
+_TRAILER_SCAN_CHUNK = 64 * 1024
+
+LEGACY_SALT_B64_LENGTH = 24
+SALT_LENGTH = 16
+KEY_LENGTH = 32
+KEY_CHECK_LENGTH = 16
+_KEY_CHECK_CONTEXT = b"bastion key check v1"
+
+LEGACY_KDF_PARAMS = {"algorithm": "scrypt", "n": 2**14, "r": 8, "p": 1}
+
+KDF_TARGET_SECONDS = 0.5
+KDF_MIN_N = 2**14
+KDF_MAX_MEMORY_BYTES = 256 * 1024 * 1024
+KDF_MAX_R = 32
+KDF_MAX_P = 16
+
+VaultHeader = namedtuple("VaultHeader", ["version", "salt", "kdf_params", "key_check", "compression", "record_format"])
+
+
+def new_cipher(fernet_key_b64):
+    # cryptography se importa la primera vez que hace falta (en el hilo de
+    # trabajo, al abrir o crear una base), no al arrancar la aplicación.
+    from cryptography.fernet import Fernet
+    return Fernet(fernet_key_b64)
+
+
+@traced
+def derive_key(master_password, salt, kdf_params):
+    from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+    if kdf_params.get("algorithm") != "scrypt":
+        raise VaultError(f"Algoritmo de derivación de clave no soportado: {kdf_params.get('algorithm')}")
+
+    kdf = Scrypt(salt=salt, length=KEY_LENGTH, n=kdf_params["n"], r=kdf_params["r"], p=kdf_params["p"])
+    key = kdf.derive(master_password.encode('utf-8'))
+    return base64.urlsafe_b64encode(key)
+
+
+def validate_kdf_params(kdf_params):
+    # Los parámetros vienen del archivo: sin límites, una cabecera manipulada
+    # haría que derivar la clave agotara la memoria o no terminara nunca.
+    if not isinstance(kdf_params, dict) or kdf_params.get("algorithm") != "scrypt":
+        algorithm = kdf_params.get("algorithm") if isinstance(kdf_params, dict) else kdf_params
+        raise VaultError(f"Algoritmo de derivación de clave no soportado: {algorithm}")
+    n, r, p = (kdf_params.get(name) for name in ("n", "r", "p"))
+    if not all(type(value) is int for value in (n, r, p)):
+        raise VaultError("Parámetros de derivación de clave no válidos.")
+    if not 1 <= r <= KDF_MAX_R or not 1 <= p <= KDF_MAX_P:
+        raise VaultError(f"Parámetros de derivación de clave fuera de rango (r={r}, p={p}).")
+    if n < KDF_MIN_N or n & (n - 1) or n * r * 128 > KDF_MAX_MEMORY_BYTES:
+        raise VaultError(f"Parámetros de derivación de clave fuera de rango (n={n}, r={r}).")
+    return kdf_params
+
+
+def key_check_value(fernet_key_b64):
+    raw_key = base64.urlsafe_b64decode(fernet_key_b64)
+    return hmac.new(raw_key, _KEY_CHECK_CONTEXT, hashlib.sha256).digest()[:KEY_CHECK_LENGTH]
+
+
+def verify_key(header, fernet_key_b64):
+    # Rechaza una contraseña incorrecta sin llegar a leer el bloque cifrado.
+    if header.key_check is None:
+        return
+    if not hmac.compare_digest(header.key_check, key_check_value(fernet_key_b64)):
+        raise WrongPasswordError("Contraseña maestra incorrecta.")
+
+
+@traced
+def calibrate_kdf(target_seconds=KDF_TARGET_SECONDS, max_memory_bytes=KDF_MAX_MEMORY_BYTES, r=8, p=1):
+    # Scrypt escala linealmente con n: se mide el coste mínimo y se extrapola
+    # al mayor n (potencia de 2) que cabe en el tiempo y la memoria objetivo.
+    salt = os.urandom(SALT_LENGTH)
+    params = {"algorithm": "scrypt", "n": KDF_MIN_N, "r": r, "p": p}
+
+    base_seconds = min(_time_derivation(salt, params) for _ in range(2))
+    max_n_by_memory = max_memory_bytes // (128 * r)
+    exponent = int(math.log2(max(1.0, target_seconds / max(base_seconds, 1e-6)) * KDF_MIN_N))
+    n = max(KDF_MIN_N, min(2**exponent, 2**int(math.log2(max_n_by_memory))))
+
+    while n > KDF_MIN_N and _time_derivation(salt, dict(params, n=n)) > target_seconds * 1.25:
+        n //= 2
+
+    params["n"] = n
+    return params
+
+
+def _time_derivation(salt, params):
+    start = time.perf_counter()
+    derive_key("calibration", salt, params)
+    return time.perf_counter() - start
+
+
+def read_header(f):
+    magic = f.read(len(MAGIC))
+    if magic != MAGIC:
+        return _read_legacy_header(magic, f)
+
+    preamble = f.read(_PREAMBLE.size)
+    if len(preamble) < _PREAMBLE.size:
+        raise VaultError("Archivo de base de datos corrupto o incompleto (cabecera truncada).")
+    version, header_length = _PREAMBLE.unpack(preamble)
+    if version > FORMAT_VERSION:
+        raise VaultError(f"La base de datos usa una versión de formato más reciente ({version}). Actualice Bastión.")
+    if header_length > MAX_HEADER_LENGTH:
+        raise VaultError("Archivo de base de datos corrupto (cabecera demasiado grande).")
+
+    try:
+        header_fields = json.loads(f.read(header_length).decode('utf-8'))
+        record_format = header_fields.get("records", DEFAULT_RECORD_FORMAT)
+        if record_format not in RECORD_FORMATS:
+            raise VaultError(f"Formato de registros no soportado: {record_format}")
+        return VaultHeader(
+            version=version,
+            salt=base64.b64decode(header_fields["salt"]),
+            kdf_params=validate_kdf_params(header_fields["kdf"]),
+            key_check=base64.b64decode(header_fields["key_check"]),
+            compression=normalize_compression(header_fields.get("compression")),
+            record_format=record_format,
+        )
+    except (ValueError, KeyError, TypeError) as e:
+        raise VaultError(f"Archivo de base de datos corrupto (cabecera ilegible): {e}") from e
+
+
+def _read_legacy_header(start_bytes, f):
+    salt_b64 = start_bytes + f.read(LEGACY_SALT_B64_LENGTH - len(start_bytes))
+    if len(salt_b64) < LEGACY_SALT_B64_LENGTH:
+        raise VaultError("Archivo de base de datos corrupto o incompleto (salt faltante).")
+    try:
+        salt = base64.urlsafe_b64decode(salt_b64)
+    except ValueError as e:
+        raise VaultError("Archivo de base de datos corrupto (salt ilegible).") from e
+    return VaultHeader(version=0, salt=salt, kdf_params=dict(LEGACY_KDF_PARAMS), key_check=None,
+                       compression=dict(NO_COMPRESSION), record_format=DEFAULT_RECORD_FORMAT)
+
+
+def header_length(f):
+    # Posición del primer bloque; solo tiene sentido en archivos v2.
+    f.seek(len(MAGIC))
+    _, length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+    return len(MAGIC) + _PREAMBLE.size + length
+
+
+def read_block(f, location):
+    offset, length = location
+    f.seek(offset)
+    token = f.read(length)
+    if len(token) != length:
+        raise VaultError("Archivo de base de datos corrupto (bloque truncado).")
+    return token
+
+
+def write_block(f, token):
+    offset = f.tell()
+    f.write(token)
+    return offset, len(token)
+
+
+def read_toc_location(f):
+    offset, length, _ = find_toc_trailer(f)
+    return offset, length
+
+
+def find_toc_trailer(f):
+    # Devuelve (posición, longitud, fin) del último índice válido. Si un
+    # guardado por añadido se interrumpió, tras su cola quedan bytes sueltos
+    # que se ignoran; el siguiente guardado los trunca. Una cola solo es
+    # válida si el índice al que apunta termina justo donde empieza ella.
+    first_block = header_length(f)
+    f.seek(0, os.SEEK_END)
+    position = f.tell()
+    overlap = b""
+    while position > first_block:
+        chunk_start = max(first_block, position - _TRAILER_SCAN_CHUNK)
+        f.seek(chunk_start)
+        chunk = f.read(position - chunk_start) + overlap
+        found = chunk.rfind(_TRAILER_MAGIC)
+        while found >= 0:
+            trailer_end = chunk_start + found + len(_TRAILER_MAGIC)
+            trailer_start = trailer_end - _TRAILER.size
+            if trailer_start > first_block:
+                f.seek(trailer_start)
+                offset, length, _ = _TRAILER.unpack(f.read(_TRAILER.size))
+                if length and offset >= first_block and offset + length == trailer_start:
+                    return offset, length, trailer_end
+            found = chunk.rfind(_TRAILER_MAGIC, 0, found + len(_TRAILER_MAGIC) - 1)
+        overlap = chunk[:len(_TRAILER_MAGIC) - 1]
+        position = chunk_start
+    raise VaultError("Archivo de base de datos corrupto o incompleto (índice ilegible).")
+
+
+def write_toc_token(f, token):
+    offset, length = write_block(f, token)
+    f.write(_TRAILER.pack(offset, length, _TRAILER_MAGIC))
+    return offset, length
+
+
+def write_header(f, salt, kdf_params, fernet_key_b64, compression=None, record_format=DEFAULT_RECORD_FORMAT):
+    if record_format not in RECORD_FORMATS:
+        raise VaultError(f"Formato de registros no soportado: {record_format}")
+    header_bytes = json.dumps({
+        "salt": base64.b64encode(salt).decode('ascii'),
+        "kdf": kdf_params,
+        "key_check": base64.b64encode(key_check_value(fernet_key_b64)).decode('ascii'),
+        "compression": normalize_compression(compression),
+        "records": record_format,
+    }, separators=(",", ":")).encode('utf-8')
+
+    f.write(MAGIC)
+    f.write(_PREAMBLE.pack(FORMAT_VERSION, len(header_bytes)))
+    f.write(header_bytes)
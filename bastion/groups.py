@@ -0,0 +1,285 @@
+import hashlib
+import json
+import uuid
+
+from bastion.entry import Entry, entry_to_json
+
+
+ENTRY_ID_FIELD = "UUID"
+
+
+def new_entry_id():
+    return uuid.uuid4().hex
+
+
+def entry_id(entry):
+    return entry[ENTRY_ID_FIELD]
+
+
+def entries_digest(entries_list):
+    serialized = json.dumps(entries_list, sort_keys=True, separators=(",", ":"), default=entry_to_json).encode('utf-8')
+    return hashlib.sha256(serialized).hexdigest()
+
+
+def structure_digest(paths):
+    return hashlib.sha256("\n".join(paths).encode('utf-8')).hexdigest()
+
+
+class GroupNode:
+    # block: posición del bloque cifrado del grupo en el archivo abierto.
+    # loaded: False mientras ese bloque no se ha desencriptado.
+    # dirty: las entradas cambiaron desde la última vez que se escribieron.
+    # digest: huella del contenido escrito por última vez (bloque o diario).
+    __slots__ = ("name", "parent", "children", "entries", "block", "loaded", "dirty", "digest")
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.children = {}
+        self.entries = {}
+        self.block = None
+        self.loaded = True
+        self.dirty = True
+        self.digest = None
+
+    def __repr__(self):
+        return f"GroupNode({self.path!r})"
+
+    @property
+    def path(self):
+        parts = []
+        node = self
+        while node.parent is not None:
+            parts.append(node.name)
+            node = node.parent
+        return "/".join(reversed(parts))
+
+    def is_ancestor_of(self, other):
+        node = other.parent
+        while node is not None:
+            if node is self:
+                return True
+            node = node.parent
+        return False
+
+    def iter_subtree(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(list(node.children.values())))
+
+
+class GroupTree:
+    # Jerarquía de grupos. La raíz es el nodo conceptual "Database" y nunca se
+    # serializa; cada nodo guarda sus subgrupos (en orden) y sus entradas,
+    # indexadas por su UUID.
+    # Con track_changes() cada modificación se anota además en `changes`
+    # (ver bastion.journal); la carga desde archivo no se anota.
+
+    def __init__(self):
+        self.root = GroupNode("")
+        self.entry_groups = {}
+        self.changes = None
+
+    def track_changes(self):
+        self.changes = []
+
+    def take_changes(self):
+        changes = self.changes or []
+        if self.changes is not None:
+            self.changes = []
+        return changes
+
+    def restore_changes(self, changes):
+        if self.changes is not None:
+            self.changes[:0] = changes
+
+    def _log_change(self, op, **fields):
+        if self.changes is not None:
+            fields["op"] = op
+            self.changes.append(fields)
+
+    @classmethod
+    def from_dict(cls, data):
+        tree = cls()
+        for path, entries_list in data.items():
+            group = tree.add_group(path)
+            for entry in entries_list:
+                tree._insert_entry(group, entry)
+        return tree
+
+    @classmethod
+    def from_toc(cls, toc):
+        # Solo la estructura: las entradas se cargan con load_group().
+        tree = cls()
+        for record in toc:
+            group = tree.add_group(record["path"])
+            group.block = tuple(record["block"]) if record["block"] else None
+            group.loaded = group.block is None
+            group.dirty = False
+        return tree
+
+    def load_group(self, group, entries):
+        # entries puede ser un generador que decodifica el bloque; si falla a
+        # medias, el grupo queda como estaba.
+        try:
+            for entry in entries:
+                self._insert_entry(group, entry)
+        except Exception:
+            for removed_id in group.entries:
+                self.entry_groups.pop(removed_id, None)
+            group.entries = {}
+            raise
+        group.loaded = True
+        group.dirty = False
+
+    def unloaded_groups(self):
+        return [node for node in self.nodes() if not node.loaded]
+
+    def to_dict(self):
+        return {path: list(entries.values()) for path, entries in self.items()}
+
+    def entry_count(self):
+        return len(self.entry_groups)
+
+    def find_entry(self, entry_id):
+        group = self.entry_groups.get(entry_id)
+        if group is None:
+            return None, None
+        return group, group.entries[entry_id]
+
+    def _insert_entry(self, group, entry):
+        entry = Entry.from_dict(entry)
+        if not entry.get(ENTRY_ID_FIELD) or entry[ENTRY_ID_FIELD] in self.entry_groups:
+            entry[ENTRY_ID_FIELD] = new_entry_id()
+        group.entries[entry[ENTRY_ID_FIELD]] = entry
+        self.entry_groups[entry[ENTRY_ID_FIELD]] = group
+        group.dirty = True
+        return entry
+
+    def add_entry(self, group, entry):
+        entry = self._insert_entry(group, entry)
+        self._log_change("put_entry", group=group.path, entry=entry)
+        return entry
+
+    def update_entry(self, entry_id, new_entry):
+        group = self.entry_groups[entry_id]
+        old_entry = group.entries[entry_id]
+        new_entry = Entry.from_dict(new_entry)
+        new_entry[ENTRY_ID_FIELD] = entry_id
+        group.entries[entry_id] = new_entry
+        group.dirty = True
+        self._log_change("put_entry", group=group.path, entry=new_entry)
+        return group, old_entry
+
+    def remove_entry(self, entry_id):
+        group = self.entry_groups.pop(entry_id)
+        group.dirty = True
+        self._log_change("delete_entry", group=group.path, id=entry_id)
+        return group, group.entries.pop(entry_id)
+
+    def find(self, path):
+        node = self.root
+        if not path:
+            return node
+        for part in path.split('/'):
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def __contains__(self, path):
+        return bool(path) and self.find(path) is not None
+
+    def __getitem__(self, path):
+        node = self.find(path) if path else None
+        if node is None:
+            raise KeyError(path)
+        return node.entries
+
+    def get(self, path, default=None):
+        node = self.find(path) if path else None
+        return default if node is None else node.entries
+
+    def __len__(self):
+        return sum(1 for _ in self.nodes())
+
+    def __iter__(self):
+        return self.keys()
+
+    def nodes(self):
+        iterator = self.root.iter_subtree()
+        next(iterator)
+        return iterator
+
+    def keys(self):
+        for path, _ in self.items():
+            yield path
+
+    def values(self):
+        for node in self.nodes():
+            yield node.entries
+
+    def items(self):
+        for path, node in self.node_paths():
+            yield path, node.entries
+
+    def node_paths(self):
+        # Recorrido en profundidad construyendo las rutas sobre la marcha.
+        stack = [(child, child.name) for child in reversed(list(self.root.children.values()))]
+        while stack:
+            node, path = stack.pop()
+            yield path, node
+            stack.extend((child, f"{path}/{child.name}") for child in reversed(list(node.children.values())))
+
+    def add_group(self, path):
+        node = self.root
+        created = False
+        for part in path.split('/'):
+            child = node.children.get(part)
+            if child is None:
+                child = GroupNode(part, node)
+                node.children[part] = child
+                created = True
+            node = child
+        if created:
+            self._log_change("add_group", path=path)
+        return node
+
+    def move_group(self, node, new_parent):
+        if node is new_parent or node.is_ancestor_of(new_parent):
+            raise ValueError("No se puede mover un grupo a uno de sus subgrupos.")
+        if node.name in new_parent.children and new_parent.children[node.name] is not node:
+            raise ValueError("Ya existe un grupo con este nombre en el destino.")
+
+        self._log_change("move_group", path=node.path, parent=new_parent.path)
+        del node.parent.children[node.name]
+        new_parent.children[node.name] = node
+        node.parent = new_parent
+        return node
+
+    def rename_group(self, node, new_name):
+        if not new_name or '/' in new_name:
+            raise ValueError("Nombre de grupo no válido.")
+        siblings = node.parent.children
+        if new_name in siblings and siblings[new_name] is not node:
+            raise ValueError("Ya existe un grupo con este nombre en el mismo nivel.")
+
+        self._log_change("rename_group", path=node.path, name=new_name)
+        # Se conserva la posición del grupo entre sus hermanos.
+        node.parent.children = {
+            (new_name if name == node.name else name): child
+            for name, child in siblings.items()
+        }
+        node.name = new_name
+        return node
+
+    def delete_group(self, node):
+        self._log_change("delete_group", path=node.path)
+        for removed in node.iter_subtree():
+            for removed_id in removed.entries:
+                self.entry_groups.pop(removed_id, None)
+        del node.parent.children[node.name]
+        node.parent = None
+        return node
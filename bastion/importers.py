@@ -0,0 +1,335 @@
+import base64
+import binascii
+import csv
+import datetime
+import io
+import os
+import time
+
+from bastion.entry import Entry
+from bastion.errors import ImportFileError
+from bastion.groups import ENTRY_ID_FIELD
+
+
+# Importación por streaming desde CSV y desde el XML de KeePass 2.x
+# ("Exportar > KeePass XML (2.x)"). Los lectores recorren el archivo sin
+# cargarlo entero (csv.reader / iterparse) y entregan lotes de
+# (ruta del grupo, entrada); EntryImporter los inserta en un GroupTree
+# detectando duplicados.
+IMPORT_FORMATS = ("csv", "keepass")
+DUPLICATE_POLICIES = ("skip", "update", "keep")
+DEFAULT_DUPLICATE_POLICY = "skip"
+DEFAULT_BATCH_SIZE = 500
+
+# Grupo para las entradas que no traen ninguno (CSV sin columna de grupo o
+# entradas en la raíz de KeePass).
+FALLBACK_GROUP = "Importado"
+
+# Cabeceras de CSV reconocidas (en minúsculas): KeePass, KeePassXC,
+# Bitwarden, navegadores y las propias de Bastión. El resto de columnas se
+# conservan como campos adicionales de la entrada.
+CSV_COLUMNS = {
+    "title": "Title", "name": "Title", "account": "Title", "título": "Title", "titulo": "Title",
+    "user name": "User Name", "username": "User Name", "login name": "User Name", "login": "User Name",
+    "login_username": "User Name", "usuario": "User Name",
+    "password": "Password", "login_password": "Password", "contraseña": "Password",
+    "url": "URL", "web site": "URL", "website": "URL", "login_uri": "URL",
+    "notes": "Notes", "note": "Notes", "comments": "Notes", "notas": "Notes",
+    "creation time": "Creation Time", "created": "Creation Time",
+    "last modification time": "Last Modification Time", "last modified": "Last Modification Time",
+    "uuid": ENTRY_ID_FIELD,
+}
+CSV_GROUP_COLUMNS = ("group", "grupo", "folder", "path")
+
+KEEPASS_FIELDS = {"Title": "Title", "UserName": "User Name", "Password": "Password", "URL": "URL", "Notes": "Notes"}
+KEEPASS_TIMES = {"CreationTime": "Creation Time", "LastModificationTime": "Last Modification Time"}
+
+# KDBX 4 guarda las fechas como segundos desde 0001-01-01 (base64, little endian).
+_KEEPASS_EPOCH_OFFSET = 62135596800
+
+_TEXT_FIELDS = ("Title", "User Name", "Password", "URL", "Notes")
+_TIMESTAMP_FIELDS = ("Creation Time", "Last Modification Time")
+
+
+def detect_format(file_path):
+    return "keepass" if os.path.splitext(file_path)[1].lower() == ".xml" else "csv"
+
+
+def parse_timestamp(value):
+    # Segundos epoch, o fecha ISO 8601 (la "Z" final de KeePass incluida).
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        pass
+    try:
+        moment = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        return int(moment.timestamp())
+    return int(moment.astimezone(datetime.timezone.utc).timestamp())
+
+
+def _keepass_timestamp(value):
+    timestamp = parse_timestamp(value)
+    if timestamp is not None or not value:
+        return timestamp
+    try:
+        seconds = int.from_bytes(base64.b64decode(value, validate=True), "little")
+    except (binascii.Error, ValueError):
+        return None
+    return seconds - _KEEPASS_EPOCH_OFFSET
+
+
+def _keepass_uuid(value):
+    try:
+        raw = base64.b64decode(value or "", validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return raw.hex() if len(raw) == 16 else None
+
+
+def clean_group_path(parts):
+    # En Bastión "/" separa niveles: dentro de un nombre se sustituye.
+    names = [part.strip().replace("/", "-") for part in parts]
+    return "/".join(name for name in names if name)
+
+
+def _finish_entry(fields):
+    # Completa los campos básicos que falten; None si la fila está vacía.
+    if not any(fields.get(name) for name in ("Title", "User Name", "Password", "URL")):
+        return None
+    entry = Entry(fields)
+    for name in _TEXT_FIELDS:
+        if name not in entry:
+            entry[name] = ""
+    now = int(time.time())
+    if entry.get("Creation Time") is None:
+        entry["Creation Time"] = entry.get("Last Modification Time") or now
+    if entry.get("Last Modification Time") is None:
+        entry["Last Modification Time"] = entry["Creation Time"]
+    return entry
+
+
+class _ProgressFile(io.RawIOBase):
+    # Envoltorio de solo lectura que cuenta los bytes leídos, para calcular
+    # el progreso aunque el lector (csv, iterparse) lea por bloques.
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self.raw.readinto(buffer)
+        self.bytes_read += count or 0
+        return count
+
+
+def _iter_csv(source):
+    text = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [name.strip() for name in header]
+    lowered = [name.lower() for name in columns]
+    group_column = next((index for index, name in enumerate(lowered) if name in CSV_GROUP_COLUMNS), None)
+
+    for row in reader:
+        fields = {}
+        for index, value in enumerate(row[:len(columns)]):
+            if index == group_column or not columns[index]:
+                continue
+            name = CSV_COLUMNS.get(lowered[index], columns[index])
+            if name in _TIMESTAMP_FIELDS:
+                value = parse_timestamp(value)
+            elif name == ENTRY_ID_FIELD:
+                value = value.strip().replace("-", "").lower() or None
+            elif name in ("Title", "User Name", "URL"):
+                value = value.strip()
+            if value not in (None, ""):
+                fields[name] = value
+        entry = _finish_entry(fields)
+        if entry is not None:
+            group_path = row[group_column] if group_column is not None and group_column < len(row) else ""
+            yield clean_group_path(group_path.split("/")), entry
+
+
+def _iter_keepass_xml(source):
+    from xml.etree.ElementTree import iterparse
+
+    recycle_bin_uuid = None
+    group_names = []
+    skipped_depth = None
+    history_depth = 0
+    for event, element in iterparse(source, events=("start", "end")):
+        tag = element.tag
+        if event == "start":
+            if tag == "Group":
+                group_names.append("")
+            elif tag == "History":
+                history_depth += 1
+            continue
+
+        if tag == "RecycleBinUUID":
+            recycle_bin_uuid = element.text
+        elif tag == "History":
+            history_depth -= 1
+        elif tag in ("Name", "UUID") and group_names and len(element) == 0 and not group_names[-1]:
+            # Nombre y UUID del grupo abierto (van antes que sus entradas).
+            if tag == "Name":
+                group_names[-1] = element.text or ""
+            elif recycle_bin_uuid and element.text == recycle_bin_uuid and skipped_depth is None:
+                skipped_depth = len(group_names)
+        elif tag == "Group":
+            if skipped_depth == len(group_names):
+                skipped_depth = None
+            group_names.pop()
+            element.clear()
+        elif tag == "Entry" and history_depth == 0:
+            if skipped_depth is None:
+                entry = _keepass_entry(element)
+                if entry is not None:
+                    # El primer grupo es la raíz de KeePass (el nombre de la base).
+                    yield clean_group_path(group_names[1:]), entry
+            element.clear()
+
+
+def _keepass_entry(element):
+    fields = {}
+    entry_uuid = _keepass_uuid(element.findtext("UUID"))
+    if entry_uuid:
+        fields[ENTRY_ID_FIELD] = entry_uuid
+    for string in element.iterfind("String"):
+        key = string.findtext("Key") or ""
+        value = string.findtext("Value") or ""
+        if key in KEEPASS_FIELDS:
+            fields[KEEPASS_FIELDS[key]] = value
+        elif key and value:
+            fields[key] = value
+    times = element.find("Times")
+    if times is not None:
+        for tag, name in KEEPASS_TIMES.items():
+            timestamp = _keepass_timestamp(times.findtext(tag) or "")
+            if timestamp is not None:
+                fields[name] = timestamp
+    return _finish_entry(fields)
+
+
+def read_import_batches(file_path, file_format=None, batch_size=DEFAULT_BATCH_SIZE):
+    # Generador de (lote, fracción leída del archivo). Seguro en otro hilo:
+    # no toca la bóveda.
+    file_format = file_format or detect_format(file_path)
+    if file_format not in IMPORT_FORMATS:
+        raise ImportFileError(f"Formato de importación no soportado: {file_format}")
+    total_bytes = max(1, os.path.getsize(file_path))
+    from xml.etree.ElementTree import ParseError
+
+    with open(file_path, 'rb', buffering=0) as raw:
+        source = io.BufferedReader(_ProgressFile(raw))
+        rows = _iter_csv(source) if file_format == "csv" else _iter_keepass_xml(source)
+        batch = []
+        try:
+            for item in rows:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    yield batch, min(1.0, source.raw.bytes_read / total_bytes)
+                    batch = []
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise ImportFileError(f"El archivo CSV no es válido: {e}") from e
+        except ParseError as e:
+            raise ImportFileError(f"El archivo XML no es válido: {e}") from e
+        if batch:
+            yield batch, 1.0
+
+
+def duplicate_key(entry):
+    return tuple(str(entry.get(name) or "").strip().casefold() for name in ("Title", "User Name", "URL"))
+
+
+class EntryImporter:
+    # Inserta entradas importadas en un GroupTree, bajo `base_path` si se
+    # indica. Una entrada es duplicada si ya existe otra con su UUID o con el
+    # mismo título, usuario y URL (sin distinguir mayúsculas), esté en el grupo
+    # que esté. Según `duplicates`:
+    #   skip   = no se importa
+    #   update = reemplaza los datos de la existente, que sigue en su grupo
+    #   keep   = se importa igualmente como una entrada nueva
+    # Todos los grupos deben estar cargados (ver GroupTree.unloaded_groups()).
+
+    def __init__(self, groups, duplicates=DEFAULT_DUPLICATE_POLICY, base_path=""):
+        if duplicates not in DUPLICATE_POLICIES:
+            raise ValueError(f"Política de duplicados no válida: {duplicates}")
+        self.groups = groups
+        self.duplicates = duplicates
+        self.base_path = base_path
+        self.added = []
+        self.updated = []
+        self.skipped = 0
+        self.created_groups = 0
+        self._group_cache = {}
+        self._keys = {}
+        if duplicates != "keep":
+            for group in groups.nodes():
+                for existing_id, entry in group.entries.items():
+                    self._keys.setdefault(duplicate_key(entry), existing_id)
+
+    def _group(self, path):
+        path = "/".join(part for part in (self.base_path, path or FALLBACK_GROUP) if part)
+        group = self._group_cache.get(path)
+        if group is None:
+            group = self.groups.find(path)
+            if group is None:
+                parts = path.split("/")
+                node = self.groups.root
+                existing = 0
+                while existing < len(parts) and parts[existing] in node.children:
+                    node = node.children[parts[existing]]
+                    existing += 1
+                group = self.groups.add_group(path)
+                self.created_groups += len(parts) - existing
+            self._group_cache[path] = group
+        return group
+
+    def _find_duplicate(self, entry):
+        imported_id = entry.get(ENTRY_ID_FIELD)
+        if imported_id and imported_id in self.groups.entry_groups:
+            return imported_id
+        return self._keys.get(duplicate_key(entry))
+
+    def add(self, group_path, entry):
+        # Devuelve (grupo, entrada nueva, entrada reemplazada o None), o None
+        # si se omitió por duplicada.
+        if self.duplicates != "keep":
+            existing_id = self._find_duplicate(entry)
+            if existing_id is not None:
+                if self.duplicates == "skip":
+                    self.skipped += 1
+                    return None
+                group, old_entry = self.groups.update_entry(existing_id, entry)
+                new_entry = group.entries[existing_id]
+                self._keys[duplicate_key(new_entry)] = existing_id
+                self.updated.append(existing_id)
+                return group, new_entry, old_entry
+
+        group = self._group(group_path)
+        new_entry = self.groups.add_entry(group, entry)
+        if self.duplicates != "keep":
+            self._keys.setdefault(duplicate_key(new_entry), new_entry[ENTRY_ID_FIELD])
+        self.added.append(new_entry[ENTRY_ID_FIELD])
+        return group, new_entry, None
+
+    def summary(self):
+        parts = [f"{len(self.added)} entradas importadas"]
+        if self.updated:
+            parts.append(f"{len(self.updated)} actualizadas")
+        if self.skipped:
+            parts.append(f"{self.skipped} duplicadas omitidas")
+        if self.created_groups:
+            parts.append(f"{self.created_groups} grupos nuevos")
+        return ", ".join(parts) + "."
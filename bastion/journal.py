@@ -0,0 +1,159 @@
+import json
+import os
+import struct
+
+from bastion.compression import compress_payload, decompress_payload
+from bastion.errors import DecryptionError, VaultError
+from bastion.entry import entry_to_json
+from bastion.groups import ENTRY_ID_FIELD
+from bastion.tracing import traced
+
+
+# Diario de cambios: <base de datos>.journal, junto al archivo principal.
+#   registro = longitud (u32, big endian) | token Fernet con un cambio en JSON
+# El primer registro ("base") guarda la posición del índice del archivo
+# principal sobre el que se escribió el diario; si no coincide con el índice
+# actual, el diario es de una versión anterior y se descarta.
+# Cada registro lleva dentro del token su número de orden ("seq", 0 en la
+# base): cada token se autentica por separado, y sin el número se podrían
+# quitar, repetir o reordenar registros enteros sin que se notara.
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_MAX_BYTES = 1024 * 1024
+JOURNAL_MAX_RECORDS = 1000
+
+_FRAME = struct.Struct(">I")
+
+OP_BASE = "base"
+OP_PUT_ENTRY = "put_entry"
+OP_DELETE_ENTRY = "delete_entry"
+OP_ADD_GROUP = "add_group"
+OP_MOVE_GROUP = "move_group"
+OP_RENAME_GROUP = "rename_group"
+OP_DELETE_GROUP = "delete_group"
+
+
+def journal_path(vault_path):
+    return vault_path + JOURNAL_SUFFIX
+
+
+def remove_journal(vault_path):
+    try:
+        os.remove(journal_path(vault_path))
+    except FileNotFoundError:
+        pass
+
+
+@traced
+def read_journal(vault_path, fernet_cipher, toc_location):
+    # Devuelve (cambios, bytes, registros). Un último registro incompleto
+    # (p. ej. un corte de luz a mitad de escritura) se recorta y se ignora.
+    from cryptography.fernet import InvalidToken
+
+    path = journal_path(vault_path)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return [], 0, 0
+    except OSError as e:
+        raise VaultError(f"No se pudo leer el diario de cambios: {e}") from e
+
+    records = []
+    position = 0
+    # Los diarios anteriores a "seq" no lo tienen; una vez aparece, es obligatorio.
+    sequenced = False
+    while position + _FRAME.size <= len(data):
+        (length,) = _FRAME.unpack_from(data, position)
+        end = position + _FRAME.size + length
+        if end > len(data):
+            break
+        try:
+            payload = decompress_payload(fernet_cipher.decrypt(data[position + _FRAME.size:end]))
+            record = json.loads(payload.decode('utf-8'))
+        except (InvalidToken, ValueError, VaultError) as e:
+            if end == len(data):
+                break
+            raise DecryptionError("Diario de cambios corrupto.") from e
+        sequence = record.pop("seq", None)
+        if sequence is not None:
+            sequenced = True
+        if (sequence is None and sequenced) or (sequence is not None and sequence != len(records)):
+            raise DecryptionError("Diario de cambios corrupto (faltan registros o están fuera de orden).")
+        records.append(record)
+        position = end
+
+    if not records or records[0].get("op") != OP_BASE or tuple(records[0].get("toc") or ()) != tuple(toc_location):
+        remove_journal(vault_path)
+        return [], 0, 0
+
+    if position < len(data):
+        with open(path, 'r+b') as f:
+            f.truncate(position)
+    return records[1:], position, len(records) - 1
+
+
+@traced
+def append_journal(vault_path, changes, fernet_cipher, toc_location, compression=None, journal_records=0):
+    # Devuelve los bytes escritos. Si el diario no existe, empieza por el
+    # registro "base"; si existe, ya tiene `journal_records` cambios.
+    path = journal_path(vault_path)
+    first_sequence = journal_records + 1
+    if not os.path.exists(path):
+        changes = [{"op": OP_BASE, "toc": list(toc_location)}] + list(changes)
+        first_sequence = 0
+
+    frames = []
+    for sequence, change in enumerate(changes, first_sequence):
+        record = dict(change, seq=sequence)
+        token = fernet_cipher.encrypt(compress_payload(json.dumps(record, default=entry_to_json).encode('utf-8'), compression))
+        frames.append(_FRAME.pack(len(token)) + token)
+    payload = b"".join(frames)
+
+    try:
+        with open(path, 'ab') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+    except OSError as e:
+        raise VaultError(f"No se pudo escribir el diario de cambios: {e}") from e
+    return len(payload)
+
+
+def apply_change(tree, change, load_group):
+    # Reaplica un cambio sobre el árbol. load_group(grupo) desencripta el
+    # bloque de un grupo que aún no se ha cargado.
+    op = change["op"]
+    if op == OP_ADD_GROUP:
+        tree.add_group(change["path"])
+    elif op == OP_MOVE_GROUP:
+        group = tree.find(change["path"])
+        new_parent = tree.find(change["parent"])
+        if group is not None and new_parent is not None:
+            tree.move_group(group, new_parent)
+    elif op == OP_RENAME_GROUP:
+        group = tree.find(change["path"])
+        if group is not None:
+            tree.rename_group(group, change["name"])
+    elif op == OP_DELETE_GROUP:
+        group = tree.find(change["path"])
+        if group is not None and group is not tree.root:
+            tree.delete_group(group)
+    elif op == OP_PUT_ENTRY:
+        group = tree.find(change["group"]) or tree.add_group(change["group"])
+        load_group(group)
+        entry = change["entry"]
+        current_group, _ = tree.find_entry(entry.get(ENTRY_ID_FIELD))
+        if current_group is group:
+            tree.update_entry(entry[ENTRY_ID_FIELD], entry)
+        else:
+            if current_group is not None:
+                tree.remove_entry(entry[ENTRY_ID_FIELD])
+            tree.add_entry(group, entry)
+    elif op == OP_DELETE_ENTRY:
+        group = tree.find(change["group"])
+        if group is not None:
+            load_group(group)
+        if tree.find_entry(change["id"])[0] is not None:
+            tree.remove_entry(change["id"])
+    else:
+        raise VaultError(f"Cambio desconocido en el diario: {op}")
@@ -0,0 +1,58 @@
+import datetime
+import re
+import sys
+
+from bastion.groups import ENTRY_ID_FIELD, new_entry_id
+
+
+TIMESTAMP_FIELDS = ("Creation Time", "Last Modification Time")
+
+LEGACY_TIME_FORMAT = "%d/%m/%Y %I:%M:%S %p"
+LEGACY_TIME_FORMAT_24H = "%d/%m/%Y %H:%M:%S"
+
+# Las versiones anteriores guardaban cosas como "05/06/2025 09:15:00 p.m.."
+_MERIDIEM_RE = re.compile(r"\s*([ap])\.?\s*m\.*\s*$", re.IGNORECASE)
+
+
+def parse_legacy_timestamp(value):
+    text = value.strip()
+    match = _MERIDIEM_RE.search(text)
+    if match:
+        meridiem = "AM" if match.group(1).lower() == "a" else "PM"
+        parsed = datetime.datetime.strptime(f"{text[:match.start()].strip()} {meridiem}", LEGACY_TIME_FORMAT)
+    else:
+        parsed = datetime.datetime.strptime(text.rstrip("."), LEGACY_TIME_FORMAT_24H)
+    return int(parsed.timestamp())
+
+
+def migrate_entry(entry):
+    changed = False
+    for field in TIMESTAMP_FIELDS:
+        value = entry.get(field)
+        if isinstance(value, str):
+            try:
+                entry[field] = parse_legacy_timestamp(value)
+                changed = True
+            except ValueError:
+                # A stderr: la salida estándar puede ser una exportación en curso.
+                print(f"Advertencia: fecha no reconocida en '{field}': {value!r}", file=sys.stderr)
+        elif isinstance(value, float):
+            entry[field] = int(value)
+            changed = True
+    return changed
+
+
+def migrate_vault_data(data):
+    changed = False
+    seen_ids = set()
+    for entries_list in data.values():
+        for entry in entries_list:
+            if migrate_entry(entry):
+                changed = True
+            # Los archivos antiguos no tienen identificadores; también se
+            # reasignan los duplicados (p. ej. entradas copiadas a mano).
+            if not entry.get(ENTRY_ID_FIELD) or entry[ENTRY_ID_FIELD] in seen_ids:
+                entry[ENTRY_ID_FIELD] = new_entry_id()
+                changed = True
+            seen_ids.add(entry[ENTRY_ID_FIELD])
+    return changed
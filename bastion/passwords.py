@@ -0,0 +1,134 @@
+import math
+import os
+import string
+import time
+from itertools import combinations
+
+from bastion.entry import Entry
+
+
+AMBIGUOUS_CHARACTERS = "ilo0O1"
+
+# Bytes aleatorios pedidos de más en cada tirada, para que el rechazo casi
+# nunca obligue a pedir otra.
+RANDOM_BYTES_MARGIN = 1.25
+
+DEFAULT_TITLE_PATTERN = "Cuenta {n:03d}"
+DEFAULT_USER_PATTERN = "cuenta{n:03d}"
+# Entradas por llamada en 'Generar Entradas...' (la línea de comandos no
+# tiene límite).
+MAX_PROVISION_ENTRIES = 10000
+
+
+def character_classes(use_uppercase=True, use_lowercase=True, use_digits=True, use_symbols=True, exclude_ambiguous=False):
+    classes = [characters for selected, characters in ((use_uppercase, string.ascii_uppercase),
+                                                       (use_lowercase, string.ascii_lowercase),
+                                                       (use_digits, string.digits),
+                                                       (use_symbols, string.punctuation)) if selected]
+    if exclude_ambiguous:
+        classes = ["".join(c for c in characters if c not in AMBIGUOUS_CHARACTERS) for characters in classes]
+
+    if not classes:
+        raise ValueError("Seleccione al menos un tipo de carácter para generar la contraseña.")
+    return classes
+
+
+def password_alphabet(use_uppercase=True, use_lowercase=True, use_digits=True, use_symbols=True, exclude_ambiguous=False):
+    return "".join(character_classes(use_uppercase, use_lowercase, use_digits, use_symbols, exclude_ambiguous))
+
+
+def entropy_bits(length, classes):
+    # Bits de entropía de una contraseña uniforme entre todas las de `length`
+    # caracteres que contienen al menos uno de cada clase (inclusión-exclusión
+    # sobre las clases que faltan).
+    alphabet_size = sum(len(characters) for characters in classes)
+    valid = 0
+    for missing in range(len(classes) + 1):
+        for subset in combinations(classes, missing):
+            valid += (-1) ** missing * (alphabet_size - sum(len(characters) for characters in subset)) ** length
+    return math.log2(valid) if valid > 0 else 0.0
+
+
+class PasswordGenerator:
+    # Contraseñas con bytes de os.urandom pedidos en bloque. Cada byte se
+    # convierte en un carácter con bytes.translate; los bytes por encima del
+    # mayor múltiplo del tamaño del alfabeto se descartan (sin sesgo de
+    # módulo). Las contraseñas a las que les falta alguna clase se descartan
+    # enteras, así que el resultado es uniforme entre las válidas.
+
+    def __init__(self, length=16, use_uppercase=True, use_lowercase=True, use_digits=True, use_symbols=True,
+                 exclude_ambiguous=False):
+        self.classes = character_classes(use_uppercase, use_lowercase, use_digits, use_symbols, exclude_ambiguous)
+        if length < len(self.classes):
+            raise ValueError(f"La longitud debe ser al menos {len(self.classes)} para incluir todos los tipos de carácter.")
+        self.length = length
+        self.alphabet = "".join(self.classes)
+        self.entropy_bits = entropy_bits(length, self.classes)
+
+        accepted = 256 - 256 % len(self.alphabet)
+        self._accept_ratio = accepted / 256
+        self._table = bytes(ord(self.alphabet[value % len(self.alphabet)]) for value in range(256))
+        self._rejected = bytes(range(accepted, 256))
+        self._class_sets = [frozenset(characters) for characters in self.classes]
+
+    def _random_characters(self, count):
+        characters = ""
+        while len(characters) < count:
+            missing = count - len(characters)
+            raw = os.urandom(int(missing / self._accept_ratio * RANDOM_BYTES_MARGIN) + 16)
+            characters += raw.translate(self._table, self._rejected).decode('ascii')
+        return characters[:count]
+
+    def _has_all_classes(self, password):
+        return all(not class_set.isdisjoint(password) for class_set in self._class_sets)
+
+    def generate(self):
+        return self.generate_batch(1)[0]
+
+    def generate_batch(self, count):
+        passwords = []
+        while len(passwords) < count:
+            missing = count - len(passwords)
+            characters = self._random_characters(missing * self.length)
+            for start in range(0, len(characters), self.length):
+                password = characters[start:start + self.length]
+                if self._has_all_classes(password):
+                    passwords.append(password)
+        return passwords
+
+
+def generate_password(length=16, use_uppercase=True, use_lowercase=True, use_digits=True, use_symbols=True,
+                      exclude_ambiguous=False):
+    return PasswordGenerator(length, use_uppercase, use_lowercase, use_digits, use_symbols, exclude_ambiguous).generate()
+
+
+def generate_passwords(count, length=16, use_uppercase=True, use_lowercase=True, use_digits=True, use_symbols=True,
+                       exclude_ambiguous=False):
+    generator = PasswordGenerator(length, use_uppercase, use_lowercase, use_digits, use_symbols, exclude_ambiguous)
+    return generator.generate_batch(count)
+
+
+def format_pattern(pattern, number):
+    # Título o usuario numerado: 'Cuenta {n:03d}' -> 'Cuenta 007'.
+    try:
+        return pattern.format(n=number)
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(f"Patrón no válido '{pattern}': use {{n}} para el número ({e}).")
+
+
+def provision_entries(generator, count, title_pattern=DEFAULT_TITLE_PATTERN, user_pattern=DEFAULT_USER_PATTERN,
+                      url="", start=1):
+    # Entradas nuevas con credenciales generadas, numeradas desde `start`.
+    if count < 1:
+        raise ValueError("Indique cuántas entradas generar.")
+    current_time = int(time.time())
+    passwords = generator.generate_batch(count)
+    return [Entry({
+        "Title": format_pattern(title_pattern, number),
+        "User Name": format_pattern(user_pattern, number) if user_pattern else "",
+        "Password": password,
+        "URL": url,
+        "Notes": "",
+        "Creation Time": current_time,
+        "Last Modification Time": current_time,
+    }) for number, password in enumerate(passwords, start)]
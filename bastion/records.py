@@ -0,0 +1,117 @@
+import json
+import struct
+import sys
+
+from bastion.errors import VaultError
+
+
+# Formato binario de registros (alternativa compacta al JSON de un bloque):
+#   MAGIC (4) | versión (u8) | nº de nombres (u16) | nombres (u16 + utf-8)...
+#   | nº de entradas (u32) | entradas...
+#   entrada = nº de campos (u16) | campos...
+#   campo   = índice del nombre (u16) | tipo (u8) | valor
+#   valor   = i64 para enteros (marcas de tiempo); u32 + utf-8 para texto y
+#             para cualquier otro valor serializado como JSON.
+# Los nombres de campo se escriben una sola vez por bloque.
+RECORD_MAGIC = b"BREC"
+RECORD_FORMAT_VERSION = 1
+RECORD_FORMATS = ("json", "binary")
+DEFAULT_RECORD_FORMAT = "json"
+
+TYPE_STR = 0
+TYPE_INT = 1
+TYPE_JSON = 2
+
+_U8 = struct.Struct(">B")
+_U16 = struct.Struct(">H")
+_U32 = struct.Struct(">I")
+_I64 = struct.Struct(">q")
+_FIELD_HEAD = struct.Struct(">HB")
+_FIELD_TEXT = struct.Struct(">HBI")
+_FIELD_INT = struct.Struct(">HBq")
+
+_INT_MIN = -2**63
+_INT_MAX = 2**63 - 1
+
+
+def is_binary_records(payload):
+    return payload[:len(RECORD_MAGIC)] == RECORD_MAGIC
+
+
+def encode_entries(entries_list):
+    names = {}
+    body = bytearray(_U32.pack(len(entries_list)))
+    for entry in entries_list:
+        body += _U16.pack(len(entry))
+        for name, value in entry.items():
+            index = names.get(name)
+            if index is None:
+                index = names[name] = len(names)
+            if isinstance(value, str):
+                raw = value.encode('utf-8')
+                body += _FIELD_TEXT.pack(index, TYPE_STR, len(raw))
+                body += raw
+            elif type(value) is int and _INT_MIN <= value <= _INT_MAX:
+                body += _FIELD_INT.pack(index, TYPE_INT, value)
+            else:
+                raw = json.dumps(value).encode('utf-8')
+                body += _FIELD_TEXT.pack(index, TYPE_JSON, len(raw))
+                body += raw
+
+    header = bytearray(RECORD_MAGIC)
+    header += _U8.pack(RECORD_FORMAT_VERSION)
+    header += _U16.pack(len(names))
+    for name in names:
+        raw = name.encode('utf-8')
+        header += _U16.pack(len(raw))
+        header += raw
+    return bytes(header + body)
+
+
+def iter_decode_entries(payload):
+    # Generador: cada entrada se construye directamente desde los bytes, sin
+    # un árbol JSON intermedio.
+    try:
+        position = len(RECORD_MAGIC)
+        (version,) = _U8.unpack_from(payload, position)
+        if version > RECORD_FORMAT_VERSION:
+            raise VaultError(f"Formato de registros más reciente ({version}). Actualice Bastión.")
+        position += _U8.size
+
+        (name_count,) = _U16.unpack_from(payload, position)
+        position += _U16.size
+        names = []
+        for _ in range(name_count):
+            (length,) = _U16.unpack_from(payload, position)
+            position += _U16.size
+            names.append(sys.intern(payload[position:position + length].decode('utf-8')))
+            position += length
+
+        (entry_count,) = _U32.unpack_from(payload, position)
+        position += _U32.size
+        for _ in range(entry_count):
+            (field_count,) = _U16.unpack_from(payload, position)
+            position += _U16.size
+            entry = {}
+            for _ in range(field_count):
+                index, kind = _FIELD_HEAD.unpack_from(payload, position)
+                position += _FIELD_HEAD.size
+                if kind == TYPE_INT:
+                    (value,) = _I64.unpack_from(payload, position)
+                    position += _I64.size
+                else:
+                    (length,) = _U32.unpack_from(payload, position)
+                    position += _U32.size
+                    end = position + length
+                    if end > len(payload):
+                        raise VaultError("Registro binario truncado.")
+                    value = payload[position:end].decode('utf-8')
+                    position = end
+                    if kind == TYPE_JSON:
+                        value = json.loads(value)
+                    elif kind != TYPE_STR:
+                        raise VaultError(f"Tipo de campo desconocido: {kind}")
+                entry[names[index]] = value
+            yield entry
+    except (struct.error, IndexError, UnicodeDecodeError, ValueError) as e:
+        raise VaultError(f"Bloque binario corrupto: {e}") from e
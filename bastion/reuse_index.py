@@ -0,0 +1,63 @@
+import hashlib
+import hmac
+import os
+
+
+PASSWORD_FIELD = "Password"
+
+
+class PasswordReuseIndex:
+    # Entradas agrupadas por contraseña, para detectar reutilizaciones sin
+    # comparar todas las parejas. Se indexa el HMAC de cada contraseña con una
+    # clave aleatoria de la sesión: el índice no guarda contraseñas y sus
+    # huellas no sirven fuera de este proceso. Las contraseñas vacías no cuentan.
+
+    def __init__(self):
+        self._key = os.urandom(32)
+        self._members = {}
+        self._digests = {}
+
+    def __len__(self):
+        return len(self._digests)
+
+    def clear(self):
+        self._members.clear()
+        self._digests.clear()
+
+    def digest(self, password):
+        return hmac.new(self._key, password.encode('utf-8'), hashlib.sha256).digest()
+
+    def build(self, keyed_entries):
+        self.clear()
+        for key, entry in keyed_entries:
+            self.add(key, entry)
+
+    def add(self, key, entry):
+        if key in self._digests:
+            self.remove(key)
+        password = entry.get(PASSWORD_FIELD) or ""
+        if not password:
+            return
+        digest = self.digest(password)
+        self._digests[key] = digest
+        self._members.setdefault(digest, set()).add(key)
+
+    def remove(self, key):
+        digest = self._digests.pop(key, None)
+        if digest is None:
+            return
+        members = self._members[digest]
+        members.discard(key)
+        if not members:
+            del self._members[digest]
+
+    def keys_using(self, password, exclude=None):
+        # Claves de las entradas que usan `password`, sin contar `exclude`.
+        if not password:
+            return set()
+        members = self._members.get(self.digest(password), ())
+        return {key for key in members if key != exclude}
+
+    def reused(self):
+        # Conjuntos de claves que comparten contraseña, los más grandes primero.
+        return sorted((members for members in self._members.values() if len(members) > 1), key=len, reverse=True)
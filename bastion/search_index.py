@@ -0,0 +1,107 @@
+from collections import defaultdict
+
+
+SEARCH_FIELDS = ("Title", "User Name", "URL", "Notes")
+NGRAM_SIZE = 3
+
+
+def _ngrams(text):
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+class TrigramIndex:
+    # Índice invertido de trigramas sobre los campos de búsqueda de cada entrada.
+    # Las claves y los grupos son opacos para el índice: el llamador decide cómo
+    # identificar cada entrada y el grupo en el que vive.
+
+    def __init__(self):
+        self._postings = defaultdict(set)
+        self._fields = {}
+        self._entries = {}
+        self._groups = {}
+        self._group_members = defaultdict(set)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def clear(self):
+        self._postings.clear()
+        self._fields.clear()
+        self._entries.clear()
+        self._groups.clear()
+        self._group_members.clear()
+
+    def build(self, entries_by_group, key_func):
+        self.clear()
+        for group, entries_list in entries_by_group:
+            for entry in entries_list:
+                self.add(key_func(entry), entry, group)
+
+    def add(self, key, entry, group):
+        if key in self._entries:
+            self.remove(key)
+
+        fields = tuple(str(entry.get(field) or "").lower() for field in SEARCH_FIELDS)
+        self._fields[key] = fields
+        self._entries[key] = entry
+        self._groups[key] = group
+        self._group_members[group].add(key)
+
+        for gram in self._fields_ngrams(fields):
+            self._postings[gram].add(key)
+
+    def remove(self, key):
+        fields = self._fields.pop(key, None)
+        if fields is None:
+            return
+
+        del self._entries[key]
+        group = self._groups.pop(key)
+        members = self._group_members.get(group)
+        if members is not None:
+            members.discard(key)
+            if not members:
+                del self._group_members[group]
+
+        for gram in self._fields_ngrams(fields):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def search(self, query, group=None):
+        query = query.lower()
+
+        if group is None:
+            pool = self._entries.keys()
+        else:
+            pool = self._group_members.get(group, set())
+
+        if len(query) < NGRAM_SIZE:
+            candidates = pool
+        else:
+            postings = sorted((self._postings.get(gram, set()) for gram in _ngrams(query)), key=len)
+            candidates = set(postings[0])
+            for keys in postings[1:]:
+                if not candidates:
+                    break
+                candidates &= keys
+            if group is not None:
+                candidates &= pool
+
+        results = []
+        for key in candidates:
+            if any(query in value for value in self._fields[key]):
+                results.append(self._entries[key])
+        return results
+
+    @staticmethod
+    def _fields_ngrams(fields):
+        grams = set()
+        for value in fields:
+            grams |= _ngrams(value)
+        return grams
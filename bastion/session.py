@@ -0,0 +1,81 @@
+import hashlib
+import hmac
+import os
+import time
+
+from bastion.errors import QuickUnlockError, SessionExpiredError
+from bastion.file_format import derive_key, new_cipher
+
+
+# Scrypt barato: el PIN solo protege la clave mientras el proceso sigue vivo;
+# la defensa real es el límite de intentos y la caducidad de la sesión.
+QUICK_UNLOCK_KDF_PARAMS = {"algorithm": "scrypt", "n": 2**12, "r": 8, "p": 1}
+
+DEFAULT_MAX_FAILURES = 3
+DEFAULT_MAX_AGE_SECONDS = 8 * 3600
+MIN_PIN_LENGTH = 4
+
+
+class VaultSession:
+    # Estado en memoria desde la última vez que se introdujo la contraseña
+    # maestra: opcionalmente, la clave maestra envuelta con un PIN de
+    # desbloqueo rápido. No se guarda nada derivado de la contraseña maestra;
+    # para comprobarla hay que derivar la clave (Scrypt) y compararla.
+
+    def __init__(self, max_age_seconds=DEFAULT_MAX_AGE_SECONDS, clock=time.monotonic):
+        self._clock = clock
+        self._secret = os.urandom(32)
+        self.started_at = clock()
+        self.max_age_seconds = max_age_seconds
+        self.max_failures = DEFAULT_MAX_FAILURES
+        self.failures = 0
+        self._pin_salt = None
+        self._wrapped_key = None
+
+    def _mac(self, secret_text):
+        return hmac.new(self._secret, secret_text.encode('utf-8'), hashlib.sha256).digest()
+
+    def is_expired(self):
+        return self._clock() - self.started_at > self.max_age_seconds
+
+    @property
+    def quick_unlock_enabled(self):
+        return self._wrapped_key is not None and not self.is_expired()
+
+    def enable_quick_unlock(self, master_key_b64, pin, max_failures=DEFAULT_MAX_FAILURES):
+        if len(pin) < MIN_PIN_LENGTH:
+            raise QuickUnlockError(f"El PIN debe tener al menos {MIN_PIN_LENGTH} caracteres.")
+        self._pin_salt = os.urandom(16)
+        self._wrapped_key = new_cipher(self._wrapping_key(pin)).encrypt(master_key_b64)
+        self.max_failures = max_failures
+        self.failures = 0
+
+    def disable_quick_unlock(self):
+        self._wrapped_key = None
+        self._pin_salt = None
+        self.failures = 0
+
+    def unlock(self, pin):
+        if self._wrapped_key is None:
+            raise SessionExpiredError("El desbloqueo rápido no está disponible. Introduzca la contraseña maestra.")
+        if self.is_expired():
+            self.disable_quick_unlock()
+            raise SessionExpiredError("La sesión ha caducado. Introduzca la contraseña maestra.")
+
+        from cryptography.fernet import InvalidToken
+
+        try:
+            master_key_b64 = new_cipher(self._wrapping_key(pin)).decrypt(self._wrapped_key)
+        except InvalidToken:
+            self.failures += 1
+            remaining = self.max_failures - self.failures
+            if remaining <= 0:
+                self.disable_quick_unlock()
+                raise SessionExpiredError("Demasiados intentos fallidos. Introduzca la contraseña maestra.")
+            raise QuickUnlockError(f"PIN incorrecto. Intentos restantes: {remaining}.")
+
+        self.failures = 0
+        return master_key_b64
+
+    def _wrapping_key(self, pin):
+        return derive_key(self._mac(pin).hex(), self._pin_salt, QUICK_UNLOCK_KDF_PARAMS)
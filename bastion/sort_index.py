@@ -0,0 +1,66 @@
+import bisect
+import itertools
+
+from bastion.migrations import TIMESTAMP_FIELDS
+
+
+SORTABLE_FIELDS = ("Title", "User Name", "Creation Time", "Last Modification Time")
+
+# Por debajo de esta fracción del total, ordenar el subconjunto con las claves
+# ya calculadas es más barato que recorrer el orden global completo.
+SUBSET_SORT_RATIO = 8
+
+
+def sort_key_for(field, entry):
+    value = entry.get(field)
+    if field in TIMESTAMP_FIELDS:
+        return value if isinstance(value, int) else 0
+    return str(value or "").lower()
+
+
+class SortIndex:
+    # Mantiene todas las entradas ordenadas por un campo. Las claves de orden
+    # se calculan una sola vez al insertar la entrada.
+
+    def __init__(self, field):
+        self.field = field
+        self._order = []
+        self._items = {}
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        self._order = []
+        self._items = {}
+
+    def build(self, keyed_entries):
+        self.clear()
+        for key, entry in keyed_entries:
+            self._items[key] = (sort_key_for(self.field, entry), next(self._sequence))
+        self._order = sorted((sort_key, seq, key) for key, (sort_key, seq) in self._items.items())
+
+    def add(self, key, entry):
+        if key in self._items:
+            self.remove(key)
+        sort_key, seq = sort_key_for(self.field, entry), next(self._sequence)
+        self._items[key] = (sort_key, seq)
+        bisect.insort(self._order, (sort_key, seq, key))
+
+    def remove(self, key):
+        item = self._items.pop(key, None)
+        if item is None:
+            return
+        position = bisect.bisect_left(self._order, (item[0], item[1]))
+        if position < len(self._order) and self._order[position][2] == key:
+            del self._order[position]
+
+    def sort(self, entries, key_func, reverse=False):
+        if len(entries) * SUBSET_SORT_RATIO < len(self._order):
+            items = self._items
+            return sorted(entries, key=lambda entry: items[key_func(entry)], reverse=reverse)
+
+        by_key = {key_func(entry): entry for entry in entries}
+        order = reversed(self._order) if reverse else self._order
+        return [by_key[key] for _, _, key in order if key in by_key]
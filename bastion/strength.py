@@ -0,0 +1,525 @@
+import datetime
+import functools
+import math
+import re
+from collections import namedtuple
+
+from bastion.wordlists import fold_character, word_automaton
+
+
+# Fortaleza de una contraseña de 0 (muy débil) a 4 (muy fuerte) según el
+# número de intentos que necesitaría un atacante, al estilo de zxcvbn: se
+# buscan palabras de diccionario (también al revés o con sustituciones como
+# 4->a), recorridos de teclado, fechas, repeticiones y secuencias, y se elige
+# la combinación de patrones que menos intentos necesita. Sin estado ni
+# dependencias de Tk, de modo que se puede usar en procesos aparte (ver
+# bastion.audit).
+STRENGTH_LABELS = ("Muy Débil", "Débil", "Moderada", "Fuerte", "Muy Fuerte")
+
+# Intentos a partir de los cuales se sube de nivel (mismos umbrales que zxcvbn).
+SCORE_THRESHOLDS = (10 ** 3 + 5, 10 ** 6 + 5, 10 ** 8 + 5, 10 ** 10 + 5)
+
+BRUTEFORCE_CARDINALITY = 10
+MIN_GUESSES_BEFORE_GROWING_SEQUENCE = 10000
+MIN_SUBMATCH_GUESSES_SINGLE_CHAR = 10
+MIN_SUBMATCH_GUESSES_MULTI_CHAR = 50
+
+# Patrones como máximo en la combinación elegida. Con N patrones la
+# estimación ya supera 10000^(N-1) intentos (nivel 4 desde N = 4), así que el
+# límite no cambia el nivel y acota el trabajo en contraseñas repetitivas.
+MAX_SEQUENCE_PATTERNS = 8
+
+MIN_PATTERN_LENGTH = 3
+MAX_SEQUENCE_DELTA = 5
+MAX_REPEAT_BASE = 32
+MIN_YEAR_SPACE = 20
+DATE_MIN_YEAR = 1000
+DATE_MAX_YEAR = 2050
+REFERENCE_YEAR = datetime.date.today().year
+# Cortes posibles de una fecha sin separadores, por longitud (como en zxcvbn).
+DATE_SPLITS = {
+    4: ((1, 2), (2, 3)),
+    5: ((1, 3), (2, 3)),
+    6: ((1, 2), (2, 4), (4, 5)),
+    7: ((1, 3), (2, 3), (4, 5), (4, 6)),
+    8: ((2, 4), (4, 6)),
+}
+_DATE_WITH_SEPARATOR = re.compile(r"^(\d{1,4})([\s/\\_.-])(\d{1,2})\2(\d{1,4})$")
+_RECENT_YEAR = re.compile(r"^(19|20)\d\d$")
+
+LEET_SUBSTITUTIONS = {
+    "4": "a", "@": "a", "8": "b", "(": "c", "3": "e", "6": "g", "9": "g", "1": "i", "!": "i", "|": "i",
+    "0": "o", "$": "s", "5": "s", "7": "t", "+": "t", "2": "z",
+}
+
+Match = namedtuple("Match", ["start", "end", "pattern", "token", "guesses"])
+Estimate = namedtuple("Estimate", ["guesses", "score", "sequence"])
+KeyboardGraph = namedtuple("KeyboardGraph", ["adjacency", "shifted", "keys", "average_degree"])
+
+# Vecinos en un teclado escalonado (coordenadas en medias teclas) y en un
+# teclado numérico alineado.
+_SLANTED_DIRECTIONS = ((-2, 0), (2, 0), (-1, -1), (1, -1), (-1, 1), (1, 1))
+_ALIGNED_DIRECTIONS = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+def _keyboard_graph(positions, directions):
+    adjacency = {}
+    shifted = set()
+    degrees = 0
+    for (x, y), key in positions.items():
+        neighbors = {}
+        for direction, (dx, dy) in enumerate(directions):
+            other = positions.get((x + dx, y + dy))
+            if other:
+                degrees += 1
+                for character in other:
+                    neighbors[character] = direction
+        for character in key:
+            adjacency[character] = neighbors
+        shifted.update(key[1:])
+    return KeyboardGraph(adjacency, frozenset(shifted), len(positions), degrees / len(positions))
+
+
+def _slanted_keyboard(rows):
+    # rows: (desplazamiento de la fila en medias teclas, teclas "sinShift+conShift").
+    return _keyboard_graph({(offset + 2 * index, y): key
+                            for y, (offset, keys) in enumerate(rows) for index, key in enumerate(keys.split())},
+                           _SLANTED_DIRECTIONS)
+
+
+def _aligned_keypad(rows):
+    return _keyboard_graph({(x, y): key for y, keys in enumerate(rows) for x, key in enumerate(keys) if key != "_"},
+                           _ALIGNED_DIRECTIONS)
+
+
+KEYBOARD_GRAPHS = (
+    _slanted_keyboard((
+        (0, "`~ 1! 2@ 3# 4$ 5% 6^ 7& 8* 9( 0) -_ =+"),
+        (3, "qQ wW eE rR tT yY uU iI oO pP [{ ]} \\|"),
+        (4, "aA sS dD fF gG hH jJ kK lL ;: '\""),
+        (5, "zZ xX cC vV bB nN mM ,< .> /?"),
+    )),
+    _slanted_keyboard((
+        (0, "ºª 1! 2\" 3· 4$ 5% 6& 7/ 8( 9) 0= '? ¡¿"),
+        (3, "qQ wW eE rR tT yY uU iI oO pP `^ +*"),
+        (4, "aA sS dD fF gG hH jJ kK lL ñÑ ´¨ çÇ"),
+        (3, "<> zZ xX cC vV bB nN mM ,; .: -_"),
+    )),
+    _aligned_keypad(("_/*-", "789+", "456_", "123_", "_0._")),
+)
+_NO_NEIGHBORS = {}
+
+
+def _variations(changed, unchanged):
+    # Formas de elegir qué caracteres van cambiados (mayúsculas, sustituciones).
+    if not changed or not unchanged:
+        return 2
+    return sum(math.comb(changed + unchanged, count) for count in range(1, min(changed, unchanged) + 1))
+
+
+def uppercase_variations(token):
+    upper = sum(1 for character in token if character.isupper())
+    if not upper:
+        return 1
+    lower = sum(1 for character in token if character.islower())
+    # Todo en mayúsculas, o solo la primera o la última letra.
+    if not lower or (upper == 1 and (token[0].isupper() or token[-1].isupper())):
+        return 2
+    return _variations(upper, lower)
+
+
+def leet_variations(token):
+    variations = 1
+    folded = [fold_character(character) for character in token]
+    for substituted in {character for character in token if character in LEET_SUBSTITUTIONS}:
+        letter = LEET_SUBSTITUTIONS[substituted]
+        variations *= _variations(token.count(substituted), folded.count(letter))
+    return variations
+
+
+def _spatial_walks(graph, length, turns):
+    # Recorridos de exactamente `length` teclas con 1..`turns` giros.
+    degree = graph.average_degree
+    if turns >= length - 1:
+        # Todos los giros posibles: d * suma de C(n-1, k) d^k para k < n-1.
+        return graph.keys * degree * ((1 + degree) ** (length - 1) - degree ** (length - 1))
+    return graph.keys * sum(math.comb(length - 1, walk_turns - 1) * degree ** walk_turns
+                            for walk_turns in range(1, turns + 1))
+
+
+def extend_spatial_walks(graph, length, turns, previous):
+    # Recorridos de 2..`length` teclas con hasta `turns` giros, a partir del
+    # mismo total para el recorrido una tecla más corto (`previous`, con
+    # `turns` o `turns` - 1 giros). Así cada tecla nueva cuesta O(giros) y no
+    # O(longitud x giros). Con un giro más, cada longitud i < `length` suma
+    # C(i-1, turns-1) recorridos de exactamente `turns` giros; en total,
+    # C(length-1, turns) - 1.
+    if previous is None:
+        return _spatial_walks(graph, length, turns)
+    previous_turns, total = previous
+    if turns > previous_turns:
+        total += graph.keys * graph.average_degree ** turns * max(0, math.comb(length - 1, turns) - 1)
+    return total + _spatial_walks(graph, length, turns)
+
+
+def spatial_guesses(walks, length, shifted):
+    guesses = int(walks)
+    if shifted:
+        guesses *= 2 if shifted == length else _variations(shifted, length - shifted)
+    return guesses
+
+
+def sequence_guesses(token, ascending):
+    if token[0] in "aAzZ019":
+        base = 4
+    elif token[0].isdigit():
+        base = 10
+    else:
+        base = 26
+    return base * (1 if ascending else 2) * len(token)
+
+
+def _two_to_four_digit_year(year):
+    if year > 99:
+        return year
+    return 1900 + year if year > 50 else 2000 + year
+
+
+def _day_month(day, month):
+    for candidate_day, candidate_month in ((day, month), (month, day)):
+        if 1 <= candidate_day <= 31 and 1 <= candidate_month <= 12:
+            return candidate_day, candidate_month
+    return None
+
+
+def _date_year(numbers):
+    # Año de una fecha día/mes/año en cualquier orden, o None si no lo es.
+    if numbers[1] > 31 or numbers[1] <= 0:
+        return None
+    if any(99 < number < DATE_MIN_YEAR or number > DATE_MAX_YEAR for number in numbers):
+        return None
+    if sum(number > 31 for number in numbers) >= 2 or sum(number > 12 for number in numbers) == 3:
+        return None
+    if sum(number <= 0 for number in numbers) >= 2:
+        return None
+    year_splits = ((numbers[2], numbers[:2]), (numbers[0], numbers[1:]))
+    for year, rest in year_splits:
+        if DATE_MIN_YEAR <= year <= DATE_MAX_YEAR:
+            return year if _day_month(*rest) else None
+    for year, rest in year_splits:
+        if _day_month(*rest):
+            return _two_to_four_digit_year(year)
+    return None
+
+
+@functools.lru_cache(maxsize=4096)
+def date_guesses(token):
+    # Intentos para `token` si es una fecha (con o sin separadores) o un año
+    # reciente; None si no lo es.
+    year, separator = None, False
+    match = _DATE_WITH_SEPARATOR.match(token)
+    if match:
+        year = _date_year((int(match.group(1)), int(match.group(3)), int(match.group(4))))
+        separator = year is not None
+    elif token.isdigit() and len(token) in DATE_SPLITS:
+        years = [_date_year((int(token[:first]), int(token[first:second]), int(token[second:])))
+                 for first, second in DATE_SPLITS[len(token)]]
+        years = [year for year in years if year is not None]
+        if years:
+            year = min(years, key=lambda candidate: abs(candidate - REFERENCE_YEAR))
+    if year is None:
+        if not _RECENT_YEAR.match(token):
+            return None
+        return max(abs(int(token) - REFERENCE_YEAR), MIN_YEAR_SPACE)
+    guesses = max(abs(year - REFERENCE_YEAR), MIN_YEAR_SPACE) * 365
+    return guesses * 4 if separator else guesses
+
+
+_BRUTEFORCE_GUESSES = [max(BRUTEFORCE_CARDINALITY ** length,
+                           (MIN_SUBMATCH_GUESSES_SINGLE_CHAR if length == 1 else MIN_SUBMATCH_GUESSES_MULTI_CHAR) + 1)
+                       for length in range(129)]
+
+
+def _bruteforce_guesses(length):
+    if length < len(_BRUTEFORCE_GUESSES):
+        return _BRUTEFORCE_GUESSES[length]
+    return BRUTEFORCE_CARDINALITY ** length
+
+
+def score_for_guesses(guesses):
+    for score, threshold in enumerate(SCORE_THRESHOLDS):
+        if guesses < threshold:
+            return score
+    return len(SCORE_THRESHOLDS)
+
+
+class StrengthEstimator:
+    # Todo el análisis de la posición k depende solo de los caracteres hasta
+    # k: el estado del autómata de diccionarios, los recorridos de teclado,
+    # secuencias y repeticiones que terminan en k, y la mejor combinación de
+    # patrones para el prefijo. Al estimar una contraseña que comparte
+    # prefijo con la anterior (se ha escrito o borrado al final) solo se
+    # recalculan las posiciones nuevas.
+
+    def __init__(self):
+        self._automaton = word_automaton()
+        self._password = ""
+        # Por posición: estados del autómata sobre el texto normalizado y con
+        # sustituciones deshechas, recorridos por teclado, secuencia,
+        # repeticiones por longitud de base y (match, producto, intentos) por
+        # número de patrones.
+        self._plain_states = []
+        self._leet_states = []
+        self._walks = []
+        self._sequences = []
+        self._periods = []
+        self._optimal = []
+        # Posiciones cuya mejor combinación acaba en algún patrón: las únicas
+        # tras las que puede empezar un tramo de fuerza bruta.
+        self._pattern_positions = []
+        self._base_guesses = {}
+
+    def estimate(self, password):
+        common = 0
+        for old, new in zip(self._password, password):
+            if old != new:
+                break
+            common += 1
+        for table in (self._plain_states, self._leet_states, self._walks, self._sequences, self._periods, self._optimal):
+            del table[common:]
+        while self._pattern_positions and self._pattern_positions[-1] >= common:
+            self._pattern_positions.pop()
+        self._password = password
+        for position in range(common, len(password)):
+            self._advance(position)
+        return self._result()
+
+    def _result(self):
+        if not self._password:
+            return Estimate(1, 0, [])
+        position = len(self._password) - 1
+        matches_by_count, _, guesses_by_count = self._optimal[position]
+        count = min(guesses_by_count, key=guesses_by_count.get)
+        guesses = guesses_by_count[count]
+        sequence = []
+        while position >= 0:
+            match = self._optimal[position][0][count]
+            sequence.append(match)
+            position = match.start - 1
+            count -= 1
+        sequence.reverse()
+        return Estimate(guesses, score_for_guesses(guesses), sequence)
+
+    def _match(self, start, end, pattern, guesses):
+        minimum = MIN_SUBMATCH_GUESSES_SINGLE_CHAR if end - start == 1 else MIN_SUBMATCH_GUESSES_MULTI_CHAR
+        return Match(start, end, pattern, self._password[start:end], max(guesses, minimum))
+
+    def _advance(self, position):
+        password = self._password
+        character = password[position]
+        previous = password[position - 1] if position else None
+        end = position + 1
+        matches = []
+
+        # Diccionarios: normalizado (minúsculas, sin tildes) y, además, con
+        # las sustituciones tipo 4->a deshechas.
+        automaton = self._automaton
+        folded = fold_character(character)
+        plain_state = automaton.step(self._plain_states[-1] if position else 0, folded)
+        leet_state = automaton.step(self._leet_states[-1] if position else 0, LEET_SUBSTITUTIONS.get(character, folded))
+        self._plain_states.append(plain_state)
+        self._leet_states.append(leet_state)
+        for state, leet in ((plain_state, False), (leet_state, True)):
+            for length, rank in automaton.words_at(state):
+                token = password[end - length:end]
+                if leet and not any(token_character in LEET_SUBSTITUTIONS for token_character in token):
+                    continue
+                guesses = abs(rank) * uppercase_variations(token) * (2 if rank < 0 else 1)
+                if leet:
+                    guesses *= leet_variations(token)
+                matches.append(self._match(end - length, end, "dictionary", guesses))
+
+        # Recorridos de teclado: (inicio, giros, última dirección, con Shift,
+        # recorridos posibles hasta esta longitud; ver extend_spatial_walks).
+        walks = []
+        for index, graph in enumerate(KEYBOARD_GRAPHS):
+            walk = None
+            direction = graph.adjacency.get(previous, _NO_NEIGHBORS).get(character) if position else None
+            if direction is not None:
+                previous_walk = self._walks[-1][index]
+                is_shifted = character in graph.shifted
+                if previous_walk is None:
+                    start, turns, shifted = position - 1, 1, (previous in graph.shifted) + is_shifted
+                    total = extend_spatial_walks(graph, 2, turns, None)
+                else:
+                    start, previous_turns, last_direction, shifted, total = previous_walk
+                    turns = previous_turns + (direction != last_direction)
+                    shifted += is_shifted
+                    total = extend_spatial_walks(graph, end - start, turns, (previous_turns, total))
+                walk = (start, turns, direction, shifted, total)
+                length = end - start
+                if length >= MIN_PATTERN_LENGTH:
+                    matches.append(self._match(start, end, "spatial", spatial_guesses(total, length, shifted)))
+            walks.append(walk)
+        self._walks.append(walks)
+
+        # Secuencias (abcd, 9753): diferencia constante entre caracteres.
+        if position:
+            delta = ord(character) - ord(previous)
+            start, previous_delta = self._sequences[-1]
+            sequence = (start, delta) if delta == previous_delta else (position - 1, delta)
+        else:
+            sequence = (0, None)
+        self._sequences.append(sequence)
+        start, delta = sequence
+        if end - start >= MIN_PATTERN_LENGTH and 0 < abs(delta) <= MAX_SEQUENCE_DELTA:
+            matches.append(self._match(start, end, "sequence", sequence_guesses(password[start:end], delta > 0)))
+
+        # Repeticiones (aaaa, abcabc): para cada longitud de base, cuántos
+        # caracteres seguidos coinciden con el que está una base más atrás.
+        # Solo se guardan las longitudes con coincidencia, de menor a mayor.
+        previous_periods = self._periods[-1] if position else {}
+        periods = {}
+        lowest = max(0, position - MAX_REPEAT_BASE)
+        found = password.rfind(character, lowest, position)
+        while found >= 0:
+            base_length = position - found
+            periods[base_length] = previous_periods.get(base_length, 0) + 1
+            found = password.rfind(character, lowest, found)
+        self._periods.append(periods)
+        for base_length, run in periods.items():
+            if run >= base_length:
+                repeat_count = (run + base_length) // base_length
+                start = end - repeat_count * base_length
+                # La base se toma donde empieza la repetición, no donde empieza
+                # el match: al avanzar solo rota, y así se estima una vez por
+                # repetición y no una vez por posición.
+                run_start = end - run - base_length
+                base = password[run_start:run_start + base_length]
+                matches.append(self._match(start, end, "repeat", self._repeat_base_guesses(base) * repeat_count))
+                break
+
+        # Fechas y años.
+        if character.isdigit():
+            for length in range(4, 11):
+                start = end - length
+                if start < 0:
+                    break
+                if password[start].isdigit():
+                    guesses = date_guesses(password[start:end])
+                    if guesses is not None:
+                        matches.append(self._match(start, end, "date", guesses))
+
+        self._optimal.append(({}, {}, {}))
+        for match in matches:
+            if match.start:
+                for count in list(self._optimal[match.start - 1][0]):
+                    self._update(match, count + 1)
+            else:
+                self._update(match, 1)
+        self._bruteforce_update(position)
+        if any(match.pattern != "bruteforce" for match in self._optimal[position][0].values()):
+            self._pattern_positions.append(position)
+
+    def _repeat_base_guesses(self, base):
+        guesses = self._base_guesses.get(base)
+        if guesses is None:
+            if len(self._base_guesses) > 256:
+                self._base_guesses.clear()
+            guesses = self._base_guesses[base] = StrengthEstimator().estimate(base).guesses
+        return guesses
+
+    def _update(self, match, count):
+        # Mejor combinación de `count` patrones que termina con `match`
+        # (penaliza el número de patrones igual que zxcvbn).
+        if count > MAX_SEQUENCE_PATTERNS:
+            return
+        product = match.guesses
+        if count > 1:
+            product *= self._optimal[match.start - 1][1][count - 1]
+        guesses = math.factorial(count) * product + MIN_GUESSES_BEFORE_GROWING_SEQUENCE ** (count - 1)
+        slot = self._optimal[match.end - 1]
+        if not self._dominated(slot, count, guesses):
+            self._store(slot, match, count, product, guesses)
+
+    @staticmethod
+    def _dominated(slot, count, guesses):
+        for other_count, other_guesses in slot[2].items():
+            if other_count <= count and other_guesses <= guesses:
+                return True
+        return False
+
+    @staticmethod
+    def _store(slot, match, count, product, guesses):
+        matches_by_count, products, guesses_by_count = slot
+        # Una combinación con más patrones y un producto ponderado (k! x
+        # producto) mayor o igual nunca gana a esta, se alargue como se
+        # alargue: se descarta para no seguir extendiéndola.
+        weighted = math.factorial(count) * product
+        for other_count in [other_count for other_count in products if other_count > count
+                            and math.factorial(other_count) * products[other_count] >= weighted]:
+            del matches_by_count[other_count], products[other_count], guesses_by_count[other_count]
+        matches_by_count[count] = match
+        products[count] = product
+        guesses_by_count[count] = guesses
+
+    def _bruteforce_update(self, position):
+        end = position + 1
+        self._update(self._bruteforce_match(0, end), 1)
+        slot = self._optimal[position]
+        best_single = slot[2][1]
+        # De la posición más cercana a la más lejana: el tramo de fuerza bruta
+        # solo crece, y cuando ni el mínimo posible (2 patrones, producto 1)
+        # mejora la mejor estimación de un solo patrón, ya no hay nada que ganar.
+        for last_position in reversed(self._pattern_positions):
+            bruteforce_guesses = _bruteforce_guesses(end - last_position - 1)
+            if 2 * bruteforce_guesses + MIN_GUESSES_BEFORE_GROWING_SEQUENCE >= best_single:
+                break
+            match = None
+            last_matches, last_products, _ = self._optimal[last_position]
+            for count, last_match in list(last_matches.items()):
+                if last_match.pattern == "bruteforce" or count >= MAX_SEQUENCE_PATTERNS:
+                    continue
+                product = bruteforce_guesses * last_products[count]
+                guesses = math.factorial(count + 1) * product + MIN_GUESSES_BEFORE_GROWING_SEQUENCE ** count
+                if self._dominated(slot, count + 1, guesses):
+                    continue
+                if match is None:
+                    match = self._bruteforce_match(last_position + 1, end)
+                self._store(slot, match, count + 1, product, guesses)
+
+    def _bruteforce_match(self, start, end):
+        return Match(start, end, "bruteforce", self._password[start:end], _bruteforce_guesses(end - start))
+
+
+PATTERN_DESCRIPTIONS = {
+    "dictionary": "palabra común",
+    "spatial": "recorrido de teclado",
+    "sequence": "secuencia",
+    "repeat": "repetición",
+    "date": "fecha",
+}
+
+
+def describe_patterns(estimate):
+    # Texto breve con los patrones fáciles de adivinar de una estimación.
+    return ", ".join(f"{PATTERN_DESCRIPTIONS[match.pattern]} «{match.token}»"
+                     for match in estimate.sequence if match.pattern in PATTERN_DESCRIPTIONS)
+
+
+def strength_score(password):
+    return StrengthEstimator().estimate(password).score
+
+
+def strength_label(password):
+    return STRENGTH_LABELS[strength_score(password)]
+
+
+def score_passwords(passwords):
+    # En orden alfabético, para que un solo estimador aproveche los prefijos
+    # comunes entre contraseñas consecutivas.
+    estimator = StrengthEstimator()
+    scores = [0] * len(passwords)
+    for index in sorted(range(len(passwords)), key=passwords.__getitem__):
+        scores[index] = estimator.estimate(passwords[index]).score
+    return scores
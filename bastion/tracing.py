@@ -0,0 +1,165 @@
+import atexit
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+# Medición de tiempos desactivada por defecto. Con BASTION_TRACE=archivo.json
+# (o --trace) se registra cada tramo marcado con span()/traced(): se guardan
+# percentiles móviles por nombre y, al salir, un archivo en formato Chrome
+# trace (chrome://tracing, Perfetto). BASTION_PROFILE=archivo.prof (o
+# --profile) guarda además estadísticas de cProfile de toda la ejecución.
+
+TRACE_ENV_VAR = "BASTION_TRACE"
+PROFILE_ENV_VAR = "BASTION_PROFILE"
+
+# Duraciones recientes por nombre para los percentiles, y límite de eventos
+# que se conservan para el archivo de traza.
+PERCENTILE_WINDOW = 512
+MAX_TRACE_EVENTS = 200000
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.trace_path = None
+        self.last_span = None
+        self._origin = time.perf_counter()
+        self._events = deque(maxlen=MAX_TRACE_EVENTS)
+        self._samples = {}
+        self._thread_names = {}
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._profile_path = None
+
+    def record(self, name, start, end):
+        thread = threading.current_thread()
+        duration = end - start
+        with self._lock:
+            self._events.append((name, start, duration, thread.ident))
+            self._thread_names.setdefault(thread.ident, thread.name)
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=PERCENTILE_WINDOW)
+            samples.append(duration)
+            self.last_span = (name, duration)
+
+    def percentiles(self, name):
+        # Milisegundos sobre las últimas PERCENTILE_WINDOW mediciones.
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+
+        def at(fraction):
+            return samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000
+
+        return {"count": len(samples), "p50": at(0.50), "p90": at(0.90), "p99": at(0.99), "max": samples[-1] * 1000}
+
+    def summary(self):
+        with self._lock:
+            names = sorted(self._samples)
+        return {name: self.percentiles(name) for name in names}
+
+    def write_trace(self, path):
+        with self._lock:
+            events = list(self._events)
+            thread_names = dict(self._thread_names)
+        pid = os.getpid()
+        trace_events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}}
+                        for tid, thread_name in thread_names.items()]
+        trace_events.extend({"name": name, "ph": "X", "pid": pid, "tid": tid,
+                             "ts": round((start - self._origin) * 1e6, 1), "dur": round(duration * 1e6, 1)}
+                            for name, start, duration, tid in events)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms",
+                       "otherData": {"percentiles_ms": self.summary()}}, f)
+
+    def start_profile(self, path):
+        import cProfile
+        self._profile_path = path
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+
+    def finish(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self._profile_path)
+            self._profiler = None
+        if self.trace_path:
+            self.write_trace(self.trace_path)
+
+
+_tracer = Tracer()
+
+
+def setup(trace_path=None, profile_path=None):
+    # Lo indicado por argumentos tiene prioridad sobre las variables de entorno.
+    trace_path = trace_path or os.environ.get(TRACE_ENV_VAR)
+    profile_path = profile_path or os.environ.get(PROFILE_ENV_VAR)
+    if trace_path:
+        _tracer.enabled = True
+        _tracer.trace_path = trace_path
+    if profile_path:
+        _tracer.start_profile(profile_path)
+    if trace_path or profile_path:
+        atexit.register(_tracer.finish)
+
+
+def is_enabled():
+    return _tracer.enabled
+
+
+def last_span():
+    return _tracer.last_span
+
+
+def percentiles(name):
+    return _tracer.percentiles(name)
+
+
+def summary():
+    return _tracer.summary()
+
+
+@contextlib.contextmanager
+def _timed_span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _tracer.record(name, start, time.perf_counter())
+
+
+def span(name):
+    return _timed_span(name) if _tracer.enabled else _NULL_SPAN
+
+
+def traced(name=None):
+    # Como decorador: @traced o @traced("nombre"). Sin trazas activas solo
+    # cuesta una comprobación por llamada.
+    def decorate(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _tracer.record(span_name, start, time.perf_counter())
+
+        return wrapper
+
+    if callable(name):
+        func, name = name, None
+        return decorate(func)
+    return decorate
@@ -0,0 +1,520 @@
+import json
+import os
+
+from bastion.compression import DEFAULT_COMPRESSION, compress_payload, decompress_payload
+from bastion.entry import entry_to_json
+from bastion.errors import DecryptionError, VaultError
+from bastion.file_format import (
+    FORMAT_VERSION, LEGACY_KDF_PARAMS, SALT_LENGTH, calibrate_kdf, derive_key, find_toc_trailer, new_cipher,
+    read_block, read_header, read_toc_location, verify_key, write_block, write_header, write_toc_token,
+)
+from bastion.groups import ENTRY_ID_FIELD, GroupTree, entries_digest, entry_id, structure_digest
+from bastion.journal import JOURNAL_MAX_BYTES, JOURNAL_MAX_RECORDS, append_journal, apply_change, read_journal, remove_journal
+from bastion.migrations import migrate_entry, migrate_vault_data
+from bastion.records import DEFAULT_RECORD_FORMAT, encode_entries, is_binary_records, iter_decode_entries
+from bastion.reuse_index import PasswordReuseIndex
+from bastion.search_index import TrigramIndex
+from bastion.sort_index import SORTABLE_FIELDS, SortIndex
+from bastion.tracing import traced
+
+
+# Núcleo de la bóveda sin interfaz gráfica: nada de este módulo importa
+# tkinter ni muestra diálogos; los errores se señalan con las excepciones de
+# bastion.errors. Lo usan tanto la aplicación Tk como la línea de comandos.
+
+COMPACTION_MIN_BYTES = 64 * 1024
+
+
+def new_master_key(master_password):
+    # Para bases nuevas o contraseñas nuevas: el coste de Scrypt se ajusta
+    # al hardware actual.
+    kdf_params = calibrate_kdf()
+    salt = os.urandom(SALT_LENGTH)
+    return derive_key(master_password, salt, kdf_params), salt, kdf_params
+
+
+def encrypt_data(data, cipher, compression=None):
+    try:
+        json_data = json.dumps(data, default=entry_to_json).encode('utf-8')
+    except Exception as e:
+        raise VaultError(f"Error al encriptar los datos: {e}") from e
+    return encrypt_payload(json_data, cipher, compression)
+
+
+def encrypt_payload(payload, cipher, compression=None):
+    try:
+        return cipher.encrypt(compress_payload(payload, compression))
+    except Exception as e:
+        raise VaultError(f"Error al encriptar los datos: {e}") from e
+
+
+def decrypt_data(encrypted_bytes, cipher):
+    decrypted_bytes = decrypt_payload(encrypted_bytes, cipher)
+    try:
+        return json.loads(decrypted_bytes.decode('utf-8'))
+    except Exception as e:
+        raise DecryptionError(f"Error al desencriptar los datos: {e}") from e
+
+
+def decrypt_payload(encrypted_bytes, cipher):
+    from cryptography.fernet import InvalidToken
+
+    try:
+        return decompress_payload(cipher.decrypt(encrypted_bytes))
+    except InvalidToken as e:
+        raise DecryptionError("Contraseña maestra incorrecta o datos corruptos.") from e
+    except Exception as e:
+        raise DecryptionError(f"Error al desencriptar los datos: {e}") from e
+
+
+@traced
+def build_indexes(groups):
+    search_index = TrigramIndex()
+    search_index.build(((group, group.entries.values()) for group in groups.nodes()), entry_id)
+    keyed_entries = [item for entries in groups.values() for item in entries.items()]
+    sort_indexes = {}
+    for field in SORTABLE_FIELDS:
+        sort_indexes[field] = SortIndex(field)
+        sort_indexes[field].build(keyed_entries)
+    reuse_index = PasswordReuseIndex()
+    reuse_index.build(keyed_entries)
+    return search_index, sort_indexes, reuse_index
+
+
+@traced
+def load_database_file(file_path, master_password):
+    try:
+        with open(file_path, 'rb') as f:
+            header = read_header(f)
+            derived_key_b64 = derive_key(master_password, header.salt, header.kdf_params or LEGACY_KDF_PARAMS)
+            verify_key(header, derived_key_b64)
+
+            toc_location = None
+            if header.version >= 2:
+                toc_location = read_toc_location(f)
+                encrypted_data_bytes = read_block(f, toc_location)
+            else:
+                encrypted_data_bytes = f.read()
+            if not encrypted_data_bytes:
+                raise VaultError("Archivo de base de datos vacío o corrupto (datos encriptados faltantes).")
+    except FileNotFoundError as e:
+        raise VaultError("Archivo no encontrado.") from e
+    except OSError as e:
+        raise VaultError(f"No se pudo abrir la base de datos: {e}") from e
+
+    decrypted_data = decrypt_data(encrypted_data_bytes, new_cipher(derived_key_b64))
+    return decrypted_data, derived_key_b64, header, toc_location
+
+
+def iter_group_block(file_path, block, fernet_cipher):
+    # Entradas de un bloque de grupo tal como están en el archivo (sin migrar).
+    try:
+        with open(file_path, 'rb') as f:
+            token = read_block(f, block)
+    except OSError as e:
+        raise VaultError(f"No se pudo leer la base de datos: {e}") from e
+
+    payload = decrypt_payload(token, fernet_cipher)
+    if is_binary_records(payload):
+        # Las entradas pasan directamente de los bytes al modelo.
+        return iter_decode_entries(payload)
+    try:
+        return json.loads(payload.decode('utf-8'))
+    except ValueError as e:
+        raise DecryptionError(f"Error al desencriptar los datos: {e}") from e
+
+
+@traced
+def read_group_block(file_path, groups, group, fernet_cipher):
+    if group.loaded:
+        return
+    load_group_entries(groups, group, iter_group_block(file_path, group.block, fernet_cipher))
+
+
+def load_group_entries(groups, group, entries):
+    migrated = []
+
+    def migrated_entries():
+        for entry in entries:
+            if migrate_entry(entry) or not entry.get(ENTRY_ID_FIELD):
+                migrated.append(entry)
+            yield entry
+
+    groups.load_group(group, migrated_entries())
+    group.dirty = bool(migrated)
+    group.digest = entries_digest(list(group.entries.values()))
+
+
+@traced
+def save_database_file(file_path, records, master_key_b64, salt, kdf_params, compression, record_format,
+                       source_path=None, rewrite=False):
+    # source_path es el archivo v2 abierto con esta misma clave, del que se
+    # copian los bloques sin cambios. Si es el mismo archivo, solo se añaden
+    # al final los bloques modificados (salvo que haya que reescribir la
+    # cabecera). El diario queda incluido en los bloques, así que se elimina.
+    fernet_cipher = new_cipher(master_key_b64)
+    try:
+        if source_path == file_path and not rewrite and not _needs_compaction(file_path, records):
+            result = _append_blocks(file_path, records, fernet_cipher, compression, record_format)
+        else:
+            result = _rewrite_file(file_path, records, master_key_b64, salt, kdf_params, compression, record_format,
+                                   source_path)
+        remove_journal(file_path)
+    except OSError as e:
+        raise VaultError(f"No se pudo guardar la base de datos: {e}") from e
+    return result
+
+
+def _needs_compaction(file_path, records):
+    live_bytes = sum(location[1] for _, _, location, entries_list in records if entries_list is None and location)
+    stale_bytes = os.path.getsize(file_path) - live_bytes
+    return stale_bytes > max(live_bytes, COMPACTION_MIN_BYTES)
+
+
+def _encrypt_block(entries_list, fernet_cipher, compression, record_format):
+    if not entries_list:
+        return None
+    if record_format == "binary":
+        return encrypt_payload(encode_entries(entries_list), fernet_cipher, compression)
+    return encrypt_data(entries_list, fernet_cipher, compression)
+
+
+def _encrypt_toc(locations, fernet_cipher, compression):
+    toc = [{"path": path, "block": list(location) if location else None} for _, path, location in locations]
+    return encrypt_data(toc, fernet_cipher, compression)
+
+
+def _append_blocks(file_path, records, fernet_cipher, compression, record_format):
+    locations = []
+    with open(file_path, 'r+b') as f:
+        # Se añade tras el último índice válido, descartando lo que dejara un
+        # guardado interrumpido.
+        _, _, end = find_toc_trailer(f)
+        f.truncate(end)
+        f.seek(end)
+        for group, path, location, entries_list in records:
+            if entries_list is not None:
+                token = _encrypt_block(entries_list, fernet_cipher, compression, record_format)
+                location = write_block(f, token) if token else None
+            locations.append((group, path, location))
+        toc_location = write_toc_token(f, _encrypt_toc(locations, fernet_cipher, compression))
+        f.flush()
+        os.fsync(f.fileno())
+    return locations, toc_location
+
+
+def _rewrite_file(file_path, records, master_key_b64, salt, kdf_params, compression, record_format, source_path):
+    fernet_cipher = new_cipher(master_key_b64)
+    locations = []
+    temp_path = file_path + ".tmp"
+    source = open(source_path, 'rb') if source_path else None
+    try:
+        with open(temp_path, 'wb') as f:
+            write_header(f, salt, kdf_params, master_key_b64, compression, record_format)
+            for group, path, location, entries_list in records:
+                if entries_list is not None:
+                    token = _encrypt_block(entries_list, fernet_cipher, compression, record_format)
+                else:
+                    # Bloque sin cambios (quizá aún sin desencriptar): se copia tal cual.
+                    token = read_block(source, location)
+                locations.append((group, path, write_block(f, token) if token else None))
+            toc_location = write_toc_token(f, _encrypt_toc(locations, fernet_cipher, compression))
+            f.flush()
+            os.fsync(f.fileno())
+        # En Windows no se puede reemplazar un archivo que sigue abierto.
+        if source:
+            source.close()
+            source = None
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finally:
+        if source:
+            source.close()
+    return locations, toc_location
+
+
+@traced
+def write_snapshot(file_path, records, changes, use_journal, force, master_key_b64, salt, kdf_params,
+                   compression, record_format, source_path, toc_location, saved_digests, saved_structure,
+                   journal_records=0):
+    # Puede ejecutarse en otro hilo. Si el contenido serializado coincide con
+    # lo último que se escribió, no se toca el disco.
+    digests = [entries_digest(entries_list) if entries_list is not None else None for _, _, _, entries_list in records]
+    structure = structure_digest([path for _, path, _, _ in records])
+    unchanged = structure == saved_structure and all(
+        digest is None or digest == saved for digest, saved in zip(digests, saved_digests))
+    if unchanged and not force:
+        return "skipped", None, digests, structure
+    if use_journal:
+        # Solo se escriben los cambios nuevos.
+        written = append_journal(file_path, changes, new_cipher(master_key_b64), toc_location, compression,
+                                 journal_records)
+        return "journal", written, digests, structure
+    saved_blocks = save_database_file(file_path, records, master_key_b64, salt, kdf_params, compression,
+                                      record_format, source_path, rewrite=force)
+    return "blocks", saved_blocks, digests, structure
+
+
+class Vault:
+    # Una base de datos abierta: el árbol de grupos, la clave y el estado del
+    # archivo (bloques, índice, diario, formato). Las operaciones lentas se
+    # dividen en prepare_*() -> (job, finish, abort): `job` no toca el estado
+    # y puede ejecutarse en otro hilo; `finish` y `abort` se llaman después
+    # en el hilo que posee la bóveda. save() y rekey() lo hacen todo seguido.
+
+    def __init__(self, master_key_b64=None, salt=None, kdf_params=None):
+        self.path = None
+        self.groups = GroupTree()
+        self.groups.track_changes()
+        self.salt = salt
+        self.kdf_params = kdf_params
+        self.set_key(master_key_b64)
+        self.file_version = None
+        self.toc_location = None
+        self.journal_bytes = 0
+        self.journal_records = 0
+        self.saved_structure = None
+        self.compression = dict(DEFAULT_COMPRESSION)
+        self.record_format = DEFAULT_RECORD_FORMAT
+        # Tras cambiar la compresión o el formato de registros, el siguiente guardado reescribe la cabecera.
+        self.header_stale = False
+
+    @classmethod
+    def create(cls, master_password):
+        return cls(*new_master_key(master_password))
+
+    @classmethod
+    @traced("Vault.open")
+    def open(cls, file_path, master_password):
+        loaded_data, derived_key_b64, header, toc_location = load_database_file(file_path, master_password)
+        vault = cls(derived_key_b64, header.salt, header.kdf_params)
+        vault.path = file_path
+        vault.file_version = header.version
+        vault.toc_location = toc_location
+        if header.version >= 2:
+            # Solo se ha desencriptado el índice: cada grupo se desencripta al
+            # pedirlo, salvo los que toque el diario de cambios.
+            groups = GroupTree.from_toc(loaded_data)
+            changes, vault.journal_bytes, vault.journal_records = read_journal(file_path, vault.cipher, toc_location)
+            for change in changes:
+                apply_change(groups, change, lambda group: read_group_block(file_path, groups, group, vault.cipher))
+            # Lo reaplicado desde el diario también está escrito.
+            for group in groups.nodes():
+                if group.loaded:
+                    group.digest = entries_digest(list(group.entries.values()))
+            vault.saved_structure = structure_digest([path for path, _ in groups.node_paths()])
+            vault.compression = header.compression
+            vault.record_format = header.record_format
+        else:
+            # Los archivos anteriores a la compresión se comprimen al convertirlos.
+            migrate_vault_data(loaded_data)
+            groups = GroupTree.from_dict(loaded_data)
+        groups.track_changes()
+        vault.groups = groups
+        return vault
+
+    def set_key(self, master_key_b64):
+        self.key = master_key_b64
+        self.cipher = new_cipher(master_key_b64) if master_key_b64 else None
+
+    def derive_key(self, master_password):
+        # Clave de la contraseña dada con la sal y el coste de este archivo,
+        # para comprobarla sin abrirlo de nuevo.
+        return derive_key(master_password, self.salt, self.kdf_params or LEGACY_KDF_PARAMS)
+
+    def load_group(self, group):
+        if self.cipher is None:
+            raise VaultError("La base de datos está bloqueada.")
+        read_group_block(self.path, self.groups, group, self.cipher)
+
+    def prepare_load(self, groups):
+        # `job` solo lee y desencripta los bloques (sin tocar el árbol);
+        # finish() inserta las entradas de los grupos que sigan sin cargar y
+        # devuelve esos grupos.
+        if self.cipher is None:
+            raise VaultError("La base de datos está bloqueada.")
+        file_path = self.path
+        fernet_cipher = self.cipher
+        blocks = [(group, group.block) for group in groups if not group.loaded]
+
+        def job():
+            return [(group, list(iter_group_block(file_path, block, fernet_cipher))) for group, block in blocks]
+
+        def finish(decoded_blocks):
+            loaded = []
+            for group, entries in decoded_blocks:
+                if not group.loaded:
+                    load_group_entries(self.groups, group, entries)
+                    loaded.append(group)
+            return loaded
+
+        def abort():
+            pass
+
+        return job, finish, abort
+
+    def load_all(self):
+        for group in self.groups.unloaded_groups():
+            self.load_group(group)
+
+    def iter_entries(self, group=None):
+        # Recorre (grupo, entrada) del subárbol, desencriptando los bloques
+        # a medida que hacen falta.
+        for node in (group or self.groups.root).iter_subtree():
+            if not node.loaded:
+                self.load_group(node)
+            for entry in node.entries.values():
+                yield node, entry
+
+    def set_file_format(self, compression, record_format):
+        if compression == self.compression and record_format == self.record_format:
+            return False
+        self.compression = compression
+        self.record_format = record_format
+        # La cabecera registra ambos ajustes: el próximo guardado reescribe el archivo.
+        self.header_stale = True
+        for group in self.groups.nodes():
+            if group.loaded:
+                group.dirty = True
+        return True
+
+    def snapshot(self, reencrypt_all=False):
+        # Solo los grupos modificados (o todos, si cambia la clave) llevan sus
+        # entradas; el resto reutiliza su bloque.
+        records = []
+        for path, group in self.groups.node_paths():
+            if group.loaded and (reencrypt_all or group.dirty or group.block is None):
+                records.append((group, path, None, list(group.entries.values())))
+            else:
+                records.append((group, path, group.block, None))
+        return records
+
+    def _apply_saved_blocks(self, result):
+        locations, toc_location = result
+        for group, _, location in locations:
+            group.block = location
+        self.file_version = FORMAT_VERSION
+        self.toc_location = toc_location
+        self.journal_bytes = 0
+        self.journal_records = 0
+
+    def prepare_save(self, file_path=None):
+        # Instantánea inmutable (listas nuevas; las entradas se reemplazan al
+        # editarlas, nunca se modifican en sitio), de modo que se puede seguir
+        # editando mientras `job` escribe. finish() devuelve si no había nada
+        # que guardar.
+        if self.key is None:
+            raise VaultError("No hay una base de datos abierta o una contraseña maestra establecida.")
+        file_path = file_path or self.path
+        if not file_path:
+            raise VaultError("La base de datos todavía no tiene archivo.")
+        tree = self.groups
+        changes = tree.take_changes()
+        # Mientras el diario sea pequeño, guardar solo añade los cambios nuevos;
+        # al superar el límite se compacta escribiendo los bloques modificados.
+        use_journal = (file_path == self.path and self.toc_location is not None and not self.header_stale
+                       and self.journal_records + len(changes) <= JOURNAL_MAX_RECORDS
+                       and self.journal_bytes < JOURNAL_MAX_BYTES)
+        force = file_path != self.path or self.toc_location is None or self.header_stale
+
+        records = self.snapshot()
+        saved_digests = [group.digest for group, _, _, _ in records]
+        written_groups = [group for group, _, _, entries_list in records if entries_list is not None]
+        if not use_journal:
+            # Lo que se edite durante la escritura vuelve a marcar el grupo.
+            for group in written_groups:
+                group.dirty = False
+        source_path = self.path if self.file_version == FORMAT_VERSION else None
+
+        args = (file_path, records, changes, use_journal, force, self.key, self.salt, self.kdf_params,
+                self.compression, self.record_format, source_path, self.toc_location, saved_digests,
+                self.saved_structure, self.journal_records)
+
+        def job():
+            return write_snapshot(*args)
+
+        def finish(result):
+            mode, payload, digests, structure = result
+            for (group, _, _, _), digest in zip(records, digests):
+                if digest is not None:
+                    group.digest = digest
+            self.saved_structure = structure
+            if mode == "journal":
+                self.journal_bytes += payload
+                self.journal_records += len(changes)
+            elif mode == "blocks":
+                self._apply_saved_blocks(payload)
+                self.header_stale = False
+            elif not use_journal:
+                for group in written_groups:
+                    group.dirty = True
+            self.path = file_path
+            return mode == "skipped"
+
+        def abort():
+            tree.restore_changes(changes)
+            if not use_journal:
+                for group in written_groups:
+                    group.dirty = True
+
+        return job, finish, abort
+
+    def prepare_rekey(self, new_master_password):
+        # Con la clave nueva hay que re-encriptar todos los bloques, así que
+        # todos los grupos deben estar cargados (ver load_all()).
+        if self.groups.unloaded_groups():
+            raise VaultError("Hay grupos sin cargar; no se puede cambiar la clave.")
+        records = self.snapshot(reencrypt_all=True)
+        changes = self.groups.take_changes()
+        file_path = self.path
+        compression = self.compression
+        record_format = self.record_format
+
+        def job():
+            new_key_b64, new_salt, new_kdf_params = new_master_key(new_master_password)
+            saved_blocks = None
+            if file_path:
+                saved_blocks = save_database_file(file_path, records, new_key_b64, new_salt, new_kdf_params,
+                                                  compression, record_format)
+            return new_key_b64, new_salt, new_kdf_params, saved_blocks
+
+        def finish(result):
+            new_key_b64, new_salt, new_kdf_params, saved_blocks = result
+            if saved_blocks is not None:
+                for group, _, _, entries_list in records:
+                    group.dirty = False
+                    group.digest = entries_digest(entries_list)
+                self.saved_structure = structure_digest([path for _, path, _, _ in records])
+                self._apply_saved_blocks(saved_blocks)
+                self.header_stale = False
+            else:
+                self.groups.restore_changes(changes)
+            self.set_key(new_key_b64)
+            self.salt = new_salt
+            self.kdf_params = new_kdf_params
+            return saved_blocks is not None
+
+        def abort():
+            self.groups.restore_changes(changes)
+
+        return job, finish, abort
+
+    def save(self, file_path=None):
+        return self._run(self.prepare_save(file_path))
+
+    def rekey(self, new_master_password):
+        self.load_all()
+        return self._run(self.prepare_rekey(new_master_password))
+
+    @staticmethod
+    def _run(prepared):
+        job, finish, abort = prepared
+        try:
+            result = job()
+        except BaseException:
+            abort()
+            raise
+        return finish(result)
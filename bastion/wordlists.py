@@ -0,0 +1,233 @@
+import array
+import hashlib
+import marshal
+import os
+import threading
+import unicodedata
+from collections import deque
+
+from bastion.tracing import traced
+
+
+# Diccionarios del estimador de fortaleza (bastion.strength). Cada lista es
+# un .txt con una palabra por línea, de la más frecuente a la menos; la
+# posición en la lista es el rango de la palabra. Además de las incluidas en
+# bastion/wordlists se cargan las de BASTION_WORDLISTS (archivos o carpetas
+# de .txt separados por os.pathsep), que pueden tener millones de palabras.
+#
+# Todas se compilan en un único autómata de Aho-Corasick que encuentra en una
+# pasada cada palabra, al derecho o al revés, que termina en cada posición de
+# la contraseña. El autómata compilado se guarda en la caché del usuario y se
+# reutiliza mientras las listas no cambien.
+
+WORDLISTS_ENV_VAR = "BASTION_WORDLISTS"
+BUILTIN_WORDLISTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wordlists")
+CACHE_FILE_NAME = "wordlists.cache"
+CACHE_FORMAT_VERSION = 1
+
+MIN_WORD_LENGTH = 3
+MAX_WORD_LENGTH = 32
+
+# Las transiciones del autómata viven en un solo diccionario de enteros:
+# (estado << _CHAR_BITS) | código del carácter -> estado siguiente.
+_CHAR_BITS = 21
+
+_fold_cache = {}
+
+
+def fold_character(character):
+    # Minúsculas y sin tildes ('Á' -> 'a', 'ñ' -> 'n'), siempre un carácter
+    # por carácter para que las posiciones coincidan con las de la contraseña.
+    folded = _fold_cache.get(character)
+    if folded is None:
+        lower = character.lower()
+        folded = unicodedata.normalize("NFD", lower)[0] if len(lower) == 1 else character
+        _fold_cache[character] = folded
+    return folded
+
+
+def fold_text(text):
+    return "".join(fold_character(character) for character in text)
+
+
+class WordAutomaton:
+    # Estados numerados desde 0 (la raíz). Para cada estado: el enlace de
+    # fallo, el rango de la palabra que termina en él (negativo si es una
+    # palabra al revés; 0 si no termina ninguna), el enlace al siguiente
+    # estado de la cadena de fallos que termina una palabra y la profundidad,
+    # que es la longitud de esa palabra.
+
+    def __init__(self, goto, fail, ranks, output_links, depths):
+        self._goto = goto
+        self._fail = fail
+        self._ranks = ranks
+        self._output_links = output_links
+        self._depths = depths
+
+    def __len__(self):
+        return len(self._depths)
+
+    @classmethod
+    def build(cls, ranked_words):
+        # ranked_words: (palabra, rango) con rango > 0 al derecho y < 0 al revés.
+        goto = {}
+        children = [[]]
+        ranks = [0]
+        depths = [0]
+        for word, rank in ranked_words:
+            state = 0
+            for character in word:
+                key = (state << _CHAR_BITS) | ord(character)
+                next_state = goto.get(key)
+                if next_state is None:
+                    next_state = goto[key] = len(depths)
+                    children[state].append((ord(character), next_state))
+                    children.append([])
+                    ranks.append(0)
+                    depths.append(depths[state] + 1)
+                state = next_state
+            current = ranks[state]
+            # Gana la palabra al derecho y, entre iguales, el menor rango.
+            if current == 0 or (current < 0 < rank) or ((current > 0) == (rank > 0) and abs(rank) < abs(current)):
+                ranks[state] = rank
+
+        fail = [0] * len(depths)
+        output_links = [0] * len(depths)
+        pending = deque(child for _, child in children[0])
+        while pending:
+            state = pending.popleft()
+            for code, child in children[state]:
+                fallback = fail[state]
+                while fallback and ((fallback << _CHAR_BITS) | code) not in goto:
+                    fallback = fail[fallback]
+                fail[child] = goto.get((fallback << _CHAR_BITS) | code, 0)
+                output_links[child] = fail[child] if ranks[fail[child]] else output_links[fail[child]]
+                pending.append(child)
+
+        return cls(goto, array.array('i', fail), array.array('i', ranks), array.array('i', output_links),
+                   array.array('B', depths))
+
+    def step(self, state, character):
+        code = ord(character)
+        goto = self._goto
+        while True:
+            next_state = goto.get((state << _CHAR_BITS) | code)
+            if next_state is not None:
+                return next_state
+            if state == 0:
+                return 0
+            state = self._fail[state]
+
+    def words_at(self, state):
+        # (longitud, rango) de cada palabra que termina en `state`.
+        found = []
+        if not self._ranks[state]:
+            state = self._output_links[state]
+        while state:
+            found.append((self._depths[state], self._ranks[state]))
+            state = self._output_links[state]
+        return found
+
+    def dumps(self, signature):
+        return marshal.dumps((CACHE_FORMAT_VERSION, signature, self._goto, self._fail.tobytes(), self._ranks.tobytes(),
+                              self._output_links.tobytes(), self._depths.tobytes()))
+
+    @classmethod
+    def loads(cls, data, signature):
+        version, cached_signature, goto, *tables = marshal.loads(data)
+        if version != CACHE_FORMAT_VERSION or cached_signature != signature:
+            return None
+        fail, ranks, output_links, depths = (array.array(typecode) for typecode in "iiiB")
+        for table, raw in zip((fail, ranks, output_links, depths), tables):
+            table.frombytes(raw)
+        return cls(goto, fail, ranks, output_links, depths)
+
+
+def wordlist_paths():
+    paths = []
+    sources = [BUILTIN_WORDLISTS_DIR] + [path for path in os.environ.get(WORDLISTS_ENV_VAR, "").split(os.pathsep) if path]
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(os.path.join(source, name) for name in sorted(os.listdir(source)) if name.endswith(".txt"))
+        elif os.path.isfile(source):
+            paths.append(source)
+    return paths
+
+
+def read_wordlist(path):
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            word = line.strip()
+            if word and not word.startswith("#") and MIN_WORD_LENGTH <= len(word) <= MAX_WORD_LENGTH:
+                yield fold_text(word)
+
+
+def ranked_words(paths):
+    ranks = {}
+    for path in paths:
+        for rank, word in enumerate(read_wordlist(path), 1):
+            if rank < ranks.get(word, rank + 1):
+                ranks[word] = rank
+    for word, rank in ranks.items():
+        yield word, rank
+        reversed_word = word[::-1]
+        if reversed_word not in ranks:
+            yield reversed_word, -rank
+
+
+def cache_path():
+    if os.name == 'nt':
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "Bastion", CACHE_FILE_NAME)
+
+
+def wordlists_signature(paths):
+    digest = hashlib.sha256(str(CACHE_FORMAT_VERSION).encode())
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
+
+
+@traced
+def compile_wordlists(paths=None, cache_file=None):
+    # Lee el autómata de la caché si las listas no han cambiado; si no, lo
+    # compila y lo guarda. Sin caché utilizable solo se pierde el tiempo de
+    # compilar.
+    paths = wordlist_paths() if paths is None else paths
+    cache_file = cache_path() if cache_file is None else cache_file
+    signature = wordlists_signature(paths)
+    try:
+        with open(cache_file, 'rb') as f:
+            automaton = WordAutomaton.loads(f.read(), signature)
+        if automaton is not None:
+            return automaton
+    except (OSError, ValueError, EOFError, TypeError):
+        pass
+
+    automaton = WordAutomaton.build(ranked_words(paths))
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        temp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(automaton.dumps(signature))
+        os.replace(temp_file, cache_file)
+    except OSError:
+        pass
+    return automaton
+
+
+_automaton = None
+_automaton_lock = threading.Lock()
+
+
+def word_automaton():
+    # Se carga la primera vez que se necesita (y una vez por proceso).
+    global _automaton
+    if _automaton is None:
+        with _automaton_lock:
+            if _automaton is None:
+                _automaton = compile_wordlists()
+    return _automaton
@@ -0,0 +1,90 @@
+# Mide tamaño y tiempo de cifrado/descifrado de una bóveda de ejemplo con
+# cada ajuste de compresión (misma cadena que main.py: JSON -> compresión ->
+# Fernet).
+#
+#   python benchmarks/compression.py [--entries 5000] [--seed 1]
+
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.fernet import Fernet
+
+from bastion.compression import compress_payload, decompress_payload
+
+
+SETTINGS = [
+    {"algorithm": "none", "level": 0},
+    {"algorithm": "zlib", "level": 1},
+    {"algorithm": "zlib", "level": 6},
+    {"algorithm": "zlib", "level": 9},
+    {"algorithm": "lzma", "level": 0},
+    {"algorithm": "lzma", "level": 6},
+]
+
+WORDS = ("cuenta banco correo acceso servidor copia seguridad clave recuperación pregunta respuesta pin tarjeta "
+         "factura contrato soporte usuario administrador red wifi router casa trabajo proyecto cliente proveedor "
+         "licencia suscripción anual mensual renovar caduca verificación dos pasos código token").split()
+
+
+def sample_vault(entry_count, seed):
+    rng = random.Random(seed)
+    vault = {}
+    for index in range(entry_count):
+        group = f"Grupo {index % 40}/Sub {index % 7}"
+        notes = "\n".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))) for _ in range(rng.randint(0, 6)))
+        vault.setdefault(group, []).append({
+            "Title": f"{rng.choice(WORDS).capitalize()} {index}",
+            "User Name": f"{rng.choice(WORDS)}{rng.randint(1, 999)}@example.com",
+            "Password": "".join(rng.choice(string.ascii_letters + string.digits + string.punctuation) for _ in range(16)),
+            "URL": f"https://{rng.choice(WORDS)}.example.com/{rng.choice(WORDS)}",
+            "Notes": notes,
+            "Creation Time": 1700000000 + index,
+            "Last Modification Time": 1700000000 + index,
+            "UUID": "%032x" % rng.getrandbits(128),
+        })
+    return vault
+
+
+def measure(payload, cipher, compression, repeat):
+    encrypt_times = []
+    decrypt_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        token = cipher.encrypt(compress_payload(payload, compression))
+        encrypt_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        assert decompress_payload(cipher.decrypt(token)) == payload
+        decrypt_times.append(time.perf_counter() - start)
+    return len(token), min(encrypt_times), min(decrypt_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara los ajustes de compresión de Bastión.")
+    parser.add_argument("--entries", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    payload = json.dumps(sample_vault(args.entries, args.seed)).encode('utf-8')
+    cipher = Fernet(Fernet.generate_key())
+    print(f"{args.entries} entradas, JSON: {len(payload) / 1024:.0f} KiB")
+    print(f"{'ajuste':<10}{'archivo KiB':>12}{'ratio':>8}{'cifrar ms':>12}{'descifrar ms':>14}")
+
+    baseline = None
+    for compression in SETTINGS:
+        size, encrypt_seconds, decrypt_seconds = measure(payload, cipher, compression, args.repeat)
+        baseline = baseline or size
+        label = f"{compression['algorithm']}:{compression['level']}"
+        print(f"{label:<10}{size / 1024:>12.0f}{size / baseline:>8.2f}{encrypt_seconds * 1000:>12.1f}{decrypt_seconds * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Mide la memoria que ocupan las entradas cargadas: diccionarios tal como
+# salen de json.loads frente a objetos Entry. Se cuenta lo que queda
+# reservado tras cargar la lista completa (contenedores y valores).
+#
+#   python benchmarks/entry_memory.py [--entries 100000] [--seed 1]
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from compression import sample_vault
+
+from bastion.entry import Entry
+
+
+def retained_memory(build):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = build()
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0] - baseline, result
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide la memoria por entrada de Bastión.")
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    entries = [entry for group_entries in sample_vault(args.entries, args.seed).values() for entry in group_entries]
+    payload = json.dumps(entries).encode('utf-8')
+    del entries
+
+    layouts = {
+        "dict": lambda: json.loads(payload.decode('utf-8')),
+        "Entry": lambda: [Entry(entry) for entry in json.loads(payload.decode('utf-8'))],
+    }
+
+    print(f"{args.entries} entradas")
+    print(f"{'tipo':<8}{'MiB':>8}{'bytes/entrada':>15}{'contenedor':>12}")
+    for name, build in layouts.items():
+        retained, loaded = retained_memory(build)
+        container = sys.getsizeof(loaded[0]) + (sys.getsizeof(loaded[0].extra) if isinstance(loaded[0], Entry) and loaded[0].extra else 0)
+        print(f"{name:<8}{retained / 2**20:>8.1f}{retained / len(loaded):>15.0f}{container:>12}")
+        del loaded
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Compara el JSON y el formato binario de registros para las entradas de una
+# bóveda de ejemplo: tamaño (sin y con zlib), tiempo de codificación y
+# decodificación y pico de memoria al decodificar.
+#
+#   python benchmarks/serialization.py [--entries 5000] [--seed 1]
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from compression import sample_vault
+
+from bastion.compression import DEFAULT_COMPRESSION, compress_payload
+from bastion.records import encode_entries, iter_decode_entries
+
+
+def best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        result = func()
+        return tracemalloc.get_traced_memory()[1], result
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara los formatos de registros de Bastión.")
+    parser.add_argument("--entries", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    entries = [entry for group_entries in sample_vault(args.entries, args.seed).values() for entry in group_entries]
+    codecs = {
+        "json": (lambda: json.dumps(entries).encode('utf-8'), lambda payload: json.loads(payload.decode('utf-8'))),
+        "binary": (lambda: encode_entries(entries), lambda payload: list(iter_decode_entries(payload))),
+    }
+
+    print(f"{args.entries} entradas")
+    print(f"{'formato':<8}{'KiB':>8}{'zlib KiB':>10}{'codificar ms':>14}{'decodificar ms':>16}{'pico MiB':>10}")
+    for name, (encode, decode) in codecs.items():
+        payload = encode()
+        assert decode(payload) == entries
+        compressed = compress_payload(payload, DEFAULT_COMPRESSION)
+        encode_seconds = best_of(encode, args.repeat)
+        decode_seconds = best_of(lambda: decode(payload), args.repeat)
+        peak, _ = peak_memory(lambda: decode(payload))
+        print(f"{name:<8}{len(payload) / 1024:>8.0f}{len(compressed) / 1024:>10.0f}{encode_seconds * 1000:>14.1f}"
+              f"{decode_seconds * 1000:>16.1f}{peak / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# Mide el arranque de Bastión.
+#
+# imports: tiempo de importación de main.py con `-X importtime` (no necesita
+# pantalla) y los módulos que más pesan.
+# window: lanza la aplicación con BASTION_STARTUP_PROBE, que escribe cuánto
+# tardó en mostrar la ventana y sale; sirve tanto para el código fuente como
+# para el ejecutable de PyInstaller (--exe). Necesita pantalla.
+#
+# Los tiempos dependen mucho de la máquina, así que no hay un presupuesto fijo:
+# se guarda una referencia en la propia máquina (--json) y las siguientes
+# mediciones se comparan con ella (--baseline, como mucho --max-regression por
+# ciento más lenta), o se da un límite absoluto para esa máquina (--budget-ms).
+# Si se supera, el script termina con código 1, para usarlo como comprobación
+# en CI.
+#
+#   python benchmarks/startup.py imports [--runs 7] [--top 15] [--json referencia.json]
+#   python benchmarks/startup.py imports --baseline referencia.json [--max-regression 25]
+#   python benchmarks/startup.py window [--exe dist/Bastion.exe] [--runs 5] [--budget-ms 1500] [--json salida.json]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_PROBE_ENV_VAR = "BASTION_STARTUP_PROBE"
+
+# Medida que se compara en cada modo: `import main` y la ventana lista.
+MEASURED_KEYS = {"imports": "main_ms", "window": "window_ms"}
+# Margen sobre la referencia, para detectar regresiones y no el ruido.
+DEFAULT_MAX_REGRESSION = 25.0
+
+
+def parse_importtime(stderr):
+    # Líneas "import time: self [us] | cumulative | nombre", con sangría por nivel.
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure_imports(runs, top):
+    # Con los .pyc al día, como en una instalación; si no, se mediría la compilación.
+    subprocess.run([sys.executable, "-m", "compileall", "-q", "main.py", "bastion"], cwd=ROOT, check=True)
+    samples = []
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT,
+                                   capture_output=True, text=True, check=True)
+        samples.append(parse_importtime(completed.stderr))
+
+    names = set().union(*samples)
+    medians = {name: (statistics.median(sample.get(name, (0, 0))[0] for sample in samples),
+                      statistics.median(sample.get(name, (0, 0))[1] for sample in samples)) for name in names}
+    heaviest = sorted(medians.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    return {
+        "runs": runs,
+        "main_ms": medians["main"][1] / 1000,
+        "modules": [{"module": name, "self_ms": self_us / 1000, "cumulative_ms": cumulative_us / 1000}
+                    for name, (self_us, cumulative_us) in heaviest],
+    }
+
+
+def measure_window(command, runs):
+    window_ms = []
+    process_ms = []
+    for _ in range(runs):
+        fd, probe_path = tempfile.mkstemp(suffix=".txt")
+        os.close(fd)
+        try:
+            start = time.perf_counter()
+            subprocess.run(command, cwd=ROOT, env=dict(os.environ, **{STARTUP_PROBE_ENV_VAR: probe_path}),
+                           check=True, timeout=120)
+            process_ms.append((time.perf_counter() - start) * 1000)
+            with open(probe_path) as f:
+                window_ms.append(float(f.read()))
+        finally:
+            os.remove(probe_path)
+    return {
+        "runs": runs,
+        "command": command,
+        # Desde que main.py empieza a ejecutarse hasta que la ventana está lista.
+        "window_ms": statistics.median(window_ms),
+        # Proceso completo, incluido el arranque del intérprete (y el
+        # desempaquetado, en el ejecutable congelado).
+        "process_ms": statistics.median(process_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el arranque de Bastión.")
+    parser.add_argument("mode", choices=("imports", "window"))
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--exe", help="Ejecutable de PyInstaller en lugar de main.py.")
+    parser.add_argument("--baseline", help="Resultado guardado antes con --json en esta máquina; falla si la mediana es más lenta que él más --max-regression.")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION,
+                        help="Porcentaje que se tolera sobre --baseline.")
+    parser.add_argument("--budget-ms", type=float, help="Tiempo máximo (mediana) en esta máquina antes de fallar.")
+    parser.add_argument("--json", help="Guarda el resultado en este archivo.")
+    args = parser.parse_args()
+    if args.baseline and args.budget_ms is not None:
+        parser.error("--baseline y --budget-ms no se pueden usar juntos.")
+
+    budget_ms = args.budget_ms
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("mode", args.mode) != args.mode or MEASURED_KEYS[args.mode] not in baseline:
+            parser.error(f"{args.baseline} no es una referencia del modo {args.mode}.")
+        budget_ms = baseline[MEASURED_KEYS[args.mode]] * (1 + args.max_regression / 100)
+
+    if args.mode == "imports":
+        result = measure_imports(args.runs, args.top)
+        print(f"import main: {result['main_ms']:.1f} ms (mediana de {args.runs})")
+        print(f"{'módulo':<45}{'propio ms':>10}{'total ms':>10}")
+        for module in result["modules"]:
+            print(f"{module['module']:<45}{module['self_ms']:>10.1f}{module['cumulative_ms']:>10.1f}")
+    else:
+        command = [os.path.abspath(args.exe)] if args.exe else [sys.executable, os.path.join(ROOT, "main.py")]
+        result = measure_window(command, args.runs)
+        print(f"ventana lista: {result['window_ms']:.1f} ms, proceso: {result['process_ms']:.1f} ms (mediana de {args.runs})")
+
+    result["mode"] = args.mode
+    result["budget_ms"] = budget_ms
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    measured_ms = result[MEASURED_KEYS[args.mode]]
+    if budget_ms is not None and measured_ms > budget_ms:
+        print(f"Presupuesto superado: {measured_ms:.1f} ms > {budget_ms:.1f} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# Mide las operaciones críticas de Bastión sobre bóvedas sintéticas de varios
+# tamaños y guarda los resultados en JSON para comparar ejecuciones:
+#
+#   python benchmarks/suite.py [--sizes 1000,10000,100000,1000000] [--json resultados.json]
+#   python benchmarks/suite.py --sizes 1000,10000 --baseline anteriores.json
+#
+# Cada operación se repite --repeat veces y se guarda el mejor tiempo. Las
+# operaciones de la interfaz se miden sin Tk, con el mismo trabajo de datos:
+#   search    = _filter_entries con texto, en todas las entradas
+#   sort      = ordenar por título la lista completa
+#   remap     = _remap_group_paths_in_data (renombrar y mover un grupo)
+#   tree      = recorrido de populate_group_tree (hijos ordenados por nombre)
+#   audit     = auditoría de contraseñas completa (caché vacía)
+#   audit_cached = auditoría repetida sin cambios (todo en caché)
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import DEFAULT_DEPTH, DEFAULT_GROUPS, DEFAULT_NOTE_LENGTH, DEFAULT_PASSWORD, synthetic_vault
+
+from bastion.audit import AuditCache, audit_snapshot, run_audit
+from bastion.file_format import LEGACY_KDF_PARAMS, derive_key
+from bastion.groups import entry_id
+from bastion.vault import Vault, build_indexes
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+SEARCH_QUERIES = ("a", "cuenta", "example.com/red", "zzzz")
+
+
+def best_time(func, repeat, setup=None):
+    best = float("inf")
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        func(state) if setup else func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def sorted_groups_walk(root):
+    # El mismo orden y el mismo trabajo que populate_group_tree, sin widgets.
+    rows = []
+    pending = [(root.children[name], -1) for name in sorted(root.children, reverse=True)]
+    while pending:
+        group, parent_row = pending.pop()
+        rows.append((group.name, parent_row))
+        row = len(rows) - 1
+        pending.extend((group.children[name], row) for name in sorted(group.children, reverse=True))
+    return rows
+
+
+def remap_groups(groups):
+    first, second = list(groups.root.children.values())[:2]
+    original_name = first.name
+    groups.rename_group(first, original_name + " (renombrado)")
+    groups.move_group(first, second)
+    groups.move_group(first, groups.root)
+    groups.rename_group(first, original_name)
+
+
+def run_size(entry_count, args, workdir):
+    tree_options = dict(groups=args.groups, depth=args.depth, note_length=args.note_length, seed=args.seed)
+    results = {}
+
+    start = time.perf_counter()
+    vault = synthetic_vault(entry_count, **tree_options)
+    results["generate"] = time.perf_counter() - start
+    path = os.path.join(workdir, f"vault-{entry_count}.bastion")
+
+    def save_full():
+        # Reescritura completa: todos los bloques se vuelven a encriptar.
+        for group in vault.groups.nodes():
+            group.dirty = True
+        vault.header_stale = True
+        vault.save(path)
+
+    results["save_full"] = best_time(save_full, args.repeat)
+    results["open"] = best_time(lambda: Vault.open(path, DEFAULT_PASSWORD), args.repeat)
+    results["load_all"] = best_time(lambda opened: opened.load_all(), args.repeat,
+                                    setup=lambda: Vault.open(path, DEFAULT_PASSWORD))
+
+    opened = Vault.open(path, DEFAULT_PASSWORD)
+    opened.load_all()
+    entries = [entry for group in opened.groups.nodes() for entry in group.entries.values()]
+
+    def save_incremental():
+        entry = entries[0]
+        opened.groups.update_entry(entry_id(entry), dict(entry, Notes=entry["Notes"] + "."))
+        opened.save()
+
+    results["save_incremental"] = best_time(save_incremental, args.repeat)
+
+    results["build_indexes"] = best_time(lambda: build_indexes(opened.groups), args.repeat)
+    search_index, sort_indexes, _ = build_indexes(opened.groups)
+    for query in SEARCH_QUERIES:
+        results[f"search:{query}"] = best_time(lambda: search_index.search(query), args.repeat)
+    results["sort"] = best_time(lambda: sort_indexes["Title"].sort(entries, entry_id), args.repeat)
+    results["remap"] = best_time(lambda: remap_groups(opened.groups), args.repeat)
+    results["tree"] = best_time(lambda: sorted_groups_walk(opened.groups.root), args.repeat)
+    snapshot = audit_snapshot(opened.groups)
+    results["audit"] = best_time(lambda: run_audit(snapshot, AuditCache()), args.repeat)
+    cache = AuditCache()
+    run_audit(snapshot, cache)
+    results["audit_cached"] = best_time(lambda: run_audit(snapshot, cache), args.repeat)
+    results["file_mib"] = os.path.getsize(path) / 2**20
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(report, baseline=None):
+    baseline_runs = {}
+    if baseline:
+        baseline_runs = {run["entries"]: run["results"] for run in baseline["runs"]}
+    for run in report["runs"]:
+        previous = baseline_runs.get(run["entries"], {})
+        print(f"\n{run['entries']} entradas")
+        header = f"{'operación':<26}{'ms':>12}"
+        print(header + (f"{'antes ms':>12}{'ratio':>8}" if previous else ""))
+        for name, value in run["results"].items():
+            unit_value = value if name == "file_mib" else value * 1000
+            line = f"{name:<26}{unit_value:>12.2f}"
+            if name in previous:
+                before = previous[name] if name == "file_mib" else previous[name] * 1000
+                line += f"{before:>12.2f}{unit_value / before if before else float('nan'):>8.2f}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide cómo escala Bastión con bóvedas sintéticas.")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="Número de entradas, separados por comas.")
+    parser.add_argument("--groups", type=int, default=DEFAULT_GROUPS)
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("--note-length", type=int, default=DEFAULT_NOTE_LENGTH)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Guarda los resultados en este archivo.")
+    parser.add_argument("--baseline", help="Resultados anteriores (JSON) con los que comparar.")
+    args = parser.parse_args()
+
+    report = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {"groups": args.groups, "depth": args.depth, "note_length": args.note_length,
+                    "seed": args.seed, "repeat": args.repeat},
+        # Independiente del tamaño: la derivación de clave de los archivos de prueba.
+        "derive_key": best_time(lambda: derive_key(DEFAULT_PASSWORD, b"\0" * 16, LEGACY_KDF_PARAMS), args.repeat),
+        "runs": [],
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for entry_count in (int(size) for size in args.sizes.split(",")):
+            report["runs"].append({"entries": entry_count, "results": run_size(entry_count, args, workdir)})
+            if args.json:
+                # Se guarda tras cada tamaño: los más grandes pueden tardar mucho.
+                with open(args.json, 'w') as f:
+                    json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(f"derive_key: {report['derive_key'] * 1000:.1f} ms")
+    print_results(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
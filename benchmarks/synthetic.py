@@ -0,0 +1,105 @@
+# Genera bóvedas sintéticas reproducibles (misma semilla, mismos datos) para
+# medir cómo escala Bastión. También se puede usar para crear un archivo con
+# el que probar la aplicación a mano:
+#
+#   python benchmarks/synthetic.py prueba.bastion --entries 100000 [--groups 200] [--depth 3] [--note-length 120]
+#
+# La contraseña del archivo generado es "benchmark" (o --password).
+
+import argparse
+import math
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from compression import WORDS
+
+from bastion.entry import Entry
+from bastion.file_format import LEGACY_KDF_PARAMS, SALT_LENGTH, derive_key
+from bastion.groups import GroupTree
+from bastion.vault import Vault
+
+DEFAULT_PASSWORD = "benchmark"
+DEFAULT_GROUPS = 200
+DEFAULT_DEPTH = 3
+DEFAULT_NOTE_LENGTH = 120
+PASSWORD_ALPHABET = string.ascii_letters + string.digits + string.punctuation
+
+
+def group_paths(group_count, depth, rng):
+    # group_count grupos hoja repartidos en un árbol de `depth` niveles con el
+    # mismo número de ramas por nivel.
+    branching = max(2, math.ceil(group_count ** (1 / depth)))
+    paths = []
+    for index in range(group_count):
+        parts = []
+        remainder = index
+        for level in range(depth):
+            remainder, branch = divmod(remainder, branching)
+            parts.append(f"{WORDS[(branch + level * 7) % len(WORDS)].capitalize()} {branch}")
+        paths.append("/".join(reversed(parts)))
+    rng.shuffle(paths)
+    return paths
+
+
+def synthetic_entry(index, note_length, rng):
+    notes = ""
+    while len(notes) < note_length:
+        notes += rng.choice(WORDS) + " "
+    return Entry({
+        "Title": f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {index}",
+        "User Name": f"{rng.choice(WORDS)}{rng.randint(1, 9999)}@example.com",
+        "Password": "".join(rng.choice(PASSWORD_ALPHABET) for _ in range(16)),
+        "URL": f"https://{rng.choice(WORDS)}.example.com/{rng.choice(WORDS)}",
+        "Notes": notes[:note_length],
+        "Creation Time": 1700000000 + index,
+        "Last Modification Time": 1700000000 + index * 3,
+        "UUID": "%032x" % rng.getrandbits(128),
+    })
+
+
+def synthetic_tree(entry_count, groups=DEFAULT_GROUPS, depth=DEFAULT_DEPTH, note_length=DEFAULT_NOTE_LENGTH, seed=1):
+    # Las entradas se reparten por igual entre los grupos hoja
+    # (entry_count // groups por grupo, más el resto en los primeros).
+    rng = random.Random(seed)
+    tree = GroupTree()
+    nodes = [tree.add_group(path) for path in group_paths(max(1, min(groups, entry_count)), depth, rng)]
+    for index in range(entry_count):
+        tree.add_entry(nodes[index % len(nodes)], synthetic_entry(index, note_length, rng))
+    return tree
+
+
+def synthetic_vault(entry_count, password=DEFAULT_PASSWORD, kdf_params=LEGACY_KDF_PARAMS, **tree_options):
+    salt = random.Random(tree_options.get("seed", 1)).randbytes(SALT_LENGTH)
+    vault = Vault(derive_key(password, salt, kdf_params), salt, dict(kdf_params))
+    vault.groups = synthetic_tree(entry_count, **tree_options)
+    vault.groups.track_changes()
+    return vault
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera una bóveda sintética de Bastión.")
+    parser.add_argument("output")
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--groups", type=int, default=DEFAULT_GROUPS)
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("--note-length", type=int, default=DEFAULT_NOTE_LENGTH)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    vault = synthetic_vault(args.entries, args.password, groups=args.groups, depth=args.depth,
+                            note_length=args.note_length, seed=args.seed)
+    vault.save(args.output)
+    print(f"{args.output}: {args.entries} entradas en {len(vault.groups)} grupos, "
+          f"{os.path.getsize(args.output) / 2**20:.1f} MiB, {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,39 @@
+import time
+
+# Referencia para medir el arranque (ver benchmarks/startup.py).
+STARTUP_CLOCK = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import datetime
-import random
-import string
-import json
 import os
-import subprocess
-import base64
-import re
-
-from PIL import Image, ImageTk
+import bisect
 
-from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
-from cryptography.fernet import Fernet, InvalidToken
-from cryptography.hazmat.backends import default_backend
 import sys
 
+from bastion import tracing
+from bastion.compression import COMPRESSION_ALGORITHMS, COMPRESSION_LEVELS
+from bastion.entry import Entry
+from bastion.errors import DecryptionError, QuickUnlockError, SessionExpiredError, VaultError, WrongPasswordError
+from bastion.file_format import key_check_value
+from bastion.groups import entry_id
+from bastion.passwords import (
+    DEFAULT_TITLE_PATTERN, DEFAULT_USER_PATTERN, MAX_PROVISION_ENTRIES, PasswordGenerator, generate_password, provision_entries,
+)
+from bastion.records import RECORD_FORMATS
+from bastion.reuse_index import PasswordReuseIndex
+from bastion.search_index import TrigramIndex
+from bastion.session import DEFAULT_MAX_AGE_SECONDS, DEFAULT_MAX_FAILURES, MIN_PIN_LENGTH, VaultSession
+from bastion.sort_index import SORTABLE_FIELDS, SortIndex
+from bastion.tracing import traced
+from bastion.vault import Vault, build_indexes
+
+
+# Si apunta a un archivo, la aplicación escribe ahí los milisegundos que tardó
+# en mostrar la ventana y sale (ver benchmarks/startup.py).
+STARTUP_PROBE_ENV_VAR = "BASTION_STARTUP_PROBE"
+ICON_SIZES = (32, 64)
+
 
 def resource_path(relative_path):
     try:
@@ -72,6 +90,161 @@ class ToolTip:
             self.tip_window = None
 
 
+class VirtualTreeview:
+    OVERSCAN = 30
+    EDGE_MARGIN = 5
+    DEFAULT_ROW_HEIGHT = 20
+    DEFAULT_VISIBLE_ROWS = 40
+
+    def __init__(self, tree, scrollbar, row_values, row_key):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.row_values = row_values
+        self.row_key = row_key
+        self.rows = []
+        self.window_start = 0
+        self.window_end = 0
+        self.top_index = 0
+        self.selected_key = None
+        self._recenter_id = None
+
+        self.tree.configure(yscrollcommand=self._on_tree_yscroll)
+        self.scrollbar.configure(command=self._on_scrollbar)
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select, add="+")
+        self.tree.bind("<Configure>", lambda event: self._schedule_recenter(), add="+")
+
+    def __len__(self):
+        return len(self.rows)
+
+    @traced
+    def set_rows(self, rows):
+        self.rows = rows
+        self.selected_key = None
+        self.top_index = 0
+        self._materialize(0, reset=True)
+
+    def refresh(self):
+        # Re-dibuja las filas visibles conservando la posición del scroll.
+        self._materialize(self.top_index, reset=True)
+
+    def remove_keys(self, keys):
+        to_remove = set(keys)
+        self.rows = [row for row in self.rows if self.row_key(row) not in to_remove]
+        if self.selected_key in to_remove:
+            self.selected_key = None
+        self.refresh()
+
+    def selected_keys(self):
+        if self.selected_key is None:
+            return []
+        return [self.selected_key]
+
+    def key_at(self, y):
+        return self.tree.identify_row(y) or None
+
+    def select_key(self, key):
+        if not self.tree.exists(key):
+            # Fuera de la ventana materializada: se desplaza hasta la fila.
+            index = next((index for index, row in enumerate(self.rows) if self.row_key(row) == key), None)
+            if index is None:
+                return
+            self._materialize(index - self._visible_rows() // 2)
+        self.selected_key = key
+        self.tree.selection_set(key)
+        self.tree.see(key)
+
+    def _visible_rows(self):
+        height = self.tree.winfo_height()
+        if height <= 1:
+            return self.DEFAULT_VISIBLE_ROWS
+        row_height = ttk.Style().lookup("Treeview", "rowheight") or self.DEFAULT_ROW_HEIGHT
+        return max(1, height // int(row_height))
+
+    @traced
+    def _materialize(self, top, reset=False):
+        total = len(self.rows)
+        visible = self._visible_rows()
+        top = max(0, min(top, total - visible))
+        start = max(0, top - self.OVERSCAN)
+        end = min(total, top + visible + self.OVERSCAN)
+        old_start, old_end = self.window_start, self.window_end
+
+        if reset or start >= old_end or end <= old_start:
+            children = self.tree.get_children()
+            if children:
+                self.tree.delete(*children)
+            for index in range(start, end):
+                self._insert_row(index, "end")
+        else:
+            stale = [self.row_key(self.rows[index]) for index in range(old_start, start)]
+            stale.extend(self.row_key(self.rows[index]) for index in range(end, old_end))
+            if stale:
+                self.tree.delete(*stale)
+            for index in reversed(range(start, old_start)):
+                self._insert_row(index, 0)
+            for index in range(old_end, end):
+                self._insert_row(index, "end")
+
+        self.window_start, self.window_end = start, end
+        self.top_index = top
+
+        if self.selected_key is not None and self.tree.exists(self.selected_key):
+            self.tree.selection_set(self.selected_key)
+        if end > start:
+            self.tree.yview_moveto((top - start) / (end - start))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _insert_row(self, index, position):
+        row = self.rows[index]
+        self.tree.insert("", position, iid=self.row_key(row), values=self.row_values(row))
+
+    def _on_tree_yscroll(self, first, last):
+        total = len(self.rows)
+        count = self.window_end - self.window_start
+        if not total or not count:
+            self.scrollbar.set(0, 1)
+            return
+
+        top = self.window_start + float(first) * count
+        bottom = self.window_start + float(last) * count
+        self.scrollbar.set(top / total, bottom / total)
+        self.top_index = int(round(top))
+
+        near_start = self.window_start > 0 and top - self.window_start < self.EDGE_MARGIN
+        near_end = self.window_end < total and self.window_end - bottom < self.EDGE_MARGIN
+        if near_start or near_end:
+            self._schedule_recenter()
+
+    def _on_scrollbar(self, *args):
+        if not self.rows:
+            return
+
+        if args[0] == "moveto":
+            top = int(float(args[1]) * len(self.rows))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= self._visible_rows()
+            top = self.top_index + amount
+        else:
+            return
+        self._materialize(top)
+
+    def _on_tree_select(self, event=None):
+        selection = self.tree.selection()
+        if selection:
+            self.selected_key = selection[0]
+
+    def _schedule_recenter(self):
+        if self._recenter_id is None:
+            self._recenter_id = self.tree.after_idle(self._recenter)
+
+    def _recenter(self):
+        self._recenter_id = None
+        self._materialize(self.top_index)
+
+
 class MasterPasswordDialog(tk.Toplevel):
     def __init__(self, parent, title, prompt_text, verify_mode=False):
         super().__init__(parent)
@@ -133,42 +306,58 @@ class MasterPasswordDialog(tk.Toplevel):
 
 class BastionPasswordManager:
     DRAG_THRESHOLD = 5
+    WORKER_POLL_MS = 50
+    AUTOSAVE_DELAY_MS = 3000
+    AUTOSAVE_MAX_DELAY_MS = 30000
+    IDLE_CHECK_MS = 5000
+    TRACE_REFRESH_MS = 250
+    # Tiempo máximo por tanda de inserción de una importación en el hilo de Tk.
+    IMPORT_TICK_MS = 40
+    # Lotes leídos que pueden esperar a ser insertados; con la cola llena, la
+    # lectura del archivo se detiene hasta que el hilo de Tk la vacía.
+    IMPORT_QUEUE_BATCHES = 8
+    DEFAULT_IDLE_LOCK_MINUTES = 5
 
     def __init__(self, root):
         self.root = root
         self.root.title("Bastión")
 
         # --- Cargar y establecer el icono de la aplicación (usando PNG) ---
-        png_file_name = "icono_bastion.png"
-        png_path_full = resource_path(os.path.join("Icons", png_file_name))
-        
+        # Los tamaños vienen ya generados (tools/build_icons.py): Tk los lee
+        # directamente, sin redimensionar ni cargar PIL en cada arranque.
+        icon_paths = [resource_path(os.path.join("Icons", f"icono_bastion_{size}.png")) for size in ICON_SIZES]
         try:
-            original_image = Image.open(png_path_full)
-            icon_image_32 = original_image.resize((32, 32), Image.Resampling.LANCZOS)
-            icon_image_64 = original_image.resize((64, 64), Image.Resampling.LANCZOS)
-
-            self.tk_icon_32 = ImageTk.PhotoImage(icon_image_32)
-            self.tk_icon_64 = ImageTk.PhotoImage(icon_image_64)
-
-            # Usar iconphoto para el icono de la ventana principal con el PNG
-            self.root.iconphoto(True, self.tk_icon_32, self.tk_icon_64)
-        except FileNotFoundError:
-            messagebox.showwarning("Icono no encontrado", f"No se encontró el archivo de icono: {png_path_full}. La aplicación se ejecutará sin icono.")
-        except Exception as e:
-            messagebox.showwarning("Error de icono (PNG)", f"No se pudo cargar el icono PNG: {e}. La aplicación se ejecutará sin icono.")
+            self.tk_icons = [tk.PhotoImage(file=icon_path) for icon_path in icon_paths]
+            self.root.iconphoto(True, *self.tk_icons)
+        except tk.TclError as e:
+            if not all(os.path.exists(icon_path) for icon_path in icon_paths):
+                messagebox.showwarning("Icono no encontrado", f"No se encontraron los archivos de icono: {', '.join(icon_paths)}. La aplicación se ejecutará sin icono.")
+            else:
+                messagebox.showwarning("Error de icono (PNG)", f"No se pudo cargar el icono PNG: {e}. La aplicación se ejecutará sin icono.")
         # ----------------------------------------------------
 
         self.root.geometry("900x600")
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
-        self.master_key = None
-        self.fernet_cipher = None
-        self.current_file_path = None
-        self.current_salt = None
-
-        self.entries_data_store = {}
-        self.all_entries_data = {}
+        # Base de datos abierta (clave, árbol de grupos y estado del archivo).
+        self.vault = Vault()
+        # Puntuaciones de la última auditoría de contraseñas, por huella. Se
+        # crea con la primera auditoría (ver start_password_audit).
+        self.audit_cache = None
+
+        # Cambios sin guardar y guardado automático.
+        self.unsaved_changes = False
+        self._edit_generation = 0
+        self._first_unsaved_edit = 0.0
+        self._autosave_after_id = None
+        self._autosave_job = None
+
+        self.group_item_ids = {}
+        self.group_item_nodes = {}
+        self.search_index = TrigramIndex()
+        self.sort_indexes = {field: SortIndex(field) for field in SORTABLE_FIELDS}
+        self.reuse_index = PasswordReuseIndex()
 
         self._drag_item = None
         self._drag_item_candidate = None
@@ -180,6 +369,20 @@ class BastionPasswordManager:
         self.current_sort_key = "Title"
         self.current_sort_reverse = False
 
+        # Scrypt, Fernet y JSON se ejecutan fuera del hilo de Tk. El hilo se
+        # crea con el primer trabajo (ver _submit).
+        self.worker = None
+        self._background_job = None
+        self._background_progress = None
+
+        self.vault_session = None
+        self.locked = False
+        self._locked_key_check = None
+        # El bloqueo por inactividad no depende del PIN: sin desbloqueo rápido
+        # se vuelve a pedir la contraseña maestra. None lo desactiva.
+        self.idle_lock_seconds = self.DEFAULT_IDLE_LOCK_MINUTES * 60
+        self._last_activity = time.monotonic()
+
         self.root.grid_rowconfigure(0, weight=0)
         self.root.grid_rowconfigure(1, weight=1)
         self.root.grid_rowconfigure(2, weight=0)
@@ -194,9 +397,27 @@ class BastionPasswordManager:
         self.populate_group_tree()
         self.update_status_bar(None)
 
-        self.root.after(100, self._prompt_on_startup)
+        for activity_event in ("<Any-KeyPress>", "<Any-ButtonPress>", "<Motion>"):
+            self.root.bind_all(activity_event, self._register_activity, add="+")
+        self.root.bind_all("<Control-l>", lambda event: self.lock_database())
+        self.root.after(self.IDLE_CHECK_MS, self._check_idle_lock)
+
+        self._shown_span = None
+        if tracing.is_enabled():
+            self.root.after(self.TRACE_REFRESH_MS, self._show_last_span)
+
+        # Tras el primer dibujado de la ventana, sin esperas fijas.
+        self.root.after_idle(self._prompt_on_startup)
 
     def _prompt_on_startup(self):
+        probe_path = os.environ.get(STARTUP_PROBE_ENV_VAR)
+        if probe_path:
+            self.root.update_idletasks()
+            with open(probe_path, 'w') as f:
+                f.write(f"{(time.perf_counter() - STARTUP_CLOCK) * 1000:.1f}\n")
+            self.root.destroy()
+            return
+
         response = messagebox.askyesno("Bienvenido", "¿Deseas abrir una base de datos existente?")
         if response:
             self.open_database()
@@ -207,12 +428,19 @@ class BastionPasswordManager:
     def create_menu_bar(self):
         menubar = tk.Menu(self.root)
         self.root.config(menu=menubar)
+        self.menubar = menubar
+        self.database_menu_labels = ("Archivo", "Grupo", "Entrada", "Herramientas")
 
         file_menu = tk.Menu(menubar, tearoff=0)
         file_menu.add_command(label="Nuevo...", command=self.start_new_database)
         file_menu.add_command(label="Abrir...", command=self.open_database)
         file_menu.add_command(label="Guardar", command=self.save_database)
         file_menu.add_command(label="Guardar Como...", command=lambda: self.save_database(save_as=True))
+        file_menu.add_command(label="Importar...", command=self.open_import_window)
+        file_menu.add_command(label="Exportar...", command=self.open_export_window)
+        file_menu.add_separator()
+        file_menu.add_command(label="Bloquear", accelerator="Ctrl+L", command=self.lock_database)
+        file_menu.add_command(label="Desbloquear...", command=self.unlock_database)
         file_menu.add_separator()
         file_menu.add_command(label="Salir", command=self.on_closing)
         menubar.add_cascade(label="Archivo", menu=file_menu)
@@ -220,6 +448,7 @@ class BastionPasswordManager:
         group_menu = tk.Menu(menubar, tearoff=0)
         group_menu.add_command(label="Añadir Grupo", command=self.open_add_group_window)
         group_menu.add_command(label="Eliminar Grupo", command=lambda: self.delete_selected_group(None))
+        group_menu.add_command(label="Generar Entradas...", command=self.open_provision_entries_window)
         menubar.add_cascade(label="Grupo", menu=group_menu)
 
         entry_menu = tk.Menu(menubar, tearoff=0)
@@ -262,9 +491,13 @@ class BastionPasswordManager:
         tools_menu = tk.Menu(menubar, tearoff=0)
         tools_menu.add_command(label="Generador de Contraseñas Avanzado...", command=self._open_advanced_password_generator_window)
         tools_menu.add_command(label="Comprobador de Fortaleza de Contraseñas...", command=self._open_password_strength_checker)
+        tools_menu.add_command(label="Auditar Contraseñas...", command=self.start_password_audit)
+        tools_menu.add_command(label="Contraseñas Reutilizadas...", command=self.open_reused_passwords_window)
         tools_menu.add_command(label="Limpiar Portapapeles", command=self.clean_clipboard)
         tools_menu.add_separator()
         tools_menu.add_command(label="Cambiar Contraseña Maestra...", command=self.open_change_master_password_window)
+        tools_menu.add_command(label="Configurar Desbloqueo Rápido...", command=self.open_quick_unlock_settings_window)
+        tools_menu.add_command(label="Formato del Archivo...", command=self.open_file_format_settings_window)
         menubar.add_cascade(label="Herramientas", menu=tools_menu)
 
         help_menu = tk.Menu(menubar, tearoff=0)
@@ -282,35 +515,43 @@ class BastionPasswordManager:
 
         button_container = ttk.Frame(toolbar_frame)
         button_container.grid(row=0, column=0, sticky="w", padx=(5,0))
+        self.toolbar_buttons = []
 
         btn_add_group = ttk.Button(button_container, text="➕G", command=self.open_add_group_window)
         btn_add_group.pack(side="left", padx=2, pady=2)
+        self.toolbar_buttons.append(btn_add_group)
         ToolTip(btn_add_group, "Añadir Grupo")
 
         btn_add_entry = ttk.Button(button_container, text="➕E", command=self.open_add_entry_window)
         btn_add_entry.pack(side="left", padx=2, pady=2)
+        self.toolbar_buttons.append(btn_add_entry)
         ToolTip(btn_add_entry, "Añadir Entrada")
 
         ttk.Separator(button_container, orient="vertical").pack(side="left", fill="y", padx=5, pady=2)
 
         btn_edit_entry = ttk.Button(button_container, text="✏️", command=self.open_edit_entry_window)
         btn_edit_entry.pack(side="left", padx=2, pady=2)
+        self.toolbar_buttons.append(btn_edit_entry)
         ToolTip(btn_edit_entry, "Editar Entrada/Grupo")
 
         btn_delete_selected = ttk.Button(button_container, text="🗑️", command=self.delete_selected)
         btn_delete_selected.pack(side="left", padx=2, pady=2)
+        self.toolbar_buttons.append(btn_delete_selected)
         ToolTip(btn_delete_selected, "Eliminar Seleccionado")
 
         btn_copy_user = ttk.Button(button_container, text="📋U", command=lambda: self.copy_entry_detail("User Name"))
         btn_copy_user.pack(side="left", padx=2, pady=2)
+        self.toolbar_buttons.append(btn_copy_user)
         ToolTip(btn_copy_user, "Copiar Usuario")
 
         btn_copy_pwd = ttk.Button(button_container, text="📋P", command=lambda: self.copy_entry_detail("Password"))
         btn_copy_pwd.pack(side="left", padx=2, pady=2)
+        self.toolbar_buttons.append(btn_copy_pwd)
         ToolTip(btn_copy_pwd, "Copiar Contraseña")
 
         btn_copy_url = ttk.Button(button_container, text="📋L", command=lambda: self.copy_entry_detail("URL"))
         btn_copy_url.pack(side="left", padx=2, pady=2)
+        self.toolbar_buttons.append(btn_copy_url)
         ToolTip(btn_copy_url, "Copiar URL")
 
         search_frame = ttk.Frame(toolbar_frame)
@@ -360,66 +601,41 @@ class BastionPasswordManager:
             else:
                 self.entry_tree.column(col, width=100, anchor="w")
 
-        entry_scrollbar_y = ttk.Scrollbar(entry_frame, orient="vertical", command=self.entry_tree.yview)
+        entry_scrollbar_y = ttk.Scrollbar(entry_frame, orient="vertical")
         entry_scrollbar_y.grid(row=0, column=1, sticky="ns")
-        self.entry_tree.configure(yscrollcommand=entry_scrollbar_y.set)
+        self.entry_list = VirtualTreeview(self.entry_tree, entry_scrollbar_y, self._entry_row_values, entry_id)
 
         entry_scrollbar_x = ttk.Scrollbar(entry_frame, orient="horizontal", command=self.entry_tree.xview)
         entry_scrollbar_x.grid(row=1, column=0, sticky="ew")
         self.entry_tree.configure(xscrollcommand=entry_scrollbar_x.set)
 
-        self.entry_tree.bind("<<TreeviewSelect>>", self.update_status_bar)
+        self.entry_tree.bind("<<TreeviewSelect>>", self.update_status_bar, add="+")
         self.entry_tree.bind("<Double-1>", self._on_entry_double_click)
 
     def get_full_tree_item_path(self, item_id):
-        if not item_id:
+        group = self.group_item_nodes.get(item_id) if item_id else None
+        if group is None:
             return "Database"
+        return group.path
 
-        path_parts = []
-        current_id = item_id
-        while current_id and self.group_tree.parent(current_id) != "":
-            item_text = self.group_tree.item(current_id, "text")
-            path_parts.insert(0, item_text)
-            current_id = self.group_tree.parent(current_id)
-
-        if current_id:
-            path_parts.insert(0, self.group_tree.item(current_id, "text"))
-
-        return "/".join(path_parts)
-
+    @traced
     def populate_group_tree(self):
-        for item in self.group_tree.get_children():
-            self.group_tree.delete(item)
-
-        path_to_tree_item_id = {"": ""}
-
-        all_actual_group_paths = set()
-        for group_path in self.all_entries_data.keys():
-            parts = group_path.split('/')
-            current_partial_path_list = []
-            for part in parts:
-                current_partial_path_list.append(part)
-                all_actual_group_paths.add("/".join(current_partial_path_list))
-
-        sorted_group_paths = sorted(list(all_actual_group_paths))
+        children = self.group_tree.get_children()
+        if children:
+            self.group_tree.delete(*children)
+        self.group_item_ids = {}
+        self.group_item_nodes = {}
 
         first_group_id = None
 
-        for full_path in sorted_group_paths:
-            parts = full_path.split('/')
-            current_group_name = parts[-1]
-
-            parent_full_path_for_data = "/".join(parts[:-1])
-
-            parent_tree_item_id = path_to_tree_item_id.get(parent_full_path_for_data, "")
-
-            if parent_tree_item_id is not None:
-                new_item_id = self.group_tree.insert(parent_tree_item_id, "end", text=current_group_name, open=True, tags=("group", current_group_name.lower()))
-                path_to_tree_item_id[full_path] = new_item_id
-                if first_group_id is None:
-                    first_group_id = new_item_id
-            else:
-                print(f"Warning: Parent Treeview item not found for path: {full_path} (Parent: {parent_full_path_for_data})")
+        pending = [(group, "") for group in self._sorted_child_groups(self.vault.groups.root)]
+        pending.reverse()
+        while pending:
+            group, parent_tree_item_id = pending.pop()
+            new_item_id = self._tree_add_item(group, parent_tree_item_id, "end")
+            if first_group_id is None:
+                first_group_id = new_item_id
+            pending.extend((child, new_item_id) for child in reversed(self._sorted_child_groups(group)))
 
         if first_group_id:
             self.group_tree.selection_set(first_group_id)
@@ -430,60 +646,103 @@ class BastionPasswordManager:
             self.group_tree.selection_set("")
             self._filter_entries()
 
+    @staticmethod
+    def _sorted_child_groups(group):
+        return [group.children[name] for name in sorted(group.children)]
+
+    def _tree_add_item(self, group, parent_item_id, index):
+        item_id = self.group_tree.insert(parent_item_id, index, text=group.name, open=True, tags=("group", group.name.lower()))
+        self.group_item_ids[group] = item_id
+        self.group_item_nodes[item_id] = group
+        return item_id
+
+    def _tree_parent_item_id(self, group):
+        if group.parent is self.vault.groups.root:
+            return ""
+        return self._tree_insert_group(group.parent)
+
+    def _tree_sibling_index(self, parent_item_id, group_name, exclude_item_id=None):
+        sibling_names = [
+            self.group_item_nodes[child_id].name
+            for child_id in self.group_tree.get_children(parent_item_id)
+            if child_id != exclude_item_id
+        ]
+        return bisect.bisect_left(sibling_names, group_name)
+
+    def _tree_insert_group(self, group):
+        item_id = self.group_item_ids.get(group)
+        if item_id is not None:
+            return item_id
+
+        parent_item_id = self._tree_parent_item_id(group)
+        return self._tree_add_item(group, parent_item_id, self._tree_sibling_index(parent_item_id, group.name))
+
+    def _tree_move_group(self, group):
+        # El grupo ya tiene su nuevo padre y nombre en el modelo; basta con
+        # recolocar su nodo, los descendientes se mueven con él.
+        item_id = self.group_item_ids.get(group)
+        if item_id is None:
+            return self._tree_insert_group(group)
+
+        parent_item_id = self._tree_parent_item_id(group)
+        self.group_tree.item(item_id, text=group.name, tags=("group", group.name.lower()))
+        index = self._tree_sibling_index(parent_item_id, group.name, exclude_item_id=item_id)
+        self.group_tree.move(item_id, parent_item_id, index)
+        return item_id
+
+    def _tree_delete_group(self, group):
+        item_id = self.group_item_ids.get(group)
+        if item_id is None:
+            return
 
+        self.group_tree.delete(item_id)
+        for removed_group in group.iter_subtree():
+            removed_item_id = self.group_item_ids.pop(removed_group, None)
+            self.group_item_nodes.pop(removed_item_id, None)
+
+    @traced
     def _filter_entries(self, event=None):
         search_query = self.search_entry.get().strip().lower()
-        for item in self.entry_tree.get_children():
-            self.entry_tree.delete(item)
-        self.entries_data_store = {}
 
-        selected_group_full_path = self.get_selected_group_full_path()
+        selected_group = self.get_selected_group()
 
         entries_to_process = []
-        if selected_group_full_path == "Database":
-            if search_query:
-                for group_path, entries_list in self.all_entries_data.items():
-                    for entry in entries_list:
-                        entries_to_process.append(entry)
-
-        else:
-            entries_to_process = self.all_entries_data.get(selected_group_full_path, [])
+        if selected_group is not None:
+            entries_to_process = selected_group.entries.values()
 
-        filtered_entries = []
         if search_query:
-            for entry in entries_to_process:
-                if (search_query in entry.get("Title", "").lower() or
-                    search_query in entry.get("User Name", "").lower() or
-                    search_query in entry.get("URL", "").lower() or
-                    search_query in entry.get("Notes", "").lower()):
-                    filtered_entries.append(entry)
+            if selected_group is None:
+                # La búsqueda global necesita todos los grupos desencriptados.
+                self._ensure_groups_loaded(self.vault.groups.unloaded_groups())
+            filtered_entries = self.search_index.search(search_query, selected_group)
         else:
-            filtered_entries = entries_to_process
+            filtered_entries = list(entries_to_process)
 
-        if self.current_sort_key:
-            try:
-                if self.current_sort_key in ["Creation Time", "Last Modification Time"]:
-                    filtered_entries.sort(key=lambda x: datetime.datetime.strptime(x.get(self.current_sort_key, "01/01/2000 12:00:00 a.m."), "%d/%m/%Y %I:%M:%S %p."), reverse=self.current_sort_reverse)
-                else:
-                    filtered_entries.sort(key=lambda x: str(x.get(self.current_sort_key, "")).lower(), reverse=self.current_sort_reverse)
-            except Exception as e:
-                print(f"Error durante el ordenamiento: {e}")
+        sort_index = self.sort_indexes.get(self.current_sort_key)
+        if sort_index is not None:
+            filtered_entries = sort_index.sort(filtered_entries, entry_id, reverse=self.current_sort_reverse)
 
-        for entry in filtered_entries:
-            displayed_password = "*********" if entry.get("Password") else ""
-            item_id = self.entry_tree.insert("", "end", values=(entry.get("Title"), entry.get("User Name"), displayed_password, entry.get("URL"), entry.get("Notes")))
-            self.entries_data_store[item_id] = entry
+        self.entry_list.set_rows(filtered_entries)
 
         self.update_status_bar(None)
 
+    def _entry_row_values(self, entry):
+        displayed_password = "*********" if entry.get("Password") else ""
+        return (entry.get("Title"), entry.get("User Name"), displayed_password, entry.get("URL"), entry.get("Notes"))
+
 
+    @traced
     def _sort_entries(self, sort_key, reverse):
         self.current_sort_key = sort_key
         self.current_sort_reverse = reverse
         self._filter_entries()
 
 
+    @traced
     def on_group_select(self, event):
+        selected_group = self.get_selected_group()
+        if selected_group is not None and not selected_group.loaded:
+            self._ensure_groups_loaded([selected_group])
         self._filter_entries()
 
 
@@ -491,30 +750,33 @@ class BastionPasswordManager:
         self.status_bar_frame = ttk.Frame(self.root, relief="sunken", borderwidth=1)
         self.status_bar_frame.grid(row=2, column=0, sticky="ew")
         self.status_bar_frame.grid_columnconfigure(0, weight=1)
-        self.status_bar_frame.grid_columnconfigure(1, weight=1)
-        self.status_bar_frame.grid_columnconfigure(2, weight=0)
+        self.status_bar_frame.grid_columnconfigure(1, weight=0)
+        self.status_bar_frame.grid_columnconfigure(2, weight=1)
+        self.status_bar_frame.grid_columnconfigure(3, weight=0)
 
         self.details_label = ttk.Label(self.status_bar_frame, text="Listo.", font=("Arial", 9))
         self.details_label.grid(row=0, column=0, sticky="w", padx=10, pady=2)
 
+        self.busy_progress = ttk.Progressbar(self.status_bar_frame, mode="indeterminate", length=120)
+        self.busy_progress.grid(row=0, column=1, sticky="e", padx=10, pady=2)
+        self.busy_progress.grid_remove()
+
         self.selection_count_label = ttk.Label(self.status_bar_frame, text="0 de 0 seleccionados", font=("Arial", 9))
-        self.selection_count_label.grid(row=0, column=1, sticky="e", padx=10, pady=2)
+        self.selection_count_label.grid(row=0, column=2, sticky="e", padx=10, pady=2)
 
         self.datetime_label = ttk.Label(self.status_bar_frame, text="", font=("Arial", 9))
-        self.datetime_label.grid(row=0, column=2, sticky="e", padx=10, pady=2)
+        self.datetime_label.grid(row=0, column=3, sticky="e", padx=10, pady=2)
 
         self.update_datetime_in_status_bar()
 
     def update_status_bar(self, event):
-        selected_items = self.entry_tree.selection()
-        num_selected = len(selected_items)
-        total_entries = len(self.entry_tree.get_children())
+        num_selected = len(self.entry_list.selected_keys())
+        total_entries = len(self.entry_list)
 
-        self.details_label.config(text="Listo.")
+        if self._background_job is None:
+            self.details_label.config(text="Base de datos bloqueada." if self.locked else "Listo.")
         self.selection_count_label.config(text=f"{num_selected} de {total_entries} seleccionados")
 
-        self.update_datetime_in_status_bar()
-
     def update_datetime_in_status_bar(self):
         now = datetime.datetime.now()
 
@@ -533,7 +795,20 @@ class BastionPasswordManager:
 
         date_time_str = f"{now.day}/{now.month}/{now.year} {hour}:{minutes}{am_pm}"
         self.datetime_label.config(text=f"ESP LAA {date_time_str}")
-        self.root.after(60000, self.update_datetime_in_status_bar)
+        # Un único temporizador, alineado con el cambio de minuto.
+        self.root.after((60 - now.second) * 1000, self.update_datetime_in_status_bar)
+
+    def _show_last_span(self):
+        # Solo con las trazas activas (--trace): la última operación medida,
+        # también las del hilo de trabajo, con sus percentiles recientes.
+        last = tracing.last_span()
+        if last is not None and last is not self._shown_span and self._background_job is None:
+            name, seconds = last
+            stats = tracing.percentiles(name)
+            self.details_label.config(text=f"{name}: {seconds * 1000:.1f} ms "
+                                           f"(p50 {stats['p50']:.1f}, p90 {stats['p90']:.1f}, p99 {stats['p99']:.1f}, n={stats['count']})")
+            self._shown_span = last
+        self.root.after(self.TRACE_REFRESH_MS, self._show_last_span)
 
     def get_selected_group_full_path(self):
         selected_item_id = self.group_tree.selection()
@@ -541,12 +816,31 @@ class BastionPasswordManager:
             return self.get_full_tree_item_path(selected_item_id[0])
         return "Database"
 
+    def get_selected_group(self):
+        selected_item_id = self.group_tree.selection()
+        if selected_item_id:
+            return self.group_item_nodes.get(selected_item_id[0])
+        return None
+
     def on_closing(self):
-        if self.master_key is not None:
+        if self._background_job is not None:
+            messagebox.showwarning("Operación en curso", "Espere a que termine la operación en curso antes de salir.")
+            return
+
+        if self.unsaved_changes and self.locked:
+            if not messagebox.askyesno("Base de Datos Bloqueada", "La base de datos está bloqueada y los cambios no guardados se perderán. ¿Salir de todos modos?"):
+                return
+        elif self.unsaved_changes and self.vault.key is not None:
             if messagebox.askyesno("Guardar Cambios", "¿Deseas guardar los cambios antes de salir de Bastión?"):
-                self.save_database()
+                self.save_database(on_done=self._confirm_exit)
+                return
+
+        self._confirm_exit()
 
+    def _confirm_exit(self):
         if messagebox.askyesno("Salir", "¿Estás seguro de que quieres salir de Bastión?"):
+            if self.worker is not None:
+                self.worker.shutdown(wait=False)
             self.root.destroy()
 
     def _start_drag(self, event):
@@ -583,35 +877,43 @@ class BastionPasswordManager:
 
             self.root.config(cursor="hand2")
 
+    @traced
     def _drop(self, event):
         self.root.config(cursor="")
 
-        if not self._is_dragging or self._drag_item is None:
+        if not self._is_dragging or self._drag_item is None or self._background_job is not None:
             self._reset_drag_state()
             return
 
         target_item = self.group_tree.identify_row(event.y)
 
-        if not target_item or target_item == "":
-            target_full_path_for_data_update = "Database"
-        else:
-            target_full_path_for_data_update = self.get_full_tree_item_path(target_item)
+        source_group = self.group_item_nodes.get(self._drag_item)
+        target_group = self.group_item_nodes.get(target_item, self.vault.groups.root) if target_item else self.vault.groups.root
 
-        source_full_path = self.get_full_tree_item_path(self._drag_item)
+        if source_group is None:
+            self._reset_drag_state()
+            return
 
-        if source_full_path == target_full_path_for_data_update:
+        if source_group is target_group:
             messagebox.showwarning("Mover Grupo", "No se puede mover un grupo sobre sí mismo.")
             self._reset_drag_state()
             return
 
-        if target_full_path_for_data_update != "Database" and target_full_path_for_data_update.startswith(f"{source_full_path}/"):
-             messagebox.showwarning("Mover Grupo", "No se puede mover un grupo a uno de sus subgrupos.")
-             self._reset_drag_state()
-             return
+        if source_group.parent is target_group:
+            self._reset_drag_state()
+            return
 
-        self._remap_group_paths_in_data(source_full_path, target_full_path_for_data_update, is_rename_op=False)
+        target_full_path_for_data_update = target_group.path or "Database"
 
-        self.populate_group_tree()
+        try:
+            self._remap_group_paths_in_data(source_group.path, target_full_path_for_data_update, is_rename_op=False)
+        except ValueError as e:
+            messagebox.showwarning("Mover Grupo", str(e))
+            self._reset_drag_state()
+            return
+
+        self._mark_dirty()
+        self._select_group(source_group)
 
         self._reset_drag_state()
 
@@ -623,138 +925,201 @@ class BastionPasswordManager:
         self._start_y = 0
         self.root.config(cursor="")
 
+    @traced
     def _remap_group_paths_in_data(self, old_full_path, new_path_context, is_rename_op=False):
-        remapping = {}
+        if self.locked:
+            raise ValueError("La base de datos está bloqueada.")
+        group = self.vault.groups.find(old_full_path)
+        if group is None or group is self.vault.groups.root:
+            raise ValueError(f"El grupo '{old_full_path}' no existe.")
 
         if is_rename_op:
-            remapping[old_full_path] = new_path_context
-            for current_path in list(self.all_entries_data.keys()):
-                if current_path.startswith(f"{old_full_path}/"):
-                    suffix = current_path[len(old_full_path):]
-                    remapping[current_path] = f"{new_path_context}{suffix}"
+            self.vault.groups.rename_group(group, new_path_context.split('/')[-1])
         else:
-            moved_group_base_name = old_full_path.split('/')[-1]
-            if new_path_context == "Database":
-                new_full_path_for_moved_group = moved_group_base_name
-            else:
-                new_full_path_for_moved_group = f"{new_path_context}/{moved_group_base_name}"
-
-            remapping[old_full_path] = new_full_path_for_moved_group
-            for current_path in list(self.all_entries_data.keys()):
-                if current_path.startswith(f"{old_full_path}/"):
-                    suffix = current_path[len(old_full_path):]
-                    remapping[current_path] = f"{new_full_path_for_moved_group}{suffix}"
-
-        new_all_entries_data = {}
-        for current_path, entries in self.all_entries_data.items():
-            if current_path in remapping:
-                new_all_entries_data[remapping[current_path]] = entries
-            else:
-                new_all_entries_data[current_path] = entries
+            new_parent_path = "" if new_path_context == "Database" else new_path_context
+            new_parent = self.vault.groups.find(new_parent_path)
+            if new_parent is None:
+                raise ValueError(f"El grupo '{new_parent_path}' no existe.")
+            self.vault.groups.move_group(group, new_parent)
+
+        # Las entradas siguen colgando del mismo nodo, así que los índices no
+        # necesitan cambios; solo se recoloca el nodo del árbol visual.
+        self._tree_move_group(group)
+        return group
+
+    def _rebuild_indexes(self):
+        self.search_index, self.sort_indexes, self.reuse_index = build_indexes(self.vault.groups)
+
+    def _index_entry(self, entry, group):
+        self.search_index.add(entry_id(entry), entry, group)
+        for sort_index in self.sort_indexes.values():
+            sort_index.add(entry_id(entry), entry)
+        self.reuse_index.add(entry_id(entry), entry)
+
+    def _unindex_entry(self, entry):
+        self.search_index.remove(entry_id(entry))
+        for sort_index in self.sort_indexes.values():
+            sort_index.remove(entry_id(entry))
+        self.reuse_index.remove(entry_id(entry))
+
+    @traced
+    def _load_group_block(self, group):
+        if group.loaded:
+            return
+        if self._background_job is not None:
+            raise VaultError("Espere a que termine la operación en curso.")
+        # Un guardado automático puede estar reescribiendo el archivo.
+        self._finish_autosave()
+        self.vault.load_group(group)
+        for entry in group.entries.values():
+            self._index_entry(entry, group)
+
+    def _ensure_groups_loaded(self, groups):
+        try:
+            for group in groups:
+                self._load_group_block(group)
+        except VaultError as e:
+            messagebox.showerror("Error de Carga", str(e))
+            return False
+        return True
 
-        self.all_entries_data = new_all_entries_data
+    def _load_groups_in_background(self, groups, on_loaded):
+        # Desencripta los bloques en el hilo de trabajo y los inserta e indexa
+        # en el de Tk (_insert_loaded_groups); on_loaded(cargados) indica si
+        # se cargaron todos.
+        try:
+            job, finish, abort = self.vault.prepare_load(groups)
+        except VaultError as e:
+            messagebox.showerror("Error de Carga", str(e))
+            return False
 
-    def _derive_key(self, master_password, salt=None):
-        if salt is None:
-            salt = os.urandom(16)
+        def on_success(decoded_blocks):
+            self._insert_loaded_groups(self.vault, finish, list(decoded_blocks), on_loaded)
 
-        kdf = Scrypt(
-            salt=salt,
-            length=32,
-            n=2**14,
-            r=8,
-            p=1,
-            backend=default_backend()
-        )
-        key = kdf.derive(master_password.encode('utf-8'))
-        return base64.urlsafe_b64encode(key), salt
+        def on_error(error):
+            abort()
+            messagebox.showerror("Error de Carga", str(error))
+            on_loaded(False)
 
-    def _encrypt_data(self, data, cipher):
-        try:
-            json_data = json.dumps(data).encode('utf-8')
-            encrypted_bytes = cipher.encrypt(json_data)
-            return encrypted_bytes
-        except Exception as e:
-            print(f"Error al encriptar los datos: {e}")
-            return None
+        return self._run_in_background("Cargando grupos...", job, (), on_success, on_error)
 
-    def _decrypt_data(self, encrypted_bytes, cipher):
-        try:
-            decrypted_bytes = cipher.decrypt(encrypted_bytes)
-            decrypted_data = json.loads(decrypted_bytes.decode('utf-8'))
-            return decrypted_data
-        except InvalidToken:
-            messagebox.showerror("Error de Desencriptación", "Contraseña maestra incorrecta o datos corruptos.")
-            return None
-        except Exception as e:
-            print(f"Error al desencriptar los datos: {e}")
-            messagebox.showerror("Error de Desencriptación", f"Error al desencriptar los datos: {e}")
-            return None
+    def _insert_loaded_groups(self, vault, finish, decoded_blocks, on_loaded):
+        # Como _insert_import_batches: grupo a grupo durante IMPORT_TICK_MS
+        # como mucho, para que la ventana siga respondiendo mientras se indexan.
+        if self.vault is not vault or self.locked:
+            on_loaded(False)
+            return
+        deadline = time.perf_counter() + self.IMPORT_TICK_MS / 1000
+        while decoded_blocks and time.perf_counter() < deadline:
+            for group in finish([decoded_blocks.pop()]):
+                for entry in group.entries.values():
+                    self._index_entry(entry, group)
+        if decoded_blocks:
+            self.root.after(1, self._insert_loaded_groups, vault, finish, decoded_blocks, on_loaded)
+        else:
+            on_loaded(True)
 
-    def _load_database_file_internal(self, file_path, master_password):
-        try:
-            with open(file_path, 'rb') as f:
-                salt_b64 = f.read(24)
-                if len(salt_b64) < 24:
-                    messagebox.showerror("Error de Carga", "Archivo de base de datos corrupto o incompleto (salt faltante).")
-                    return None, None, None
-                salt = base64.urlsafe_b64decode(salt_b64)
-
-                encrypted_data_bytes = f.read()
-                if not encrypted_data_bytes:
-                    messagebox.showerror("Error de Carga", "Archivo de base de datos vacío o corrupto (datos encriptados faltantes).")
-                    return None, None, None
-
-            derived_key_b64, _ = self._derive_key(master_password, salt=salt)
-            fernet_cipher = Fernet(derived_key_b64)
-
-            decrypted_data = self._decrypt_data(encrypted_data_bytes, fernet_cipher)
-            if decrypted_data is not None:
-                return decrypted_data, derived_key_b64, salt
-            else:
-                return None, None, None
+    def _run_in_background(self, busy_text, func, args=(), on_success=None, on_error=None, progress=None):
+        # progress: opcional, se llama en el hilo de Tk mientras dura el
+        # trabajo y devuelve (texto, fracción) para la barra de estado.
+        if self._background_job is not None:
+            messagebox.showwarning("Operación en curso", "Ya hay una operación en curso. Espere a que termine.")
+            return False
 
-        except FileNotFoundError:
-            messagebox.showerror("Error de Carga", "Archivo no encontrado.")
-            return None, None, None
-        except Exception as e:
-            messagebox.showerror("Error de Carga", f"No se pudo abrir la base de datos: {e}")
-            return None, None, None
+        self._finish_autosave()
+        future = self._submit(func, *args)
+        self._background_job = (future, on_success, on_error)
+        self._background_progress = progress
+        self._set_busy(busy_text)
+        self.root.after(self.WORKER_POLL_MS, self._poll_background_job)
+        return True
+
+    def _submit(self, func, *args):
+        if self.worker is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bastion-worker")
+        return self.worker.submit(func, *args)
+
+    def _poll_background_job(self):
+        future, on_success, on_error = self._background_job
+        if not future.done():
+            if self._background_progress is not None:
+                self._show_progress(*self._background_progress())
+            self.root.after(self.WORKER_POLL_MS, self._poll_background_job)
+            return
 
-    def _save_database_file_internal(self, file_path, data_to_save, master_key_b64, salt):
-        try:
-            fernet_cipher = Fernet(master_key_b64)
-            encrypted_data_bytes = self._encrypt_data(data_to_save, fernet_cipher)
-            if encrypted_data_bytes is None:
-                return False
-
-            with open(file_path, 'wb') as f:
-                f.write(base64.urlsafe_b64encode(salt))
-                f.write(encrypted_data_bytes)
-            return True
-        except Exception as e:
-            messagebox.showerror("Error de Guardado", f"No se pudo guardar la base de datos: {e}")
-            return False
+        self._background_job = None
+        self._background_progress = None
+        self._set_busy(None)
+
+        error = future.exception()
+        if error is None:
+            if on_success:
+                on_success(future.result())
+        elif on_error:
+            on_error(error)
+        else:
+            messagebox.showerror("Error", str(error))
+
+    def _refresh_action_states(self):
+        busy = self._background_job is not None
+        for menu_label in self.database_menu_labels:
+            # "Archivo" sigue disponible con la base bloqueada para poder desbloquearla.
+            enabled = not busy and (not self.locked or menu_label == "Archivo")
+            self.menubar.entryconfigure(menu_label, state="normal" if enabled else "disabled")
+        disabled = busy or self.locked
+        for button in self.toolbar_buttons:
+            button.state(["disabled"] if disabled else ["!disabled"])
+        self.search_entry.state(["disabled"] if disabled else ["!disabled"])
+
+    def _set_busy(self, busy_text):
+        busy = busy_text is not None
+        self._refresh_action_states()
+
+        if busy:
+            self.details_label.config(text=busy_text)
+            self.busy_progress.config(mode="indeterminate", value=0)
+            self.busy_progress.grid()
+            self.busy_progress.start(15)
+            self.root.config(cursor="watch")
+        else:
+            self.busy_progress.stop()
+            self.busy_progress.grid_remove()
+            self.root.config(cursor="")
+            self.update_status_bar(None)
+
+    def _show_progress(self, text, fraction):
+        # Para operaciones que conocen su avance: la barra pasa a modo
+        # determinado hasta que termina la operación.
+        if str(self.busy_progress.cget("mode")) != "determinate":
+            self.busy_progress.stop()
+            self.busy_progress.config(mode="determinate", maximum=100)
+        self.busy_progress.config(value=fraction * 100)
+        self.details_label.config(text=text)
 
     def start_new_database(self):
         dialog = MasterPasswordDialog(self.root, "Establecer Contraseña Maestra",
                                       "Por favor, introduzca una nueva contraseña maestra para la base de datos:")
         master_password = dialog.result_password
 
-        if master_password:
-            derived_key_b64, salt = self._derive_key(master_password)
-            self.master_key = derived_key_b64
-            self.current_salt = salt
-            self.fernet_cipher = Fernet(self.master_key)
+        if not master_password:
+            messagebox.showwarning("Base de Datos", "Creación de nueva base de datos cancelada.")
+            return
 
-            self.all_entries_data = {}
+        def on_created(vault):
+            self.vault = vault
+            self._start_session()
+            self._rebuild_indexes()
             self.populate_group_tree()
-            self.current_file_path = None
+            self._set_unsaved(False)
 
             messagebox.showinfo("Base de Datos", "Nueva base de datos creada. Ahora puede añadir grupos y entradas. Por favor, guarde la base de datos.")
             self.save_database(save_as=True)
-        else:
-            messagebox.showwarning("Base de Datos", "Creación de nueva base de datos cancelada.")
+
+        def on_error(error):
+            messagebox.showerror("Error", f"No se pudo crear la base de datos: {error}")
+
+        self._run_in_background("Calibrando y derivando clave maestra...", Vault.create, (master_password,), on_created, on_error)
 
     def open_database(self):
         file_path = filedialog.askopenfilename(
@@ -775,25 +1140,38 @@ class BastionPasswordManager:
             self._reset_app_state()
             return
 
-        loaded_data, derived_key_b64, salt = self._load_database_file_internal(file_path, master_password)
+        def open_and_index():
+            # En el hilo de trabajo: nunca debe tocar widgets.
+            vault = Vault.open(file_path, master_password)
+            return vault, build_indexes(vault.groups)
 
-        if loaded_data is not None:
-            self.all_entries_data = loaded_data
-            self.current_file_path = file_path
-            self.master_key = derived_key_b64
-            self.current_salt = salt
-            self.fernet_cipher = Fernet(self.master_key)
+        def on_loaded(result):
+            self.vault, (self.search_index, self.sort_indexes, self.reuse_index) = result
+            self._set_unsaved(False)
+            self._start_session()
             self.populate_group_tree()
             messagebox.showinfo("Base de Datos", "Base de datos abierta exitosamente.")
-        else:
-            pass
 
-    def save_database(self, save_as=False):
-        if not self.master_key or not self.fernet_cipher:
+        def on_error(error):
+            if isinstance(error, WrongPasswordError):
+                messagebox.showerror("Contraseña Incorrecta", str(error))
+            elif isinstance(error, DecryptionError):
+                messagebox.showerror("Error de Desencriptación", str(error))
+            elif isinstance(error, VaultError):
+                messagebox.showerror("Error de Carga", str(error))
+            else:
+                messagebox.showerror("Error de Carga", f"No se pudo abrir la base de datos: {error}")
+
+        self._run_in_background("Abriendo base de datos...", open_and_index, (), on_loaded, on_error)
+
+    def save_database(self, save_as=False, on_done=None):
+        if not self.vault.key:
             messagebox.showwarning("Guardar Base de Datos", "No hay una base de datos abierta o una contraseña maestra establecida.")
+            if on_done:
+                on_done()
             return
 
-        file_path = self.current_file_path
+        file_path = self.vault.path
         if save_as or not file_path:
             file_path = filedialog.asksaveasfilename(
                 defaultextension=".bastion",
@@ -801,26 +1179,604 @@ class BastionPasswordManager:
             )
             if not file_path:
                 messagebox.showwarning("Guardar Base de Datos", "Operación de guardar cancelada.")
+                if on_done:
+                    on_done()
                 return
 
-        success = self._save_database_file_internal(file_path, self.all_entries_data, self.master_key, self.current_salt)
+        self._finish_autosave()
+        job, finish, abort = self._prepare_save(file_path)
+
+        def on_saved(result):
+            skipped = finish(result)
+            messagebox.showinfo("Guardar Base de Datos", "No había cambios que guardar." if skipped else "Base de datos guardada exitosamente.")
+            if on_done:
+                on_done()
+
+        def on_error(error):
+            abort()
+            messagebox.showerror("Error de Guardado", str(error) if isinstance(error, VaultError) else f"No se pudo guardar la base de datos: {error}")
+            if on_done:
+                on_done()
+
+        started = self._run_in_background("Guardando base de datos...", job, (), on_saved, on_error)
+        if not started:
+            abort()
+            if on_done:
+                on_done()
+
+    def _prepare_save(self, file_path):
+        # En el hilo de Tk. La escritura (`job`) parte de una instantánea, así
+        # que se puede seguir editando mientras el hilo de trabajo escribe.
+        generation = self._edit_generation
+        job, finish_save, abort = self.vault.prepare_save(file_path)
+
+        def finish(result):
+            skipped = finish_save(result)
+            if self._edit_generation == generation:
+                self._set_unsaved(False)
+            return skipped
+
+        return job, finish, abort
+
+    def _set_unsaved(self, unsaved):
+        self.unsaved_changes = unsaved
+        self.root.title("Bastión *" if unsaved else "Bastión")
+
+    def _mark_dirty(self):
+        self._edit_generation += 1
+        if not self.unsaved_changes:
+            self._first_unsaved_edit = time.monotonic()
+            self._set_unsaved(True)
+        self._schedule_autosave()
+
+    def _schedule_autosave(self, delay_ms=None):
+        if self._autosave_after_id is not None:
+            self.root.after_cancel(self._autosave_after_id)
+        if delay_ms is None:
+            # Agrupa las ráfagas de cambios, pero sin posponer indefinidamente.
+            waited_ms = int((time.monotonic() - self._first_unsaved_edit) * 1000)
+            delay_ms = max(0, min(self.AUTOSAVE_DELAY_MS, self.AUTOSAVE_MAX_DELAY_MS - waited_ms))
+        self._autosave_after_id = self.root.after(delay_ms, self._autosave)
+
+    def _autosave(self):
+        self._autosave_after_id = None
+        if not self.unsaved_changes or not self.vault.path:
+            return
+        if self.locked or not self.vault.key or self._background_job is not None or self._autosave_job is not None:
+            self._schedule_autosave(self.AUTOSAVE_DELAY_MS)
+            return
 
-        if success:
-            self.current_file_path = file_path
-            messagebox.showinfo("Guardar Base de Datos", "Base de datos guardada exitosamente.")
+        job, finish, abort = self._prepare_save(self.vault.path)
+        self._autosave_job = (self._submit(job), finish, abort)
+        self.root.after(self.WORKER_POLL_MS, self._poll_autosave)
+
+    def _poll_autosave(self):
+        if self._autosave_job is None:
+            return
+        if not self._autosave_job[0].done():
+            self.root.after(self.WORKER_POLL_MS, self._poll_autosave)
+            return
+        self._finish_autosave()
+
+    def _finish_autosave(self):
+        # Espera (si hace falta) al guardado automático en curso y aplica su
+        # resultado antes de tomar otra instantánea o tocar el archivo.
+        if self._autosave_job is None:
+            return
+        future, finish, abort = self._autosave_job
+        self._autosave_job = None
+
+        error = future.exception()
+        if error is None:
+            skipped = finish(future.result())
+            if not skipped and self._background_job is None:
+                self.details_label.config(text="Cambios guardados automáticamente.")
         else:
-            pass
+            abort()
+            if self._background_job is None:
+                self.details_label.config(text=f"Error en el guardado automático: {error}")
+        if self.unsaved_changes:
+            self._schedule_autosave(self.AUTOSAVE_DELAY_MS)
 
     def _reset_app_state(self):
-        self.master_key = None
-        self.fernet_cipher = None
-        self.current_salt = None
-        self.current_file_path = None
-        self.all_entries_data = {}
+        self._finish_autosave()
+        self.vault = Vault()
+        self.audit_cache = None
+        self._set_unsaved(False)
+        self.vault_session = None
+        self.locked = False
+        self._locked_key_check = None
+        self._refresh_action_states()
+        self._rebuild_indexes()
         self.populate_group_tree()
 
+    def _start_session(self):
+        self.vault_session = VaultSession()
+        self.locked = False
+        self._locked_key_check = None
+        self._last_activity = time.monotonic()
+        self._refresh_action_states()
+
+    def _ensure_unlocked(self):
+        # Ninguna modificación debe llegar a una bóveda bloqueada, aunque se
+        # pida desde una ventana o un atajo de teclado que siguiera activo.
+        if self.locked:
+            messagebox.showwarning("Base de Datos Bloqueada", "Desbloquee la base de datos para modificarla.")
+            return False
+        return True
+
+    def _register_activity(self, event=None):
+        self._last_activity = time.monotonic()
+
+    def _check_idle_lock(self):
+        if (self.idle_lock_seconds and self.vault.key and not self.locked and self._background_job is None
+                and time.monotonic() - self._last_activity > self.idle_lock_seconds):
+            self.lock_database(prompt=False)
+        self.root.after(self.IDLE_CHECK_MS, self._check_idle_lock)
+
+    def _clear_group_tree(self):
+        children = self.group_tree.get_children()
+        if children:
+            self.group_tree.delete(*children)
+        self.group_item_ids = {}
+        self.group_item_nodes = {}
+
+    def lock_database(self, prompt=True):
+        if not self.vault.key or self.locked:
+            return
+        if self._background_job is not None:
+            messagebox.showwarning("Bloquear", "Espere a que termine la operación en curso antes de bloquear.")
+            return
+
+        # Solo queda en memoria la clave envuelta con el PIN (si existe) y un
+        # valor de comprobación para validar la contraseña maestra al volver.
+        # Las ventanas secundarias (formulario de entrada, generador, informes)
+        # pueden mostrar contraseñas o modificar la bóveda: se cierran todas.
+        for window in self.root.winfo_children():
+            if isinstance(window, tk.Toplevel):
+                window.destroy()
+
+        self._locked_key_check = key_check_value(self.vault.key)
+        self.vault.set_key(None)
+        self.locked = True
+
+        self.search_entry.delete(0, tk.END)
+        self._clear_group_tree()
+        self.entry_list.set_rows([])
+        self._refresh_action_states()
+        self.update_status_bar(None)
+
+        if prompt:
+            self.root.after_idle(self.unlock_database)
+
+    def unlock_database(self):
+        if not self.locked:
+            return
+
+        session = self.vault_session
+        if session is not None and session.quick_unlock_enabled:
+            dialog = MasterPasswordDialog(self.root, "Desbloquear Base de Datos",
+                                          "Introduzca su PIN de desbloqueo rápido:", verify_mode=True)
+            pin = dialog.result_password
+            if not pin:
+                return
+            try:
+                master_key_b64 = session.unlock(pin)
+            except SessionExpiredError as e:
+                messagebox.showwarning("Desbloqueo Rápido", str(e))
+                self._unlock_with_master_password()
+                return
+            except QuickUnlockError as e:
+                messagebox.showerror("Desbloqueo Rápido", str(e))
+                self.root.after_idle(self.unlock_database)
+                return
+            self._restore_unlocked(master_key_b64)
+        else:
+            self._unlock_with_master_password()
+
+    def _unlock_with_master_password(self):
+        dialog = MasterPasswordDialog(self.root, "Desbloquear Base de Datos",
+                                      "Introduzca la contraseña maestra para desbloquear la base de datos:", verify_mode=True)
+        master_password = dialog.result_password
+        if not master_password:
+            return
+
+        def on_key_derived(derived_key_b64):
+            if key_check_value(derived_key_b64) != self._locked_key_check:
+                messagebox.showerror("Contraseña Incorrecta", "Contraseña maestra incorrecta.")
+                return
+            self._restore_unlocked(derived_key_b64)
+            self._start_session()
+
+        def on_error(error):
+            messagebox.showerror("Error", f"No se pudo desbloquear la base de datos: {error}")
+
+        self._run_in_background("Desbloqueando base de datos...", self.vault.derive_key, (master_password,),
+                                on_key_derived, on_error)
+
+    def _restore_unlocked(self, master_key_b64):
+        self.vault.set_key(master_key_b64)
+        self.locked = False
+        self._locked_key_check = None
+        self._last_activity = time.monotonic()
+        self._refresh_action_states()
+        self.populate_group_tree()
+
+    def open_import_window(self):
+        if not self.vault.key:
+            messagebox.showwarning("Advertencia", "Por favor, cree o abra una base de datos primero.")
+            return
+
+        file_path = filedialog.askopenfilename(
+            filetypes=[("CSV o KeePass XML", "*.csv *.xml"), ("CSV", "*.csv"), ("KeePass XML (2.x)", "*.xml"), ("All Files", "*.*")]
+        )
+        if not file_path:
+            return
+
+        # Los módulos de cada ventana se importan al abrirla, no al arrancar.
+        from bastion.importers import DEFAULT_DUPLICATE_POLICY, detect_format
+
+        import_win = tk.Toplevel(self.root)
+        import_win.title("Importar Entradas")
+        import_win.geometry("420x280")
+        import_win.transient(self.root)
+        import_win.grab_set()
+
+        main_frame = ttk.Frame(import_win, padding="15")
+        main_frame.pack(expand=True, fill="both")
+        main_frame.grid_columnconfigure(1, weight=1)
+
+        ttk.Label(main_frame, text=f"Archivo: {os.path.basename(file_path)}").grid(row=0, column=0, columnspan=2, sticky="w", pady=5)
+
+        format_labels = {"csv": "CSV", "keepass": "KeePass XML (2.x)"}
+        format_var = tk.StringVar(value=format_labels[detect_format(file_path)])
+        ttk.Label(main_frame, text="Formato:").grid(row=1, column=0, sticky="w", pady=5)
+        ttk.Combobox(main_frame, textvariable=format_var, values=list(format_labels.values()), state="readonly", width=20).grid(row=1, column=1, sticky="w", pady=5)
+
+        # Las rutas de grupo del archivo se crean dentro del grupo seleccionado.
+        base_path = "" if self.get_selected_group() is None else self.get_selected_group_full_path()
+        ttk.Label(main_frame, text="Grupo destino:").grid(row=2, column=0, sticky="w", pady=5)
+        ttk.Label(main_frame, text=base_path or "Database").grid(row=2, column=1, sticky="w", pady=5)
+
+        duplicates_var = tk.StringVar(value=DEFAULT_DUPLICATE_POLICY)
+        ttk.Label(main_frame, text="Duplicadas:").grid(row=3, column=0, sticky="nw", pady=5)
+        duplicates_frame = ttk.Frame(main_frame)
+        duplicates_frame.grid(row=3, column=1, sticky="w", pady=5)
+        for policy, label in (("skip", "Omitirlas"), ("update", "Actualizar las existentes"), ("keep", "Importarlas igualmente")):
+            ttk.Radiobutton(duplicates_frame, text=label, variable=duplicates_var, value=policy).pack(anchor="w")
+        ttk.Label(main_frame, text="Duplicada: mismo UUID, o mismo título, usuario y URL.", font=("Arial", 8)).grid(row=4, column=0, columnspan=2, sticky="w")
+
+        def start_import():
+            file_format = next(key for key, label in format_labels.items() if label == format_var.get())
+            import_win.destroy()
+            self._start_import(file_path, file_format, duplicates_var.get(), base_path)
+
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=5, column=0, columnspan=2, pady=10)
+        ttk.Button(button_frame, text="Importar", command=start_import).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Cancelar", command=import_win.destroy).pack(side="left", padx=5)
+
+        self.root.wait_window(import_win)
+
+    def _start_import(self, file_path, file_format, duplicates, base_path):
+        if not self._ensure_unlocked():
+            return
+        # La detección de duplicados necesita todos los grupos desencriptados.
+        if not self._ensure_groups_loaded(self.vault.groups.unloaded_groups()):
+            return
+
+        import queue
+        from concurrent.futures import Future
+        from bastion.importers import EntryImporter, read_import_batches
+
+        importer = EntryImporter(self.vault.groups, duplicates, base_path)
+        batches = queue.Queue(maxsize=self.IMPORT_QUEUE_BATCHES)
+        inserted = Future()
+
+        def put(item):
+            # Espera a que haya sitio, salvo que la inserción ya haya terminado
+            # (p. ej. por un error): entonces nadie va a vaciar la cola.
+            while not inserted.done():
+                try:
+                    batches.put(item, timeout=self.WORKER_POLL_MS / 1000)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def read_file():
+            # En el hilo de trabajo solo se lee y se convierte el archivo; las
+            # entradas se insertan en el hilo de Tk (_insert_import_batches),
+            # y este hilo espera a que termine para dar la operación por acabada.
+            try:
+                for batch in read_import_batches(file_path, file_format):
+                    if not put(batch):
+                        break
+            except Exception as error:
+                put(error)
+            else:
+                put(None)
+            return inserted.result()
+
+        selected_group = self.get_selected_group()
+
+        def refresh_views():
+            # Una sola vez, al final: árbol de grupos y lista de entradas.
+            if importer.added or importer.updated:
+                self._mark_dirty()
+            self.populate_group_tree()
+            if selected_group is not None:
+                self._select_group(selected_group)
+
+        def on_imported(summary):
+            refresh_views()
+            messagebox.showinfo("Importar", summary)
+
+        def on_error(error):
+            refresh_views()
+            detail = str(error) if isinstance(error, VaultError) else f"No se pudo importar el archivo: {error}"
+            messagebox.showerror("Error de Importación", f"{detail}\n\nAntes del error: {importer.summary()}")
+
+        if self._run_in_background("Importando entradas...", read_file, (), on_imported, on_error):
+            self.root.after(self.WORKER_POLL_MS, self._insert_import_batches, importer, batches, inserted)
+
+    @traced
+    def _insert_import_batches(self, importer, batches, inserted):
+        # Inserta los lotes ya leídos durante IMPORT_TICK_MS como mucho y cede
+        # el control a Tk, para que la ventana siga respondiendo.
+        import queue
+
+        deadline = time.perf_counter() + self.IMPORT_TICK_MS / 1000
+        try:
+            while time.perf_counter() < deadline:
+                try:
+                    item = batches.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    inserted.set_result(importer.summary())
+                    return
+                if isinstance(item, Exception):
+                    inserted.set_exception(item)
+                    return
+
+                batch, fraction = item
+                for group_path, entry in batch:
+                    result = importer.add(group_path, entry)
+                    if result is not None:
+                        group, new_entry, old_entry = result
+                        if old_entry is not None:
+                            self._unindex_entry(old_entry)
+                        self._index_entry(new_entry, group)
+                self._show_progress(f"Importando entradas... {len(importer.added) + len(importer.updated)}", fraction)
+        except Exception as error:
+            inserted.set_exception(error)
+            return
+        self.root.after(self.WORKER_POLL_MS, self._insert_import_batches, importer, batches, inserted)
+
+    def open_export_window(self):
+        if not self.vault.key:
+            messagebox.showwarning("Advertencia", "Por favor, cree o abra una base de datos primero.")
+            return
+
+        # Se exporta el grupo seleccionado con sus subgrupos, o todo desde "Database".
+        selected_group = self.get_selected_group()
+        group_full_path = self.get_selected_group_full_path() if selected_group is not None else "Database"
+
+        from bastion.exporters import ENCRYPTED_EXPORT_EXTENSION, EXPORT_EXTENSIONS
+
+        export_win = tk.Toplevel(self.root)
+        export_win.title("Exportar Entradas")
+        export_win.geometry("420x230")
+        export_win.transient(self.root)
+        export_win.grab_set()
+
+        main_frame = ttk.Frame(export_win, padding="15")
+        main_frame.pack(expand=True, fill="both")
+        main_frame.grid_columnconfigure(1, weight=1)
+
+        ttk.Label(main_frame, text="Grupo:").grid(row=0, column=0, sticky="w", pady=5)
+        ttk.Label(main_frame, text=group_full_path).grid(row=0, column=1, sticky="w", pady=5)
+
+        format_labels = {"csv": "CSV", "ndjson": "JSON por líneas (NDJSON)", "keepass": "KeePass XML (2.x)", "json": "JSON"}
+        format_var = tk.StringVar(value=format_labels["csv"])
+        ttk.Label(main_frame, text="Formato:").grid(row=1, column=0, sticky="w", pady=5)
+        ttk.Combobox(main_frame, textvariable=format_var, values=list(format_labels.values()), state="readonly", width=25).grid(row=1, column=1, sticky="w", pady=5)
+
+        encrypt_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(main_frame, text="Encriptar con una contraseña propia", variable=encrypt_var).grid(row=2, column=0, columnspan=2, sticky="w", pady=5)
+        ttk.Label(main_frame, text="Sin encriptar, el archivo contiene las contraseñas en claro.", font=("Arial", 8)).grid(row=3, column=0, columnspan=2, sticky="w")
+
+        def start_export():
+            file_format = next(key for key, label in format_labels.items() if label == format_var.get())
+            encrypt = encrypt_var.get()
+            extension = ENCRYPTED_EXPORT_EXTENSION if encrypt else EXPORT_EXTENSIONS[file_format]
+            file_path = filedialog.asksaveasfilename(
+                parent=export_win,
+                defaultextension=extension,
+                filetypes=[(format_labels[file_format], f"*{extension}"), ("All Files", "*.*")]
+            )
+            if not file_path:
+                return
+
+            password = None
+            if encrypt:
+                dialog = MasterPasswordDialog(export_win, "Contraseña de la Exportación",
+                                              "Introduzca la contraseña con la que se encriptará la exportación:")
+                password = dialog.result_password
+                if not password:
+                    return
+            elif not messagebox.askyesno("Exportación sin Encriptar", "El archivo exportado no estará encriptado y cualquiera que acceda a él podrá ver sus contraseñas. ¿Continuar?", parent=export_win):
+                return
+
+            export_win.destroy()
+            self._start_export(selected_group, file_path, file_format, password)
+
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=4, column=0, columnspan=2, pady=10)
+        ttk.Button(button_frame, text="Exportar", command=start_export).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Cancelar", command=export_win.destroy).pack(side="left", padx=5)
+
+        self.root.wait_window(export_win)
+
+    def _start_export(self, group, file_path, file_format, password):
+        # Los grupos sin cargar se desencriptan en el hilo de trabajo solo
+        # para escribirlos; la bóveda abierta no crece.
+        from bastion.exporters import export_source, export_to_file
+
+        try:
+            source = export_source(self.vault, group)
+        except VaultError as e:
+            messagebox.showerror("Error de Exportación", str(e))
+            return
+
+        progress = {"fraction": 0.0}
+
+        def set_progress(fraction):
+            # En el hilo de trabajo: solo se anota; Tk lo lee al sondear.
+            progress["fraction"] = fraction
+
+        def on_exported(count):
+            messagebox.showinfo("Exportar", f"{count} entradas exportadas a '{os.path.basename(file_path)}'.")
+
+        def on_error(error):
+            messagebox.showerror("Error de Exportación", str(error) if isinstance(error, VaultError) else f"No se pudo exportar: {error}")
+
+        self._run_in_background("Exportando entradas...", export_to_file, (source, file_path, file_format, password, set_progress),
+                                on_exported, on_error,
+                                progress=lambda: (f"Exportando entradas... {progress['fraction']:.0%}", progress["fraction"]))
+
+    def open_file_format_settings_window(self):
+        if not self.vault.key:
+            messagebox.showwarning("Advertencia", "Por favor, cree o abra una base de datos primero.")
+            return
+
+        settings_win = tk.Toplevel(self.root)
+        settings_win.title("Formato del Archivo")
+        settings_win.geometry("380x230")
+        settings_win.transient(self.root)
+        settings_win.grab_set()
+
+        main_frame = ttk.Frame(settings_win, padding="15")
+        main_frame.pack(expand=True, fill="both")
+        main_frame.grid_columnconfigure(1, weight=1)
+
+        algorithm_var = tk.StringVar(value=self.vault.compression["algorithm"])
+        ttk.Label(main_frame, text="Algoritmo:").grid(row=0, column=0, sticky="w", pady=5)
+        ttk.Combobox(main_frame, textvariable=algorithm_var, values=COMPRESSION_ALGORITHMS, state="readonly", width=10).grid(row=0, column=1, sticky="w", pady=5)
+
+        level_var = tk.IntVar(value=self.vault.compression["level"])
+        ttk.Label(main_frame, text="Nivel (0-9):").grid(row=1, column=0, sticky="w", pady=5)
+        ttk.Spinbox(main_frame, from_=COMPRESSION_LEVELS.start, to=COMPRESSION_LEVELS.stop - 1, textvariable=level_var, width=5).grid(row=1, column=1, sticky="w", pady=5)
+
+        record_format_var = tk.StringVar(value=self.vault.record_format)
+        ttk.Label(main_frame, text="Registros:").grid(row=2, column=0, sticky="w", pady=5)
+        ttk.Combobox(main_frame, textvariable=record_format_var, values=RECORD_FORMATS, state="readonly", width=10).grid(row=2, column=1, sticky="w", pady=5)
+
+        ttk.Label(main_frame, text="Se aplica a los datos que se guarden a partir de ahora.", font=("Arial", 8)).grid(row=3, column=0, columnspan=2, sticky="w")
+
+        def save_settings():
+            try:
+                level = int(level_var.get())
+            except (tk.TclError, ValueError):
+                level = -1
+            if level not in COMPRESSION_LEVELS:
+                messagebox.showerror("Error", "El nivel debe estar entre 0 y 9.", parent=settings_win)
+                return
+
+            if not self._ensure_unlocked():
+                return
+            compression = {"algorithm": algorithm_var.get(), "level": level}
+            if self.vault.set_file_format(compression, record_format_var.get()):
+                self._mark_dirty()
+            settings_win.destroy()
+
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=4, column=0, columnspan=2, pady=10)
+        ttk.Button(button_frame, text="Guardar", command=save_settings).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Cancelar", command=settings_win.destroy).pack(side="left", padx=5)
+
+        self.root.wait_window(settings_win)
+
+    def open_quick_unlock_settings_window(self):
+        if not self.vault.key or self.vault_session is None:
+            messagebox.showwarning("Advertencia", "Por favor, cree o abra una base de datos primero.")
+            return
+
+        settings_win = tk.Toplevel(self.root)
+        settings_win.title("Desbloqueo Rápido")
+        settings_win.geometry("380x300")
+        settings_win.transient(self.root)
+        settings_win.grab_set()
+
+        main_frame = ttk.Frame(settings_win, padding="15")
+        main_frame.pack(expand=True, fill="both")
+        main_frame.grid_columnconfigure(1, weight=1)
+
+        ttk.Label(main_frame, text="PIN:").grid(row=0, column=0, sticky="w", pady=5)
+        pin_entry = ttk.Entry(main_frame, show="*", width=20)
+        pin_entry.grid(row=0, column=1, sticky="ew", pady=5)
+
+        ttk.Label(main_frame, text="Repetir PIN:").grid(row=1, column=0, sticky="w", pady=5)
+        confirm_pin_entry = ttk.Entry(main_frame, show="*", width=20)
+        confirm_pin_entry.grid(row=1, column=1, sticky="ew", pady=5)
+
+        idle_minutes_var = tk.IntVar(value=(self.idle_lock_seconds or 0) // 60)
+        ttk.Label(main_frame, text="Bloquear tras inactividad (min, 0 = nunca):").grid(row=2, column=0, sticky="w", pady=5)
+        ttk.Spinbox(main_frame, from_=0, to=240, textvariable=idle_minutes_var, width=5).grid(row=2, column=1, sticky="w", pady=5)
+
+        max_failures_var = tk.IntVar(value=self.vault_session.max_failures or DEFAULT_MAX_FAILURES)
+        ttk.Label(main_frame, text="Intentos de PIN permitidos:").grid(row=3, column=0, sticky="w", pady=5)
+        ttk.Spinbox(main_frame, from_=1, to=10, textvariable=max_failures_var, width=5).grid(row=3, column=1, sticky="w", pady=5)
+
+        max_age_hours_var = tk.IntVar(value=int(self.vault_session.max_age_seconds or DEFAULT_MAX_AGE_SECONDS) // 3600)
+        ttk.Label(main_frame, text="Duración máxima de la sesión (h):").grid(row=4, column=0, sticky="w", pady=5)
+        ttk.Spinbox(main_frame, from_=1, to=72, textvariable=max_age_hours_var, width=5).grid(row=4, column=1, sticky="w", pady=5)
+
+        def save_settings():
+            pin = pin_entry.get()
+            if pin != confirm_pin_entry.get():
+                messagebox.showerror("Error", "Los PIN no coinciden.", parent=settings_win)
+                return
+            try:
+                idle_minutes = int(idle_minutes_var.get())
+                max_failures = int(max_failures_var.get())
+                max_age_hours = int(max_age_hours_var.get())
+            except (tk.TclError, ValueError):
+                messagebox.showerror("Error", "Valores numéricos no válidos.", parent=settings_win)
+                return
+
+            # Sin PIN solo se guardan el bloqueo por inactividad y la duración de la sesión.
+            if pin:
+                try:
+                    self.vault_session.enable_quick_unlock(self.vault.key, pin, max_failures=max(1, max_failures))
+                except QuickUnlockError as e:
+                    messagebox.showwarning("Advertencia", str(e), parent=settings_win)
+                    return
+
+            self.vault_session.max_age_seconds = max(1, max_age_hours) * 3600
+            self.idle_lock_seconds = idle_minutes * 60 if idle_minutes > 0 else None
+            message = "Desbloqueo rápido activado." if pin else "Configuración guardada."
+            messagebox.showinfo("Desbloqueo Rápido", message, parent=settings_win)
+            settings_win.destroy()
+
+        def disable_quick_unlock():
+            self.vault_session.disable_quick_unlock()
+            messagebox.showinfo("Desbloqueo Rápido", "Desbloqueo rápido desactivado.", parent=settings_win)
+            settings_win.destroy()
+
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=5, column=0, columnspan=2, pady=10)
+        ttk.Button(button_frame, text="Guardar", command=save_settings).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Desactivar", command=disable_quick_unlock).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Cancelar", command=settings_win.destroy).pack(side="left", padx=5)
+
+        ttk.Label(main_frame, text=f"El PIN debe tener al menos {MIN_PIN_LENGTH} caracteres.", font=("Arial", 8)).grid(row=6, column=0, columnspan=2, sticky="w")
+
+        self.root.wait_window(settings_win)
+
     def open_add_group_window(self):
-        if not self.master_key:
+        if not self.vault.key:
             messagebox.showwarning("Advertencia", "Por favor, cree o abra una base de datos primero.")
             return
 
@@ -849,17 +1805,20 @@ class BastionPasswordManager:
             else:
                 new_group_full_path = f"{parent_group_full_path}/{new_group_name}"
 
-            if new_group_full_path in self.all_entries_data:
+            if new_group_full_path in self.vault.groups:
                 messagebox.showerror("Error", "Ya existe un grupo con esta ruta.")
                 return
+            if not self._ensure_unlocked():
+                return
 
-            self.all_entries_data[new_group_full_path] = []
+            new_group = self.vault.groups.add_group(new_group_full_path)
+            self._mark_dirty()
             messagebox.showinfo("Éxito", f"Grupo '{new_group_full_path}' añadido.")
             add_group_win.destroy()
 
-            self.populate_group_tree()
+            self._tree_insert_group(new_group)
 
-            self._select_group_by_path(new_group_full_path)
+            self._select_group(new_group)
 
 
         btn_save = ttk.Button(add_group_win, text="Guardar", command=save_group)
@@ -870,20 +1829,19 @@ class BastionPasswordManager:
         self.root.wait_window(add_group_win)
 
     def open_edit_entry_window(self):
-        if not self.master_key:
+        if not self.vault.key:
             messagebox.showwarning("Advertencia", "Por favor, cree o abra una base de datos primero.")
             return
 
         selected_group_ids = self.group_tree.selection()
-        selected_entry_ids = self.entry_tree.selection()
+        selected_entry_ids = self.entry_list.selected_keys()
 
         if selected_group_ids and not selected_entry_ids:
             self._open_edit_group_window(selected_group_ids[0])
         elif selected_entry_ids:
-            item_id = selected_entry_ids[0]
-            entry_data = self.entries_data_store.get(item_id)
+            _, entry_data = self.vault.groups.find_entry(selected_entry_ids[0])
             if entry_data:
-                self.create_entry_form_window("Editar Entrada", entry_data, item_id)
+                self.create_entry_form_window("Editar Entrada", entry_data, selected_entry_ids[0])
             else:
                 messagebox.showerror("Error", "No se encontraron datos para la entrada seleccionada.")
         else:
@@ -926,21 +1884,16 @@ class BastionPasswordManager:
             else:
                 new_full_path = new_base_name
 
-            parent_id_in_tree = self.group_tree.parent(group_id_to_edit)
-            existing_sibling_names = set()
-            for child_id in self.group_tree.get_children(parent_id_in_tree):
-                if child_id != group_id_to_edit:
-                    existing_sibling_names.add(self.group_tree.item(child_id, "text"))
-
-            if new_base_name in existing_sibling_names:
-                messagebox.showerror("Error", "Ya existe un grupo con este nombre en el mismo nivel.")
+            try:
+                renamed_group = self._remap_group_paths_in_data(current_group_full_path, new_full_path, is_rename_op=True)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
                 return
 
-            self._remap_group_paths_in_data(current_group_full_path, new_full_path, is_rename_op=True)
+            self._mark_dirty()
             messagebox.showinfo("Éxito", f"Grupo renombrado a '{new_base_name}'.")
             edit_group_win.destroy()
-            self.populate_group_tree()
-            self._select_group_by_path(new_full_path)
+            self._select_group(renamed_group)
 
 
         btn_save = ttk.Button(edit_group_win, text="Guardar", command=save_rename)
@@ -952,23 +1905,15 @@ class BastionPasswordManager:
 
 
     def _select_group_by_path(self, full_path):
-        def find_item_id_recursive(current_tree_id, target_parts, current_part_index):
-            if current_part_index >= len(target_parts):
-                return current_tree_id
-
-            target_name = target_parts[current_part_index]
-            for child_id in self.group_tree.get_children(current_tree_id):
-                if self.group_tree.item(child_id, "text") == target_name:
-                    return find_item_id_recursive(child_id, target_parts, current_part_index + 1)
-            return None
-
         if full_path == "Database":
             self.group_tree.selection_set("")
             self._filter_entries()
             return
 
-        parts = full_path.split('/')
-        found_id = find_item_id_recursive("", parts, 0)
+        self._select_group(self.vault.groups.find(full_path))
+
+    def _select_group(self, group):
+        found_id = self.group_item_ids.get(group) if group is not None else None
         if found_id:
             self.group_tree.selection_set(found_id)
             self.group_tree.focus(found_id)
@@ -980,7 +1925,7 @@ class BastionPasswordManager:
 
 
     def open_add_entry_window(self):
-        if not self.master_key:
+        if not self.vault.key:
             messagebox.showwarning("Advertencia", "Por favor, cree o abra una base de datos primero.")
             return
 
@@ -989,22 +1934,26 @@ class BastionPasswordManager:
             messagebox.showwarning("Añadir Entrada", "Por favor, seleccione un grupo específico (ej. 'eMail/Personal') antes de añadir una entrada.")
             return
 
-        if selected_group_full_path not in self.all_entries_data:
+        if selected_group_full_path not in self.vault.groups:
              messagebox.showwarning("Añadir Entrada", "El grupo seleccionado no es válido para añadir entradas.")
              return
 
         self.create_entry_form_window("Añadir Nueva Entrada")
 
 
+    @traced
     def _on_entry_double_click(self, event):
-        if not self.master_key:
+        if self._background_job is not None:
+            return
+
+        if not self.vault.key:
             messagebox.showwarning("Advertencia", "Por favor, cree o abra una base de datos primero.")
             return
 
-        item_id = self.entry_tree.identify_row(event.y)
+        item_id = self.entry_list.key_at(event.y)
         if item_id:
-            self.entry_tree.selection_set(item_id)
-            entry_data = self.entries_data_store.get(item_id)
+            self.entry_list.select_key(item_id)
+            _, entry_data = self.vault.groups.find_entry(item_id)
             if entry_data:
                 self.create_entry_form_window("Editar Entrada", entry_data, item_id)
             else:
@@ -1014,7 +1963,7 @@ class BastionPasswordManager:
     def create_entry_form_window(self, title, entry_data=None, item_id_to_update=None):
         form_win = tk.Toplevel(self.root)
         form_win.title(title)
-        form_win.geometry("550x450")
+        form_win.geometry("550x480")
         form_win.transient(self.root)
         form_win.grab_set()
 
@@ -1063,6 +2012,46 @@ class BastionPasswordManager:
                     btn_generate_pwd = ttk.Button(button_col_frame, text="Generar", command=lambda: self.generate_password(entries["contraseña"]))
                     btn_generate_pwd.pack(pady=2, fill="x")
 
+        # Aviso en línea si la contraseña escrita ya la usa otra entrada.
+        reuse_warning = ttk.Label(form_frame, text="", foreground="orange", wraplength=420)
+        reuse_warning.grid(row=len(labels), column=1, columnspan=2, sticky="w", padx=5)
+        password_var = tk.StringVar()
+        entries["contraseña"].config(textvariable=password_var)
+
+        # El índice solo incluye los grupos ya desencriptados: el resto se carga
+        # en segundo plano la primera vez que se escribe una contraseña.
+        reuse_check = {"loading": False, "failed": False}
+
+        def on_groups_loaded(loaded):
+            reuse_check["loading"] = False
+            reuse_check["failed"] = not loaded
+            if form_win.winfo_exists():
+                update_reuse_warning()
+
+        def update_reuse_warning(*_):
+            password = password_var.get().strip()
+            unloaded = self.vault.groups.unloaded_groups() if password else []
+            if (unloaded and not reuse_check["loading"] and not reuse_check["failed"]
+                    and self._background_job is None):
+                reuse_check["loading"] = self._load_groups_in_background(unloaded, on_groups_loaded)
+                reuse_check["failed"] = not reuse_check["loading"]
+            if reuse_check["loading"]:
+                reuse_warning.config(text="Comprobando si la contraseña ya se usa...")
+                return
+
+            # Si no se pudieron cargar todos los grupos, el aviso lo indica.
+            note = " (solo se han comprobado los grupos ya abiertos)" if unloaded else ""
+            reused_by = self.reuse_index.keys_using(password, exclude=item_id_to_update)
+            if not reused_by:
+                reuse_warning.config(text="⚠ No se han comprobado los grupos sin abrir." if unloaded else "")
+                return
+            _, other_entry = self.vault.groups.find_entry(next(iter(reused_by)))
+            other_title = other_entry.get("Title", "") if other_entry is not None else ""
+            extra = f" y {len(reused_by) - 1} más" if len(reused_by) > 1 else ""
+            reuse_warning.config(text=f"⚠ Esta contraseña ya se usa en '{other_title}'{extra}{note}.")
+
+        password_var.trace_add("write", update_reuse_warning)
+
         if entry_data:
             entries["título"].insert(0, entry_data.get("Title", ""))
             entries["nombre_de_usuario"].insert(0, entry_data.get("User Name", ""))
@@ -1085,9 +2074,9 @@ class BastionPasswordManager:
                 messagebox.showwarning("Campos Requeridos", "Título y Contraseña son campos obligatorios.")
                 return
 
-            current_time = datetime.datetime.now().strftime("%d/%m/%Y %I:%M:%S %p.").replace("AM", "a.m.").replace("PM", "p.m.")
+            current_time = int(time.time())
 
-            new_entry = {
+            new_entry = Entry({
                 "Title": title_val,
                 "User Name": user_val,
                 "Password": password_val,
@@ -1095,33 +2084,32 @@ class BastionPasswordManager:
                 "Notes": notes_val,
                 "Creation Time": current_time if entry_data is None else entry_data.get("Creation Time", current_time),
                 "Last Modification Time": current_time
-            }
-
-            selected_group_full_path = self.get_selected_group_full_path()
-            if selected_group_full_path == "Database":
-                messagebox.showwarning("Advertencia", "Por favor, seleccione un grupo específico (ej. 'eMail/Personal') para añadir la entrada.")
-                return
+            })
 
-            if selected_group_full_path not in self.all_entries_data:
-                messagebox.showerror("Error", "El grupo seleccionado no existe en los datos. Por favor, intente seleccionar un grupo existente.")
+            if not self._ensure_unlocked():
                 return
 
             if item_id_to_update:
-                if selected_group_full_path in self.all_entries_data:
-                    entry_found = False
-                    for i, entry in enumerate(self.all_entries_data[selected_group_full_path]):
-                        if entry.get("Title") == entry_data.get("Title") and entry.get("User Name") == entry_data.get("User Name"):
-                            self.all_entries_data[selected_group_full_path][i] = new_entry
-                            entry_found = True
-                            break
-                    if not entry_found:
-                        messagebox.showerror("Error", "No se pudo encontrar la entrada original para actualizar.")
-                        return
+                if item_id_to_update not in self.vault.groups.entry_groups:
+                    messagebox.showerror("Error", "No se pudo encontrar la entrada original para actualizar.")
+                    return
+
+                entry_group, old_entry = self.vault.groups.update_entry(item_id_to_update, new_entry)
+                self._unindex_entry(old_entry)
+                self._index_entry(new_entry, entry_group)
+                self._mark_dirty()
 
                 self._filter_entries()
                 messagebox.showinfo("Éxito", "Entrada actualizada exitosamente.")
             else:
-                self.all_entries_data[selected_group_full_path].append(new_entry)
+                selected_group = self.get_selected_group()
+                if selected_group is None:
+                    messagebox.showwarning("Advertencia", "Por favor, seleccione un grupo específico (ej. 'eMail/Personal') para añadir la entrada.")
+                    return
+
+                self.vault.groups.add_entry(selected_group, new_entry)
+                self._index_entry(new_entry, selected_group)
+                self._mark_dirty()
 
                 self._filter_entries()
                 messagebox.showinfo("Éxito", "Nueva entrada añadida exitosamente.")
@@ -1136,8 +2124,7 @@ class BastionPasswordManager:
         self.root.wait_window(form_win)
 
     def generate_password(self, password_entry_widget):
-        characters = string.ascii_letters + string.digits + string.punctuation
-        password = ''.join(random.choice(characters) for i in range(12))
+        password = generate_password(12)
         password_entry_widget.delete(0, tk.END)
         password_entry_widget.insert(0, password)
 
@@ -1147,17 +2134,16 @@ class BastionPasswordManager:
         messagebox.showinfo("Portapapeles", "Copiado al portapapeles.")
 
     def copy_entry_detail(self, detail_key):
-        if not self.master_key:
+        if not self.vault.key:
             messagebox.showwarning("Advertencia", "Por favor, cree o abra una base de datos primero.")
             return
 
-        selected_items = self.entry_tree.selection()
-        if not selected_items:
+        selected_entry_ids = self.entry_list.selected_keys()
+        if not selected_entry_ids:
             messagebox.showwarning("Copiar", "Por favor, seleccione una entrada para copiar.")
             return
 
-        item_id = selected_items[0]
-        entry_data = self.entries_data_store.get(item_id)
+        _, entry_data = self.vault.groups.find_entry(selected_entry_ids[0])
 
         if entry_data and detail_key in entry_data:
             value_to_copy = entry_data[detail_key]
@@ -1166,12 +2152,12 @@ class BastionPasswordManager:
             messagebox.showerror("Error", f"No se pudo copiar el detalle '{detail_key}'.")
 
     def delete_selected(self):
-        if not self.master_key:
+        if not self.vault.key:
             messagebox.showwarning("Advertencia", "Por favor, cree o abra una base de datos primero.")
             return
 
         selected_group_ids = self.group_tree.selection()
-        selected_entry_ids = self.entry_tree.selection()
+        selected_entry_ids = self.entry_list.selected_keys()
 
         if selected_group_ids and not selected_entry_ids:
             self.delete_selected_group(selected_group_ids[0])
@@ -1182,63 +2168,48 @@ class BastionPasswordManager:
 
 
     def delete_selected_group(self, group_id):
+        if not self._ensure_unlocked():
+            return
         group_full_path = self.get_full_tree_item_path(group_id)
+        group = self.group_item_nodes.get(group_id) if group_id else None
 
-        if group_full_path == "Database":
+        if group is None:
             messagebox.showerror("Error", "No se puede eliminar el grupo 'Database' (raíz conceptual).")
             return
 
         if messagebox.askyesno("Confirmar Eliminación de Grupo",
                                f"¿Estás seguro de que quieres eliminar el grupo '{group_full_path}' y todas sus entradas y subgrupos?"):
 
-            paths_to_delete = [
-                path for path in self.all_entries_data.keys()
-                if path == group_full_path or path.startswith(f"{group_full_path}/")
-            ]
+            for removed_group in group.iter_subtree():
+                for entry in removed_group.entries.values():
+                    self._unindex_entry(entry)
 
-            for path in paths_to_delete:
-                if path in self.all_entries_data:
-                    del self.all_entries_data[path]
-
-            self.group_tree.delete(group_id)
+            self.vault.groups.delete_group(group)
+            self._tree_delete_group(group)
+            self._mark_dirty()
 
             messagebox.showinfo("Eliminación Exitosa", f"Grupo '{group_full_path}' y sus contenidos eliminados correctamente.")
 
-            self.populate_group_tree()
-
-            self.update_status_bar(None)
+            self.group_tree.selection_set("")
+            self._filter_entries()
 
 
     def delete_selected_entry(self):
-        selected_items = self.entry_tree.selection()
-        if not selected_items:
+        if not self._ensure_unlocked():
+            return
+        selected_entry_ids = self.entry_list.selected_keys()
+        if not selected_entry_ids:
             messagebox.showwarning("Eliminar Entrada", "Por favor, seleccione una o más entradas para eliminar.")
             return
 
-        if messagebox.askyesno("Confirmar Eliminación de Entrada", f"¿Estás seguro de que quieres eliminar {len(selected_items)} entrada(s) seleccionada(s)?"):
-            selected_group_full_path = self.get_selected_group_full_path()
-            if selected_group_full_path == "Database":
-                 messagebox.showerror("Error", "No se pueden eliminar entradas desde el grupo 'Database' (raíz conceptual). Por favor, seleccione un grupo específico.")
-                 return
+        if messagebox.askyesno("Confirmar Eliminación de Entrada", f"¿Estás seguro de que quieres eliminar {len(selected_entry_ids)} entrada(s) seleccionada(s)?"):
+            for selected_entry_id in selected_entry_ids:
+                if selected_entry_id in self.vault.groups.entry_groups:
+                    _, removed_entry = self.vault.groups.remove_entry(selected_entry_id)
+                    self._unindex_entry(removed_entry)
 
-            if selected_group_full_path not in self.all_entries_data:
-                messagebox.showerror("Error", "Grupo no encontrado en los datos para eliminar entradas.")
-                return
-
-            entries_to_delete_from_store = []
-            for item_id in selected_items:
-                entry_data = self.entries_data_store.get(item_id)
-                if entry_data:
-                    entries_to_delete_from_store.append(entry_data)
-                self.entry_tree.delete(item_id)
-                if item_id in self.entries_data_store:
-                    del self.entries_data_store[item_id]
-
-            if entries_to_delete_from_store:
-                self.all_entries_data[selected_group_full_path] = [
-                    entry for entry in self.all_entries_data[selected_group_full_path]
-                    if entry not in entries_to_delete_from_store
-                ]
+            self.entry_list.remove_keys(selected_entry_ids)
+            self._mark_dirty()
 
             messagebox.showinfo("Eliminación Exitosa", "Entrada(s) eliminada(s) correctamente.")
             self.update_status_bar(None)
@@ -1273,6 +2244,8 @@ class BastionPasswordManager:
             messagebox.showerror("Error", f"No se encontró el archivo de instrucciones:\n{instructions_file_path}")
             return
 
+        import subprocess
+
         try:
             if os.name == 'nt':
                 subprocess.Popen(['start', instructions_file_path], shell=True)
@@ -1313,16 +2286,25 @@ class BastionPasswordManager:
         ttk.Label(main_frame, text="Contraseña Generada:").grid(row=6, column=0, sticky="w", pady=5)
         generated_pwd_entry = ttk.Entry(main_frame, width=30, state="readonly")
         generated_pwd_entry.grid(row=6, column=1, sticky="ew", pady=5)
+        entropy_label = ttk.Label(main_frame, text="")
+        entropy_label.grid(row=8, column=0, columnspan=2, sticky="w")
 
         def generate_and_display():
-            generated_password = self._generate_custom_password(
-                length_var.get(),
-                uppercase_var.get(),
-                lowercase_var.get(),
-                digits_var.get(),
-                symbols_var.get(),
-                exclude_ambiguous_var.get()
-            )
+            try:
+                generator = PasswordGenerator(
+                    length_var.get(),
+                    uppercase_var.get(),
+                    lowercase_var.get(),
+                    digits_var.get(),
+                    symbols_var.get(),
+                    exclude_ambiguous_var.get()
+                )
+                generated_password = generator.generate()
+                entropy_label.config(text=f"Entropía: {generator.entropy_bits:.0f} bits")
+            except (ValueError, tk.TclError) as e:
+                messagebox.showwarning("Advertencia", str(e), parent=gen_win)
+                generated_password = ""
+                entropy_label.config(text="")
             generated_pwd_entry.config(state="normal")
             generated_pwd_entry.delete(0, tk.END)
             generated_pwd_entry.insert(0, generated_password)
@@ -1340,32 +2322,114 @@ class BastionPasswordManager:
 
         gen_win.wait_window(gen_win)
 
-    def _generate_custom_password(self, length, use_uppercase, use_lowercase, use_digits, use_symbols, exclude_ambiguous):
-        characters = ""
-        if use_uppercase:
-            characters += string.ascii_uppercase
-        if use_lowercase:
-            characters += string.ascii_lowercase
-        if use_digits:
-            characters += string.digits
-        if use_symbols:
-            characters += string.punctuation
-
-        if exclude_ambiguous:
-            ambiguous_chars = "ilo0O1"
-            characters = "".join(c for c in characters if c not in ambiguous_chars)
-
-        if not characters:
-            messagebox.showwarning("Advertencia", "Por favor, seleccione al menos un tipo de carácter para generar la contraseña.")
-            return ""
+    def open_provision_entries_window(self):
+        if not self.vault.key:
+            messagebox.showwarning("Advertencia", "Por favor, cree o abra una base de datos primero.")
+            return
+
+        group = self.get_selected_group()
+        if group is None:
+            messagebox.showwarning("Generar Entradas", "Por favor, seleccione un grupo específico en el que generar las entradas.")
+            return
+        if not self._ensure_groups_loaded([group]):
+            return
 
-        password = ''.join(random.choice(characters) for _ in range(length))
-        return password
+        provision_win = tk.Toplevel(self.root)
+        provision_win.title("Generar Entradas")
+        provision_win.geometry("460x420")
+        provision_win.transient(self.root)
+        provision_win.grab_set()
+
+        main_frame = ttk.Frame(provision_win, padding="15")
+        main_frame.pack(expand=True, fill="both")
+        main_frame.grid_columnconfigure(1, weight=1)
+
+        ttk.Label(main_frame, text="Grupo:").grid(row=0, column=0, sticky="w", pady=5)
+        ttk.Label(main_frame, text=group.path).grid(row=0, column=1, sticky="w", pady=5)
+
+        count_var = tk.IntVar(value=10)
+        start_var = tk.IntVar(value=1)
+        length_var = tk.IntVar(value=20)
+        title_var = tk.StringVar(value=DEFAULT_TITLE_PATTERN)
+        user_var = tk.StringVar(value=DEFAULT_USER_PATTERN)
+        url_var = tk.StringVar()
+        fields = (
+            ("Cantidad:", ttk.Spinbox(main_frame, from_=1, to=MAX_PROVISION_ENTRIES, textvariable=count_var, width=8)),
+            ("Primer número:", ttk.Spinbox(main_frame, from_=0, to=10 ** 6, textvariable=start_var, width=8)),
+            ("Título:", ttk.Entry(main_frame, textvariable=title_var, width=30)),
+            ("Usuario:", ttk.Entry(main_frame, textvariable=user_var, width=30)),
+            ("URL:", ttk.Entry(main_frame, textvariable=url_var, width=30)),
+            ("Longitud:", ttk.Spinbox(main_frame, from_=8, to=64, textvariable=length_var, width=8)),
+        )
+        for row, (text, widget) in enumerate(fields, 1):
+            ttk.Label(main_frame, text=text).grid(row=row, column=0, sticky="w", pady=3)
+            widget.grid(row=row, column=1, sticky="w" if isinstance(widget, ttk.Spinbox) else "ew", pady=3)
+        ttk.Label(main_frame, text="{n} se sustituye por el número de cada entrada; {n:03d} lo rellena con ceros.",
+                  font=("Arial", 8)).grid(row=len(fields) + 1, column=0, columnspan=2, sticky="w")
+
+        class_vars = [tk.BooleanVar(value=True) for _ in range(4)]
+        exclude_ambiguous_var = tk.BooleanVar(value=False)
+        options_frame = ttk.Frame(main_frame)
+        options_frame.grid(row=len(fields) + 2, column=0, columnspan=2, sticky="w", pady=5)
+        for column, (text, variable) in enumerate(zip(("A-Z", "a-z", "0-9", "!@#$..."), class_vars)):
+            ttk.Checkbutton(options_frame, text=text, variable=variable).grid(row=0, column=column, sticky="w", padx=(0, 8))
+        ttk.Checkbutton(options_frame, text="Excluir caracteres ambiguos", variable=exclude_ambiguous_var).grid(row=1, column=0, columnspan=4, sticky="w")
+
+        entropy_label = ttk.Label(main_frame, text="")
+        entropy_label.grid(row=len(fields) + 3, column=0, columnspan=2, sticky="w")
+
+        def current_generator():
+            return PasswordGenerator(length_var.get(), *(variable.get() for variable in class_vars), exclude_ambiguous_var.get())
+
+        def update_entropy(*_):
+            try:
+                entropy_label.config(text=f"Entropía por contraseña: {current_generator().entropy_bits:.0f} bits")
+            except (ValueError, tk.TclError) as e:
+                entropy_label.config(text=str(e))
+
+        for variable in (length_var, exclude_ambiguous_var, *class_vars):
+            variable.trace_add("write", update_entropy)
+        update_entropy()
+
+        def provision():
+            try:
+                count = count_var.get()
+                if count > MAX_PROVISION_ENTRIES:
+                    raise ValueError(f"Como máximo se pueden generar {MAX_PROVISION_ENTRIES} entradas de una vez.")
+                new_entries = provision_entries(current_generator(), count, title_var.get(), user_var.get(),
+                                                url_var.get().strip(), start_var.get())
+            except (ValueError, tk.TclError) as e:
+                messagebox.showwarning("Generar Entradas", str(e), parent=provision_win)
+                return
+            provision_win.destroy()
+            self._add_provisioned_entries(group, new_entries)
+
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=len(fields) + 4, column=0, columnspan=2, pady=10)
+        ttk.Button(button_frame, text="Generar", command=provision).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Cancelar", command=provision_win.destroy).pack(side="left", padx=5)
+
+        self.root.wait_window(provision_win)
+
+    @traced
+    def _add_provisioned_entries(self, group, new_entries):
+        if not self._ensure_unlocked():
+            return
+        if group not in self.group_item_ids:
+            messagebox.showerror("Generar Entradas", "El grupo ya no existe.")
+            return
+        for new_entry in new_entries:
+            self._index_entry(self.vault.groups.add_entry(group, new_entry), group)
+        self._mark_dirty()
+        self._select_group(group)
+        messagebox.showinfo("Generar Entradas", f"{len(new_entries)} entradas generadas en '{group.path}'.")
 
     def _open_password_strength_checker(self):
+        from bastion.strength import STRENGTH_LABELS, StrengthEstimator, describe_patterns
+
         strength_win = tk.Toplevel(self.root)
         strength_win.title("Comprobador de Fortaleza de Contraseñas")
-        strength_win.geometry("400x200")
+        strength_win.geometry("400x240")
         strength_win.transient(self.root)
         strength_win.grab_set()
 
@@ -1378,11 +2442,18 @@ class BastionPasswordManager:
 
         strength_label = ttk.Label(main_frame, text="Fortaleza: ", font=("Arial", 10, "bold"))
         strength_label.pack(pady=10)
+        patterns_label = ttk.Label(main_frame, text="", wraplength=360, justify=tk.CENTER)
+        patterns_label.pack()
+
+        # Se reutiliza entre pulsaciones: solo analiza lo escrito o borrado al final.
+        estimator = StrengthEstimator()
 
         def update_strength(event=None):
-            password = password_entry.get()
-            strength = self._check_password_strength(password)
+            estimate = estimator.estimate(password_entry.get())
+            strength = STRENGTH_LABELS[estimate.score]
             strength_label.config(text=f"Fortaleza: {strength}")
+            patterns = describe_patterns(estimate)
+            patterns_label.config(text=f"Fácil de adivinar: {patterns}" if patterns else "")
             if strength == "Muy Débil" or strength == "Débil":
                 strength_label.config(foreground="red")
             elif strength == "Moderada":
@@ -1394,36 +2465,145 @@ class BastionPasswordManager:
 
         strength_win.wait_window(strength_win)
 
-    def _check_password_strength(self, password):
-        length = len(password)
-        score = 0
-
-        if length >= 8:
-            score += 1
-        if length >= 12:
-            score += 1
-        if length >= 16:
-            score += 1
-
-        if re.search(r"[A-Z]", password):
-            score += 1
-        if re.search(r"[a-z]", password):
-            score += 1
-        if re.search(r"\d", password):
-            score += 1
-        if re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
-            score += 1
-
-        if score < 3:
-            return "Muy Débil"
-        elif score == 3:
-            return "Débil"
-        elif score == 4:
-            return "Moderada"
-        elif score == 5:
-            return "Fuerte"
+    def start_password_audit(self):
+        if not self.vault.key:
+            messagebox.showwarning("Advertencia", "Por favor, cree o abra una base de datos primero.")
+            return
+        if not self._ensure_groups_loaded(self.vault.groups.unloaded_groups()):
+            return
+
+        from bastion.audit import AuditCache, audit_snapshot, run_audit
+
+        if self.audit_cache is None:
+            self.audit_cache = AuditCache()
+        snapshot = audit_snapshot(self.vault.groups)
+        progress = {"fraction": 0.0}
+
+        def set_progress(fraction):
+            progress["fraction"] = fraction
+
+        def on_error(error):
+            messagebox.showerror("Auditoría de Contraseñas", f"No se pudo completar la auditoría: {error}")
+
+        self._run_in_background("Auditando contraseñas...", run_audit, (snapshot, self.audit_cache, None, set_progress),
+                                self._show_audit_report, on_error,
+                                progress=lambda: (f"Auditando contraseñas... {progress['fraction']:.0%}", progress["fraction"]))
+
+    def _show_audit_report(self, report):
+        # Ventana no modal: se puede seguir usando la principal y saltar a
+        # cada entrada con doble clic.
+        from bastion.audit import STALE_AFTER_DAYS
+
+        report_win = tk.Toplevel(self.root)
+        report_win.title("Auditoría de Contraseñas")
+        report_win.geometry("780x440")
+        report_win.transient(self.root)
+
+        weak_counts = [sum(1 for row in report.rows if row.score == score) for score in (0, 1)]
+        stale_count = sum(1 for row in report.rows if row.unchanged_days is not None and row.unchanged_days >= STALE_AFTER_DAYS)
+        summary = (f"{report.total} entradas revisadas ({report.scored} contraseñas puntuadas; el resto, ya conocidas). "
+                   f"Muy débiles: {weak_counts[0]}. Débiles: {weak_counts[1]}. Sin cambiar desde su creación hace más de {STALE_AFTER_DAYS} días: {stale_count}.")
+        ttk.Label(report_win, text=summary, wraplength=740).pack(anchor="w", padx=10, pady=(10, 5))
+
+        table_frame = ttk.Frame(report_win)
+        table_frame.pack(expand=True, fill="both", padx=10, pady=5)
+        table_frame.grid_rowconfigure(0, weight=1)
+        table_frame.grid_columnconfigure(0, weight=1)
+
+        columns = {
+            "group": ("Grupo", lambda row: row.group.lower()),
+            "title": ("Título", lambda row: str(row.title).lower()),
+            "user_name": ("Usuario", lambda row: str(row.user_name).lower()),
+            "strength": ("Fortaleza", lambda row: row.score),
+            "unchanged_days": ("Sin cambios (días)", lambda row: -1 if row.unchanged_days is None else row.unchanged_days),
+        }
+        report_tree = ttk.Treeview(table_frame, columns=tuple(columns), show="headings", selectmode="browse")
+        report_tree.grid(row=0, column=0, sticky="nsew")
+        report_scrollbar = ttk.Scrollbar(table_frame, orient="vertical")
+        report_scrollbar.grid(row=0, column=1, sticky="ns")
+
+        def row_values(row):
+            return (row.group, row.title, row.user_name, row.strength, "" if row.unchanged_days is None else row.unchanged_days)
+
+        report_list = VirtualTreeview(report_tree, report_scrollbar, row_values, lambda row: row.entry_id)
+        sort_state = {"column": None, "reverse": False}
+
+        def sort_by(column):
+            reverse = sort_state["column"] == column and not sort_state["reverse"]
+            sort_state.update(column=column, reverse=reverse)
+            report_list.set_rows(sorted(report_list.rows, key=columns[column][1], reverse=reverse))
+
+        for column, (heading, _) in columns.items():
+            report_tree.heading(column, text=heading, command=lambda column=column: sort_by(column))
+            report_tree.column(column, width=170 if column == "group" else 120, anchor="w")
+
+        report_tree.bind("<Double-1>", lambda event: self._go_to_entry(report_list.key_at(event.y), report_win))
+        # Primero las más débiles.
+        report_list.set_rows(sorted(report.rows, key=lambda row: (row.score, row.group.lower())))
+
+        ttk.Button(report_win, text="Cerrar", command=report_win.destroy).pack(pady=10)
+
+    def _go_to_entry(self, entry_key, parent):
+        # Desde las ventanas de informes: muestra la entrada en la lista principal.
+        if not entry_key:
+            return
+        group, _ = self.vault.groups.find_entry(entry_key)
+        if group is None:
+            messagebox.showwarning("Ir a la Entrada", "La entrada ya no existe.", parent=parent)
+            return
+        self.search_entry.delete(0, tk.END)
+        self._select_group(group)
+        self.entry_list.select_key(entry_key)
+
+    def open_reused_passwords_window(self):
+        if not self.vault.key:
+            messagebox.showwarning("Advertencia", "Por favor, cree o abra una base de datos primero.")
+            return
+        if not self._ensure_groups_loaded(self.vault.groups.unloaded_groups()):
+            return
+
+        rows = []
+        reused_sets = self.reuse_index.reused()
+        for set_number, entry_keys in enumerate(reused_sets, 1):
+            label = f"{set_number} ({len(entry_keys)} entradas)"
+            members = []
+            for entry_key in entry_keys:
+                group, entry = self.vault.groups.find_entry(entry_key)
+                if entry is not None:
+                    members.append((entry_key, label, group.path, entry.get("Title", ""), entry.get("User Name", "")))
+            rows.extend(sorted(members, key=lambda row: (row[2].lower(), str(row[3]).lower())))
+
+        reused_win = tk.Toplevel(self.root)
+        reused_win.title("Contraseñas Reutilizadas")
+        reused_win.geometry("700x420")
+        reused_win.transient(self.root)
+
+        if reused_sets:
+            summary = (f"{len(reused_sets)} contraseñas se usan en más de una entrada ({len(rows)} entradas en total). "
+                       "Doble clic en una fila para ir a la entrada.")
         else:
-            return "Muy Fuerte"
+            summary = "Ninguna contraseña se usa en más de una entrada."
+        ttk.Label(reused_win, text=summary, wraplength=660).pack(anchor="w", padx=10, pady=(10, 5))
+
+        table_frame = ttk.Frame(reused_win)
+        table_frame.pack(expand=True, fill="both", padx=10, pady=5)
+        table_frame.grid_rowconfigure(0, weight=1)
+        table_frame.grid_columnconfigure(0, weight=1)
+
+        columns = {"set": "Contraseña compartida", "group": "Grupo", "title": "Título", "user_name": "Usuario"}
+        reused_tree = ttk.Treeview(table_frame, columns=tuple(columns), show="headings", selectmode="browse")
+        reused_tree.grid(row=0, column=0, sticky="nsew")
+        reused_scrollbar = ttk.Scrollbar(table_frame, orient="vertical")
+        reused_scrollbar.grid(row=0, column=1, sticky="ns")
+        for column, heading in columns.items():
+            reused_tree.heading(column, text=heading)
+            reused_tree.column(column, width=150, anchor="w")
+
+        reused_list = VirtualTreeview(reused_tree, reused_scrollbar, lambda row: row[1:], lambda row: row[0])
+        reused_tree.bind("<Double-1>", lambda event: self._go_to_entry(reused_list.key_at(event.y), reused_win))
+        reused_list.set_rows(rows)
+
+        ttk.Button(reused_win, text="Cerrar", command=reused_win.destroy).pack(pady=10)
 
     def clean_clipboard(self):
         try:
@@ -1433,7 +2613,7 @@ class BastionPasswordManager:
             messagebox.showerror("Error", f"No se pudo limpiar el portapapeles: {e}")
 
     def open_change_master_password_window(self):
-        if not self.master_key:
+        if not self.vault.key:
             messagebox.showwarning("Advertencia", "Por favor, cree o abra una base de datos primero.")
             return
 
@@ -1445,15 +2625,19 @@ class BastionPasswordManager:
             messagebox.showwarning("Cambiar Contraseña Maestra", "Cambio de contraseña maestra cancelado.")
             return
 
-        try:
-            verified_key_b64, _ = self._derive_key(current_master_password, salt=self.current_salt)
-            if verified_key_b64 != self.master_key:
+        def on_current_key_derived(verified_key_b64):
+            if key_check_value(verified_key_b64) != key_check_value(self.vault.key):
                 messagebox.showerror("Error", "Contraseña maestra actual incorrecta.")
                 return
-        except Exception as e:
-            messagebox.showerror("Error de Verificación", f"Error al verificar la contraseña actual: {e}")
-            return
+            self._ask_new_master_password()
+
+        def on_verify_error(error):
+            messagebox.showerror("Error de Verificación", f"Error al verificar la contraseña actual: {error}")
 
+        self._run_in_background("Verificando contraseña maestra...", self.vault.derive_key, (current_master_password,),
+                                on_current_key_derived, on_verify_error)
+
+    def _ask_new_master_password(self):
         new_password_dialog = MasterPasswordDialog(self.root, "Establecer Nueva Contraseña Maestra",
                                                    "Por favor, introduzca su NUEVA contraseña maestra:")
         new_master_password = new_password_dialog.result_password
@@ -1462,23 +2646,51 @@ class BastionPasswordManager:
             messagebox.showwarning("Cambiar Contraseña Maestra", "Cambio de contraseña maestra cancelado.")
             return
 
-        new_derived_key_b64, new_salt = self._derive_key(new_master_password)
-        new_fernet_cipher = Fernet(new_derived_key_b64)
-
-        try:
-            success = self._save_database_file_internal(self.current_file_path, self.all_entries_data, new_derived_key_b64, new_salt)
-            if success:
-                self.master_key = new_derived_key_b64
-                self.current_salt = new_salt
-                self.fernet_cipher = new_fernet_cipher
-                messagebox.showinfo("Éxito", "La contraseña maestra ha sido cambiada exitosamente.")
+        # Con la clave nueva hay que re-encriptar todos los bloques.
+        self._finish_autosave()
+        if not self._ensure_groups_loaded(self.vault.groups.unloaded_groups()):
+            return
+        generation = self._edit_generation
+        job, finish_rekey, abort = self.vault.prepare_rekey(new_master_password)
+
+        def on_rekeyed(result):
+            if finish_rekey(result) and self._edit_generation == generation:
+                self._set_unsaved(False)
+            had_quick_unlock = self.vault_session is not None and self.vault_session.quick_unlock_enabled
+            self._start_session()
+            message = "La contraseña maestra ha sido cambiada exitosamente."
+            if had_quick_unlock:
+                message += "\nVuelva a configurar el desbloqueo rápido."
+            messagebox.showinfo("Éxito", message)
+
+        def on_error(error):
+            abort()
+            if isinstance(error, VaultError):
+                messagebox.showerror("Error", f"No se pudo re-encriptar y guardar la base de datos con la nueva contraseña maestra: {error}")
             else:
-                messagebox.showerror("Error", "No se pudo re-encriptar y guardar la base de datos con la nueva contraseña maestra.")
-        except Exception as e:
-            messagebox.showerror("Error de Cambio de Contraseña", f"Ocurrió un error al cambiar la contraseña maestra: {e}")
+                messagebox.showerror("Error de Cambio de Contraseña", f"Ocurrió un error al cambiar la contraseña maestra: {error}")
+
+        if not self._run_in_background("Cambiando contraseña maestra...", job, (), on_rekeyed, on_error):
+            abort()
 
 
 if __name__ == "__main__":
+    import argparse
+
+    if getattr(sys, "frozen", False):
+        # La auditoría usa un pool de procesos: en un ejecutable empaquetado
+        # cada proceso hijo vuelve a arrancar desde aquí.
+        import multiprocessing
+        multiprocessing.freeze_support()
+
+    parser = argparse.ArgumentParser(description="Bastión, gestor de contraseñas.")
+    parser.add_argument("--trace", metavar="ARCHIVO",
+                        help=f"Mide los tiempos y guarda una traza (formato Chrome) al salir. También {tracing.TRACE_ENV_VAR}.")
+    parser.add_argument("--profile", metavar="ARCHIVO",
+                        help=f"Guarda estadísticas de cProfile al salir. También {tracing.PROFILE_ENV_VAR}.")
+    args = parser.parse_args()
+    tracing.setup(args.trace, args.profile)
+
     root = tk.Tk()
     app = BastionPasswordManager(root)
     root.mainloop()
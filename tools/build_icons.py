@@ -0,0 +1,25 @@
+# Genera los iconos a tamaño fijo que carga la aplicación al arrancar, para
+# no tener que redimensionar icono_bastion.png (ni importar PIL) en cada
+# inicio. Ejecutar de nuevo si cambia el icono original.
+#
+#   python tools/build_icons.py
+
+import os
+
+from PIL import Image
+
+ICONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Icons")
+SOURCE_ICON = "icono_bastion.png"
+ICON_SIZES = (32, 64)
+
+
+def main():
+    original_image = Image.open(os.path.join(ICONS_DIR, SOURCE_ICON))
+    for size in ICON_SIZES:
+        target = os.path.join(ICONS_DIR, f"icono_bastion_{size}.png")
+        original_image.resize((size, size), Image.Resampling.LANCZOS).save(target, optimize=True)
+        print(f"{target}: {os.path.getsize(target)} bytes")
+
+
+if __name__ == "__main__":
+    main()